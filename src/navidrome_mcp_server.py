@@ -11,15 +11,27 @@ import json
 import random
 import datetime
 from collections import Counter
-from typing import List, Dict, Optional, Any
+from dataclasses import dataclass, field
+from typing import List, Dict, Optional, Any, Callable, Tuple, Iterator
 from dotenv import load_dotenv
 from pathlib import Path
-from urllib.parse import urlparse
+from urllib.parse import urlparse, urlencode
 import logging
 from pythonjsonlogger import jsonlogger
 import time
 import functools
+import inspect
 import re
+import heapq
+import math
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import uuid
+import sqlite3
+import hashlib
+import unicodedata
+from collections import OrderedDict
 
 # --- CONFIGURATION ---
 # Load .env from the project root (one level up from src/)
@@ -33,6 +45,135 @@ NAVIDROME_PASS = os.getenv("NAVIDROME_PASS")
 if not all([NAVIDROME_URL, NAVIDROME_USER, NAVIDROME_PASS]):
     raise ValueError("Missing Navidrome configuration. Please ensure NAVIDROME_URL, NAVIDROME_USER, and NAVIDROME_PASS are set in your .env file.")
 
+# Server-side cursor cache (ranked candidate sets kept between paging calls)
+CURSOR_TTL_SECONDS = int(os.getenv("NAVIDROME_CURSOR_TTL", "900"))
+CURSOR_MAX_SETS = int(os.getenv("NAVIDROME_CURSOR_MAX_SETS", "32"))
+CURSOR_MAX_ITEMS = int(os.getenv("NAVIDROME_CURSOR_MAX_ITEMS", "20000"))
+# Response budget in estimated tokens (~4 bytes each); 0 = unlimited unless a call sets one.
+# Oversized results are cut at a list boundary and the rest is served by continue_response.
+RESPONSE_TOKEN_BUDGET = int(os.getenv("NAVIDROME_RESPONSE_TOKEN_BUDGET", "0"))
+BYTES_PER_TOKEN = 4
+# Incremental assessment sessions (assess_playlist_session), expire when idle
+SESSION_TTL_SECONDS = int(os.getenv("NAVIDROME_SESSION_TTL", "1800"))
+
+# Diversity re-ranking (MMR): similarity weight of each shared attribute
+DIVERSITY_WEIGHTS = {"artist": 0.5, "album": 0.2, "genre": 0.2, "decade": 0.1}
+DIVERSITY_LAMBDA = 0.7       # 1.0 = pure smart score, 0.0 = pure novelty
+DIVERSITY_MAX_DEPTH = 500    # upper bound on re-ranked positions for paged harvests
+
+# Local library index (song metadata + album tracklists mirrored from Navidrome)
+INDEX_TTL_SECONDS = int(os.getenv("NAVIDROME_INDEX_TTL", "3600"))
+INDEX_MAX_ALBUMS = int(os.getenv("NAVIDROME_INDEX_MAX_ALBUMS", "5000"))
+INDEX_MAX_SONGS = int(os.getenv("NAVIDROME_INDEX_MAX_SONGS", "100000"))
+SCAN_CHECK_SECONDS = int(os.getenv("NAVIDROME_SCAN_CHECK_INTERVAL", "60"))
+
+# Request size limits for batched playlist writes. libsonic sends POST form bodies by default;
+# set NAVIDROME_USE_GET=true for proxies/servers that only accept query strings.
+USE_GET = os.getenv("NAVIDROME_USE_GET", "false").lower() in ("1", "true", "yes")
+MAX_URL_LENGTH = int(os.getenv("NAVIDROME_MAX_URL_LENGTH", "2000"))
+MAX_BODY_LENGTH = int(os.getenv("NAVIDROME_MAX_BODY_LENGTH", "32768"))
+
+# Local state database (playlist write journal). Relative paths resolve against the project root.
+# Unset = in-memory: writes are still journaled, but jobs do not survive a restart.
+STATE_DB_PATH = os.getenv("NAVIDROME_STATE_DB")
+# Write requests per second of the background journal worker (synchronous writes are not throttled)
+WRITE_RATE_PER_SECOND = float(os.getenv("NAVIDROME_WRITE_RATE", "5"))
+# export_playlist / import_playlist only touch files inside this directory (relative to the project root)
+PLAYLIST_DIR = os.getenv("NAVIDROME_PLAYLIST_DIR", "./playlists")
+# Parallel getSong calls when resolving IDs missing from the local index
+RESOLVE_CONCURRENCY = int(os.getenv("NAVIDROME_RESOLVE_CONCURRENCY", "8"))
+# BPM difference between adjacent tracks reported as a jarring transition
+BPM_JUMP_THRESHOLD = 20
+
+# Alternate-version detection: max duration difference in seconds (0 = ignore duration).
+# NAVIDROME_DUPLICATE_DURATION_BUCKET is the former name of the setting.
+DUPLICATE_DURATION_TOLERANCE = int(os.getenv("NAVIDROME_DUPLICATE_DURATION_TOLERANCE",
+                                             os.getenv("NAVIDROME_DUPLICATE_DURATION_BUCKET", "10")))
+DUPLICATE_KEEP_POLICIES = ("smart_score", "original", "first")
+
+# Output layouts of the track-returning tools (see _shape_tracks)
+TRACK_FORMATS = ("json", "compact", "columnar", "ids")
+
+# Default sequencing objective: weights of the transition costs between consecutive tracks
+SEQUENCE_WEIGHTS = {"bpm": 1.0, "genre": 0.5, "era": 0.5, "artist": 2.0}
+
+# Playlist history: a full checkpoint every N versions, at most M versions kept per playlist
+HISTORY_CHECKPOINT_EVERY = int(os.getenv("NAVIDROME_HISTORY_CHECKPOINT_EVERY", "10"))
+HISTORY_MAX_VERSIONS = int(os.getenv("NAVIDROME_HISTORY_MAX_VERSIONS", "50"))
+
+# Virtual tags are playlists named '<prefix><Tag>'; bare tag names get the agent prefix
+VIRTUAL_TAG_PREFIXES = ("System:Mood:", "NG:Mood:")
+DEFAULT_TAG_PREFIX = "NG:Mood:"
+
+# Playlist name -> ID index (refreshed in the background once older than the TTL)
+PLAYLIST_INDEX_TTL = int(os.getenv("NAVIDROME_PLAYLIST_INDEX_TTL", "300"))
+
+# Tool-call logging: each logged argument keeps at most N items / N characters (larger values
+# are replaced by their length, head and digest) and only a sample of successful calls is logged
+LOG_MAX_ITEMS = int(os.getenv("NAVIDROME_LOG_MAX_ITEMS", "5"))
+LOG_MAX_CHARS = int(os.getenv("NAVIDROME_LOG_MAX_CHARS", "200"))
+LOG_HASH_INPUTS = os.getenv("NAVIDROME_LOG_HASH_INPUTS", "true").lower() in ("1", "true", "yes")
+LOG_SAMPLE_RATE = float(os.getenv("NAVIDROME_LOG_SAMPLE_RATE", "1.0"))
+
+# Mood registry (JSON). Defaults to src/moods.json; override with NAVIDROME_MOODS_FILE.
+MOODS_FILE = os.getenv("NAVIDROME_MOODS_FILE") or str(Path(__file__).parent / "moods.json")
+
+
+# --- JSON BACKEND ---
+def _load_json_backend(preference: str) -> Tuple[str, Callable[..., str], Callable[[Any], Any]]:
+    """
+    Picks the serializer used for responses, journal entries and logs: 'auto' tries orjson,
+    then msgspec, then the stdlib. An explicit backend that is not installed falls back to
+    the stdlib. All backends emit UTF-8 (non-ASCII unescaped) and 2-space indentation, and
+    their loads() raise ValueError on malformed input.
+    """
+    order = ("orjson", "msgspec") if preference == "auto" else (preference,)
+    for name in order:
+        if name == "orjson":
+            try:
+                import orjson
+            except ImportError:
+                continue
+
+            def dumps(obj, indent=False, default=None):
+                option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+                return orjson.dumps(obj, default=default, option=option).decode("utf-8")
+            return name, dumps, orjson.loads
+
+        if name == "msgspec":
+            try:
+                import msgspec
+            except ImportError:
+                continue
+
+            def dumps(obj, indent=False, default=None):
+                data = msgspec.json.encode(obj, enc_hook=default)
+                return (msgspec.json.format(data, indent=2) if indent else data).decode("utf-8")
+
+            def loads(data):
+                try:
+                    return msgspec.json.decode(data)
+                except msgspec.DecodeError as e:
+                    raise ValueError(str(e)) from e
+            return name, dumps, loads
+
+    def dumps(obj, indent=False, default=None):
+        if indent:
+            return json.dumps(obj, indent=2, default=default, ensure_ascii=False)
+        return json.dumps(obj, separators=(",", ":"), default=default, ensure_ascii=False)
+    return "json", dumps, json.loads
+
+
+JSON_BACKEND_PREFERENCE = os.getenv("NAVIDROME_JSON_BACKEND", "auto").lower()
+JSON_BACKEND, _json_dumps, _json_loads = _load_json_backend(JSON_BACKEND_PREFERENCE)
+
+
+def _log_serializer(obj, default=None, cls=None, indent=None, ensure_ascii=True):
+    """json.dumps-compatible hook for the log formatter, running on the selected backend."""
+    if default is None and cls is not None:
+        default = cls().default
+    return _json_dumps(obj, default=default)
+
 
 # --- LOGGING SETUP ---
 logger = logging.getLogger("navidrome_mcp")
@@ -44,7 +185,8 @@ logger.setLevel(logging.INFO)
 formatter = jsonlogger.JsonFormatter(
     "%(asctime)s %(levelname)s %(name)s %(message)s",
     rename_fields={"levelname": "level", "asctime": "timestamp"},
-    datefmt="%Y-%m-%dT%H:%M:%SZ"
+    datefmt="%Y-%m-%dT%H:%M:%SZ",
+    json_serializer=_log_serializer
 )
 
 # 1. Standard Error Handler (Default / Cloud Native)
@@ -81,46 +223,102 @@ if log_file_path:
         # Don't crash if file logging fails, just warn to stderr
         logger.error(f"Failed to setup file logging: {e}", extra={"action": "startup_log_error"})
 
+if JSON_BACKEND_PREFERENCE not in ("auto", JSON_BACKEND):
+    logger.warning(f"JSON backend '{JSON_BACKEND_PREFERENCE}' is not available, using '{JSON_BACKEND}'.",
+                   extra={"action": "startup_json_backend"})
+
+# Scalar result fields copied into the log summary when present at the top level
+RESULT_META_KEYS = ("total", "total_tracks", "is_valid", "status", "diversity_score", "job_id")
+_log_sampler = random.Random()
+
+
+def _result_meta(payload: Any) -> Dict:
+    """Default summary of a structured result: sizes and a few well-known scalar fields."""
+    if isinstance(payload, list):
+        return {"count": len(payload)}
+    if not isinstance(payload, dict):
+        return {}
+    meta = {k: payload[k] for k in RESULT_META_KEYS if isinstance(payload.get(k), (str, int, float, bool))}
+    for key, value in payload.items():
+        if isinstance(value, list):
+            meta[f"{key}_count"] = len(value)
+    return meta
+
+
+def _digest(value: Any) -> str:
+    return hashlib.sha1(_json_dumps(value, default=str).encode("utf-8")).hexdigest()[:12]
+
+
+def _cap_for_log(value: Any, depth: int = 0) -> Any:
+    """
+    Bounded copy of a tool argument for logging: long strings and collections keep their
+    length, a short head and (NAVIDROME_LOG_HASH_INPUTS) a digest to correlate identical calls.
+    """
+    if isinstance(value, str):
+        if len(value) <= LOG_MAX_CHARS:
+            return value
+        capped = {"len": len(value), "head": value[:LOG_MAX_CHARS]}
+    elif isinstance(value, (list, tuple, dict)):
+        if depth >= 2:
+            return {"type": type(value).__name__, "len": len(value)}
+        if isinstance(value, dict):
+            items = list(value.items())[:LOG_MAX_ITEMS]
+            head = {str(k): _cap_for_log(v, depth + 1) for k, v in items}
+        else:
+            head = [_cap_for_log(v, depth + 1) for v in value[:LOG_MAX_ITEMS]]
+        if len(value) <= LOG_MAX_ITEMS:
+            return head
+        capped = {"len": len(value), "head": head}
+    else:
+        return value
+    if LOG_HASH_INPUTS:
+        capped["sha1"] = _digest(value)
+    return capped
+
+
+def _log_inputs(args: tuple, kwargs: Dict) -> Dict:
+    return {
+        "args": [_cap_for_log(a) for a in args],
+        "kwargs": {k: _cap_for_log(v) for k, v in kwargs.items()}
+    }
+
+
 # Metadata capture decorator
 def log_execution(func):
+    """
+    Logs every tool call with capped inputs and the result's summary metadata (never the
+    full result). Successful calls are sampled at NAVIDROME_LOG_SAMPLE_RATE; failures
+    are always logged.
+    """
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
         start_time = time.time()
         tool_name = func.__name__
-        
-        # Capture input args (convert to clean dict if needed)
-        input_data = {"args": args, "kwargs": kwargs}
-        
+
         try:
             result = func(*args, **kwargs)
             duration = (time.time() - start_time) * 1000
-            
-            # Analyze result for logging without dumping huge payloads
-            result_meta = {}
-            if isinstance(result, str):
-                try:
-                    # Try to parse JSON results to get counts
-                    parsed = json.loads(result)
-                    if isinstance(parsed, list):
-                        result_meta["count"] = len(parsed)
-                        result_meta["ids"] = [item.get("id") for item in parsed if isinstance(item, dict) and "id" in item]
-                    elif isinstance(parsed, dict):
-                        # Catch quality assessment scores
-                        if "diversity_score" in parsed:
-                            result_meta["diversity_score"] = parsed["diversity_score"]
-                            result_meta["repetition_warning"] = parsed.get("most_repetitive_artist", {}).get("warning")
-                except:
-                    result_meta["raw_length"] = len(result)
-            
-            logger.info(
-                "Tool execution successful",
-                extra={
-                    "tool": tool_name,
-                    "inputs": input_data,
-                    "result_summary": result_meta,
-                    "duration_ms": round(duration, 2)
-                }
-            )
+            if LOG_SAMPLE_RATE < 1.0 and _log_sampler.random() >= LOG_SAMPLE_RATE:
+                return result
+
+            # Structured results carry their own summary; plain text is only measured
+            meta = getattr(result, "meta", None)
+            if meta is None:
+                payload = getattr(result, "payload", None)
+                if payload is not None:
+                    meta = _result_meta(payload)
+                else:
+                    meta = {"raw_length": len(result)} if isinstance(result, str) else {}
+
+            record = {
+                "tool": tool_name,
+                "inputs": _log_inputs(args, kwargs),
+                "result_summary": meta,
+                "duration_ms": round(duration, 2)
+            }
+            if LOG_SAMPLE_RATE < 1.0:
+                record["sample_rate"] = LOG_SAMPLE_RATE
+            logger.info("Tool execution successful", extra=record)
             return result
             
         except Exception as e:
@@ -129,7 +327,7 @@ def log_execution(func):
                 "Tool execution failed",
                 extra={
                     "tool": tool_name,
-                    "inputs": input_data,
+                    "inputs": _log_inputs(args, kwargs),
                     "error": str(e),
                     "duration_ms": round(duration, 2)
                 },
@@ -159,9 +357,692 @@ def get_conn():
         username=NAVIDROME_USER, 
         password=NAVIDROME_PASS, 
         port=port,
-        appName="AntigravityMCP"
+        appName="AntigravityMCP",
+        useGET=USE_GET
     )
 
+class _TTLCache:
+    """
+    Thread-safe in-process LRU store with a per-entry TTL and a global size bound.
+    Each entry declares its own `size` (e.g. number of tracks) so the bound tracks
+    memory rather than entry count. Oldest entries are evicted first.
+    """
+
+    def __init__(self, ttl_seconds: int, max_entries: int, max_size: Optional[int] = None):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self._entries = OrderedDict()  # key -> (expires_at, size, value)
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def put(self, value: Any, size: int = 1, key: Optional[str] = None) -> str:
+        key = key or uuid.uuid4().hex[:16]
+        with self._lock:
+            if key in self._entries:
+                self._size -= self._entries.pop(key)[1]
+            self._entries[key] = (time.time() + self.ttl_seconds, size, value)
+            self._size += size
+            self._evict()
+        return key
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                self._size -= self._entries.pop(key)[1]
+                return None
+            self._entries.move_to_end(key)
+            return entry[2]
+
+    def pop(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return None
+            self._size -= entry[1]
+            return entry[2]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _evict(self):
+        # Expired entries are dropped from the LRU end here and lazily in get()
+        now = time.time()
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry[0] >= now:
+                break
+            self._size -= self._entries.pop(key)[1]
+        while self._entries and (
+            len(self._entries) > self.max_entries
+            or (self.max_size is not None and self._size > self.max_size and len(self._entries) > 1)
+        ):
+            self._size -= self._entries.popitem(last=False)[1][1]
+
+
+class _LibraryIndex:
+    """
+    Local mirror of song metadata and album tracklists (album ID -> ordered track IDs).
+    Filled opportunistically from every directory fetch, so album-level harvest modes can be
+    resolved to tracks without further round trips. sync() invalidates everything when
+    Navidrome reports a new library scan; entries also expire after INDEX_TTL_SECONDS so
+    user data (plays, stars, ratings) does not drift too far.
+
+    `known_ids` is the catalog membership set: every track ID the server has returned since the
+    last scan. It has no TTL (IDs only disappear with a scan) and lets playlist writes skip the
+    per-ID getSong verification for tracks already seen.
+    """
+
+    def __init__(self):
+        self.songs = _TTLCache(INDEX_TTL_SECONDS, INDEX_MAX_SONGS)
+        self.albums = _TTLCache(INDEX_TTL_SECONDS, INDEX_MAX_ALBUMS)
+        self.known_ids = set()
+        self._scan_generation = None
+        self._scan_checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def record_songs(self, songs: List[Dict]):
+        for song in songs:
+            if isinstance(song, dict) and song.get('id') and not song.get('isDir'):
+                self.songs.put(song, key=song['id'])
+                self.known_ids.add(song['id'])
+
+    def mark_known(self, track_id: Optional[str]):
+        if track_id:
+            self.known_ids.add(track_id)
+
+    def is_known(self, track_id: str) -> bool:
+        return track_id in self.known_ids
+
+    def record_album(self, album_id: str, songs: List[Dict]):
+        self.record_songs(songs)
+        self.albums.put([song['id'] for song in songs if song.get('id')], key=album_id)
+
+    def album_tracks(self, album_id: str) -> Optional[List[Dict]]:
+        """Ordered raw songs of an album, or None if any part is missing from the index."""
+        track_ids = self.albums.get(album_id)
+        if track_ids is None:
+            return None
+        songs = [self.songs.get(tid) for tid in track_ids]
+        return None if any(song is None for song in songs) else songs
+
+    def sync(self, conn, force: bool = False):
+        """Checks the scan status (at most every SCAN_CHECK_SECONDS) and drops stale data."""
+        with self._lock:
+            if not force and time.time() - self._scan_checked_at < SCAN_CHECK_SECONDS:
+                return
+            self._scan_checked_at = time.time()
+        try:
+            res = conn.getScanStatus()
+            status = res.get('scanStatus') or res.get('scanstatus') or {}
+            generation = (status.get('lastScan'), status.get('count'), status.get('folderCount'))
+        except Exception as e:
+            logger.warning(f"Scan status check failed, keeping library index: {e}")
+            return
+        with self._lock:
+            changed = self._scan_generation is not None and generation != self._scan_generation
+            self._scan_generation = generation
+        if changed:
+            logger.info("Library scan detected. Clearing local library index.", extra={"action": "index_invalidate"})
+            self.clear()
+
+    def clear(self):
+        self.songs.clear()
+        self.albums.clear()
+        self.known_ids = set()
+
+
+class _PlaylistIndex:
+    """
+    Cached playlist name -> {"id", "song_count", "changed"} index.
+
+    Loaded once with getPlaylists() and then kept current from our own write responses
+    (create/update/delete). Once older than PLAYLIST_INDEX_TTL a lookup still answers from the
+    cache while a background thread reloads it, so no call pays for a full listing. When the
+    same name exists twice the first playlist returned by the server wins, as before.
+    """
+
+    def __init__(self):
+        self._by_name = {}
+        self._loaded_at = None
+        self._refreshing = False
+        self._lock = threading.Lock()
+
+    def refresh(self, conn):
+        playlists = conn.getPlaylists().get('playlists', {}).get('playlist', [])
+        by_name = {}
+        for p in playlists:
+            if p.get('name') not in by_name:
+                by_name[p.get('name')] = {
+                    "id": p.get('id'),
+                    "song_count": p.get('songCount'),
+                    "changed": p.get('changed')
+                }
+        with self._lock:
+            self._by_name = by_name
+            self._loaded_at = time.time()
+
+    def _refresh_in_background(self, conn):
+        try:
+            self.refresh(conn)
+        except Exception as e:
+            logger.warning(f"Background playlist index refresh failed: {e}")
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def lookup(self, conn, name: str) -> Optional[Dict]:
+        if self._loaded_at is None:
+            self.refresh(conn)
+        elif time.time() - self._loaded_at > PLAYLIST_INDEX_TTL:
+            with self._lock:
+                start = not self._refreshing
+                self._refreshing = True
+            if start:
+                threading.Thread(target=self._refresh_in_background, args=(conn,), daemon=True).start()
+        with self._lock:
+            entry = self._by_name.get(name)
+            return dict(entry) if entry else None
+
+    def names(self, conn) -> List[str]:
+        if self._loaded_at is None:
+            self.refresh(conn)
+        with self._lock:
+            return list(self._by_name)
+
+    def entries(self, conn) -> Dict[str, Dict]:
+        if self._loaded_at is None:
+            self.refresh(conn)
+        with self._lock:
+            return {name: dict(entry) for name, entry in self._by_name.items()}
+
+    def record(self, name: str, pl_id: str, song_count: Optional[int] = None, changed: Optional[str] = None) -> str:
+        """Records a write we made; returns the 'changed' stamp stored for it."""
+        with self._lock:
+            entry = self._by_name.setdefault(name, {"id": pl_id, "song_count": None, "changed": None})
+            entry["id"] = pl_id
+            if song_count is not None:
+                entry["song_count"] = song_count
+            entry["changed"] = changed or datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+            return entry["changed"]
+
+    def stamp(self, name: str) -> Optional[str]:
+        """The cached 'changed' stamp of a playlist, without triggering a refresh."""
+        with self._lock:
+            return (self._by_name.get(name) or {}).get("changed")
+
+    def forget(self, name: str):
+        with self._lock:
+            self._by_name.pop(name, None)
+
+    def clear(self):
+        with self._lock:
+            self._by_name = {}
+            self._loaded_at = None
+
+
+class _TagIndex:
+    """
+    Reverse index track ID -> virtual-tag playlists (System:Mood:*, NG:Mood:*).
+
+    Built from the tag playlists on first sync(); later syncs compare each playlist's 'changed'
+    stamp in the playlist index and re-fetch only the ones that moved. Our own writes update
+    membership directly (stamped with the same value the playlist index records), so they do
+    not trigger a re-fetch while that stamp is cached; once the playlist index is reloaded
+    the server's stamp replaces ours and each written tag playlist is fetched once more.
+    """
+
+    def __init__(self):
+        self._members: Dict[str, set] = {}
+        self._stamps: Dict[str, Optional[str]] = {}
+        self._by_track: Dict[str, set] = {}
+        self.ready = False
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def is_tag(name: Optional[str]) -> bool:
+        return bool(name) and name.startswith(VIRTUAL_TAG_PREFIXES)
+
+    def _replace(self, name: str, track_ids) -> None:
+        for tid in self._members.pop(name, ()):
+            tags = self._by_track.get(tid)
+            if tags is not None:
+                tags.discard(name)
+                if not tags:
+                    del self._by_track[tid]
+        if track_ids is not None:
+            self._members[name] = set(track_ids)
+            for tid in self._members[name]:
+                self._by_track.setdefault(tid, set()).add(name)
+
+    def sync(self, conn):
+        playlists = {n: e for n, e in _playlists.entries(conn).items() if self.is_tag(n)}
+        with self._lock:
+            stale = [n for n in playlists if n not in self._stamps or self._stamps[n] != playlists[n]["changed"]]
+            for name in set(self._members) - set(playlists):
+                self._replace(name, None)
+                self._stamps.pop(name, None)
+        for name in stale:
+            track_ids = _playlist_track_ids(conn, playlists[name]["id"])
+            self.set_playlist(name, track_ids, playlists[name]["changed"])
+        self.ready = True
+
+    def set_playlist(self, name: str, track_ids: List[str], changed: Optional[str]):
+        if not self.is_tag(name):
+            return
+        with self._lock:
+            self._replace(name, track_ids)
+            self._stamps[name] = changed
+
+    def add(self, name: str, track_ids: List[str], changed: Optional[str]):
+        """Appends to a playlist already in the index (unknown ones are fetched on next sync)."""
+        with self._lock:
+            if name not in self._members:
+                return
+            self._members[name].update(track_ids)
+            for tid in track_ids:
+                self._by_track.setdefault(tid, set()).add(name)
+            self._stamps[name] = changed
+
+    def forget(self, name: str):
+        with self._lock:
+            self._replace(name, None)
+            self._stamps.pop(name, None)
+
+    def tags_for(self, track_id: str) -> List[str]:
+        with self._lock:
+            return sorted(self._by_track.get(track_id, ()))
+
+    def matches(self, track_id: str, tags: List[str]) -> bool:
+        """True if the track carries any of `tags` (full names or bare names like 'Focus')."""
+        wanted = {t.strip().lower() for t in tags}
+        for name in self.tags_for(track_id):
+            lowered = name.lower()
+            if lowered in wanted or lowered.rsplit(":", 1)[-1] in wanted:
+                return True
+        return False
+
+    def clear(self):
+        with self._lock:
+            self._members, self._stamps, self._by_track = {}, {}, {}
+            self.ready = False
+
+
+class _RateLimiter:
+    """Spaces calls at least 1/rate seconds apart across threads (0 disables)."""
+
+    def __init__(self, rate_per_second: float):
+        self.interval = 1.0 / rate_per_second if rate_per_second > 0 else 0.0
+        self._next_at = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next_at - now
+            self._next_at = max(now, self._next_at) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+def _resolve_local_path(path: str) -> Path:
+    """Resolves a user-supplied local path; relative paths are taken from the project root."""
+    local_path = Path(path).expanduser()
+    if not local_path.is_absolute():
+        local_path = Path(__file__).parent.parent / local_path
+    return local_path
+
+
+def _playlist_file(file_path: str, must_exist: bool = False) -> Path:
+    """
+    Resolves an export/import path inside PLAYLIST_DIR (relative paths are taken from it).
+    Raises ValueError when the real path, symlinks included, leaves the directory or is
+    not a regular file.
+    """
+    root = Path(os.path.realpath(_resolve_local_path(PLAYLIST_DIR)))
+    target = Path(os.path.realpath(root / Path(file_path).expanduser()))
+    if root not in target.parents:
+        raise ValueError(f"'{file_path}' is outside the playlist directory {root} (NAVIDROME_PLAYLIST_DIR).")
+    if target.exists() and not target.is_file():
+        raise ValueError(f"'{file_path}' is not a regular file.")
+    if must_exist and not target.exists():
+        raise ValueError(f"File not found: {target}")
+    return target
+
+
+def _open_state_db(path: Optional[str]) -> sqlite3.Connection:
+    """Opens the local state database shared by the journal (in-memory when unset or ':memory:')."""
+    if path == ":memory:":
+        path = None
+    if path:
+        db_path = _resolve_local_path(path)
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        target = str(db_path)
+    else:
+        target = ":memory:"
+    db = sqlite3.connect(target, check_same_thread=False, isolation_level=None)
+    db.row_factory = sqlite3.Row
+    if path:
+        db.execute("PRAGMA journal_mode=WAL")
+    return db
+
+
+class _WriteJournal:
+    """
+    Write-ahead journal for playlist writes (SQLite).
+
+    Every create/append/sync is recorded as a job before any request is sent, and its progress
+    (playlist ID, IDs landed so far) is checkpointed after each batch. Jobs left 'running' by a
+    crash are moved back to 'pending' by recover() and resumed from their last checkpoint.
+    Idempotency keys deduplicate retries: an explicit key matches any earlier job, a derived
+    key (hash of name/operation/IDs) only matches jobs still pending or running.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS playlist_jobs (
+            id TEXT PRIMARY KEY,
+            idempotency_key TEXT NOT NULL,
+            explicit_key INTEGER NOT NULL DEFAULT 0,
+            name TEXT NOT NULL,
+            operation TEXT NOT NULL,
+            track_ids TEXT NOT NULL,
+            status TEXT NOT NULL,
+            progress TEXT,
+            result TEXT,
+            error TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_playlist_jobs_status ON playlist_jobs(status, created_at);
+        CREATE INDEX IF NOT EXISTS idx_playlist_jobs_key ON playlist_jobs(idempotency_key);
+    """
+
+    def __init__(self, db: sqlite3.Connection):
+        self.db = db
+        self._lock = threading.Lock()
+        with self._lock:
+            self.db.executescript(self.SCHEMA)
+
+    @staticmethod
+    def _row_to_job(row) -> Optional[Dict]:
+        if row is None:
+            return None
+        job = dict(row)
+        job["track_ids"] = _json_loads(job["track_ids"])
+        job["progress"] = _json_loads(job["progress"]) if job["progress"] else {}
+        return job
+
+    def submit(self, name: str, operation: str, track_ids: List[str], idempotency_key: Optional[str] = None,
+               claim: bool = False) -> Tuple[Dict, bool]:
+        """
+        Records a job. Returns (job, created); created is False for a deduplicated retry.
+        With claim=True a new job is inserted directly as 'running' for the caller to apply
+        synchronously, so the background worker can never pick it up in between.
+        """
+        explicit = idempotency_key is not None
+        key = idempotency_key or hashlib.sha1(
+            # Stdlib on purpose: the derived key must not change with the JSON backend
+            json.dumps([name, operation, track_ids]).encode("utf-8")
+        ).hexdigest()
+        with self._lock:
+            query = "SELECT * FROM playlist_jobs WHERE idempotency_key = ?"
+            if not explicit:
+                query += " AND status IN ('pending', 'running')"
+            existing = self.db.execute(query + " ORDER BY created_at DESC LIMIT 1", (key,)).fetchone()
+            if existing is not None:
+                return self._row_to_job(existing), False
+            now = time.time()
+            job_id = uuid.uuid4().hex
+            self.db.execute(
+                "INSERT INTO playlist_jobs (id, idempotency_key, explicit_key, name, operation, track_ids, status, attempts, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, key, int(explicit), name, operation, _json_dumps(track_ids),
+                 "running" if claim else "pending", int(claim), now, now)
+            )
+            return self.get(job_id, locked=True), True
+
+    def get(self, job_id: str, locked: bool = False) -> Optional[Dict]:
+        if locked:
+            return self._row_to_job(self.db.execute("SELECT * FROM playlist_jobs WHERE id = ?", (job_id,)).fetchone())
+        with self._lock:
+            return self._row_to_job(self.db.execute("SELECT * FROM playlist_jobs WHERE id = ?", (job_id,)).fetchone())
+
+    def recent(self, limit: int = 20) -> List[Dict]:
+        with self._lock:
+            rows = self.db.execute("SELECT * FROM playlist_jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+        return [self._row_to_job(r) for r in rows]
+
+    def claim(self, job_id: Optional[str] = None) -> Optional[Dict]:
+        """Moves a pending job (the given one, or the oldest) to 'running'."""
+        with self._lock:
+            if job_id:
+                row = self.db.execute("SELECT * FROM playlist_jobs WHERE id = ? AND status = 'pending'", (job_id,)).fetchone()
+            else:
+                row = self.db.execute("SELECT * FROM playlist_jobs WHERE status = 'pending' ORDER BY created_at LIMIT 1").fetchone()
+            if row is None:
+                return None
+            self.db.execute(
+                "UPDATE playlist_jobs SET status = 'running', attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (time.time(), row["id"])
+            )
+            return self.get(row["id"], locked=True)
+
+    def checkpoint(self, job_id: str, progress: Dict):
+        with self._lock:
+            self.db.execute(
+                "UPDATE playlist_jobs SET progress = ?, updated_at = ? WHERE id = ?",
+                (_json_dumps(progress), time.time(), job_id)
+            )
+
+    def finish(self, job_id: str, result: str):
+        with self._lock:
+            self.db.execute(
+                "UPDATE playlist_jobs SET status = 'done', result = ?, updated_at = ? WHERE id = ?",
+                (result, time.time(), job_id)
+            )
+
+    def fail(self, job_id: str, error: str):
+        with self._lock:
+            self.db.execute(
+                "UPDATE playlist_jobs SET status = 'failed', error = ?, updated_at = ? WHERE id = ?",
+                (error, time.time(), job_id)
+            )
+
+    def recover(self) -> int:
+        """
+        Re-queues jobs interrupted by a crash or restart. Returns how many jobs are pending
+        afterwards (re-queued plus already queued), i.e. whether the worker has work to do.
+        """
+        with self._lock:
+            cur = self.db.execute(
+                "UPDATE playlist_jobs SET status = 'pending', updated_at = ? WHERE status = 'running'", (time.time(),)
+            )
+            pending = self.db.execute("SELECT COUNT(*) FROM playlist_jobs WHERE status = 'pending'").fetchone()[0]
+        if cur.rowcount:
+            logger.info(f"Recovered {cur.rowcount} interrupted playlist jobs.", extra={"action": "journal_recover"})
+        return pending
+
+
+class _PlaylistHistory:
+    """
+    Versioned playlist contents in the state database.
+
+    Each version is stored as the edit script from the previous one (indexes removed, IDs
+    appended, as in _playlist_edit_script), with a full ID-list checkpoint every
+    HISTORY_CHECKPOINT_EVERY versions. Reading a version replays the deltas since the nearest
+    checkpoint. Only the last HISTORY_MAX_VERSIONS versions are kept; the oldest kept version
+    is rewritten as a checkpoint before older rows are pruned.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS playlist_history (
+            playlist TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            operation TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            track_count INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            PRIMARY KEY (playlist, version)
+        );
+    """
+
+    def __init__(self, db: sqlite3.Connection):
+        self.db = db
+        self._lock = threading.Lock()
+        # Playlist 'changed' stamp seen when the latest version was recorded (this process only)
+        self._stamps: Dict[str, Optional[str]] = {}
+        with self._lock:
+            self.db.executescript(self.SCHEMA)
+
+    def stamp(self, name: str) -> Optional[str]:
+        with self._lock:
+            return self._stamps.get(name)
+
+    def _latest_version(self, name: str) -> Optional[int]:
+        row = self.db.execute("SELECT MAX(version) FROM playlist_history WHERE playlist = ?", (name,)).fetchone()
+        return row[0]
+
+    def _materialize(self, name: str, version: int) -> Optional[List[str]]:
+        start = self.db.execute(
+            "SELECT MAX(version) FROM playlist_history WHERE playlist = ? AND kind = 'checkpoint' AND version <= ?",
+            (name, version)
+        ).fetchone()[0]
+        if start is None:
+            return None
+        rows = self.db.execute(
+            "SELECT version, kind, payload FROM playlist_history WHERE playlist = ? AND version BETWEEN ? AND ? ORDER BY version",
+            (name, start, version)
+        ).fetchall()
+        if not rows or rows[-1]["version"] != version:
+            return None
+        track_ids: List[str] = []
+        for row in rows:
+            payload = _json_loads(row["payload"])
+            if row["kind"] == "checkpoint":
+                track_ids = payload
+            else:
+                for index in payload["remove"]:
+                    del track_ids[index]
+                track_ids.extend(payload["add"])
+        return track_ids
+
+    def latest(self, name: str) -> Optional[Tuple[int, List[str]]]:
+        with self._lock:
+            version = self._latest_version(name)
+            return None if version is None else (version, self._materialize(name, version))
+
+    def at(self, name: str, version: int) -> Optional[List[str]]:
+        with self._lock:
+            return self._materialize(name, version)
+
+    def record(self, name: str, track_ids: List[str], operation: str, stamp: Optional[str] = None) -> int:
+        """
+        Stores `track_ids` as the next version (no-op if unchanged) and remembers the playlist's
+        'changed' stamp for it. Returns the current version.
+        """
+        with self._lock:
+            self._stamps[name] = stamp
+            latest = self._latest_version(name)
+            previous = None if latest is None else self._materialize(name, latest)
+            if previous == list(track_ids):
+                return latest
+            version = 1 if latest is None else latest + 1
+            if previous is None or version % HISTORY_CHECKPOINT_EVERY == 0:
+                kind, payload = "checkpoint", list(track_ids)
+            else:
+                removes, adds = _playlist_edit_script(previous, list(track_ids))
+                kind, payload = "delta", {"remove": removes, "add": adds}
+            self.db.execute(
+                "INSERT INTO playlist_history (playlist, version, kind, operation, payload, track_count, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (name, version, kind, operation, _json_dumps(payload), len(track_ids), time.time())
+            )
+            self._prune(name, version)
+            return version
+
+    def _prune(self, name: str, latest: int):
+        oldest_kept = latest - HISTORY_MAX_VERSIONS + 1
+        if oldest_kept <= 1:
+            return
+        row = self.db.execute(
+            "SELECT kind FROM playlist_history WHERE playlist = ? AND version = ?", (name, oldest_kept)
+        ).fetchone()
+        if row is not None and row["kind"] != "checkpoint":
+            self.db.execute(
+                "UPDATE playlist_history SET kind = 'checkpoint', payload = ? WHERE playlist = ? AND version = ?",
+                (_json_dumps(self._materialize(name, oldest_kept)), name, oldest_kept)
+            )
+        self.db.execute("DELETE FROM playlist_history WHERE playlist = ? AND version < ?", (name, oldest_kept))
+
+    def versions(self, name: str, limit: int = 50) -> List[Dict]:
+        with self._lock:
+            rows = self.db.execute(
+                "SELECT version, kind, operation, track_count, created_at FROM playlist_history "
+                "WHERE playlist = ? ORDER BY version DESC LIMIT ?", (name, limit)
+            ).fetchall()
+        return [{
+            "version": r["version"],
+            "operation": r["operation"],
+            "tracks": r["track_count"],
+            "stored_as": r["kind"],
+            "created_at": datetime.datetime.fromtimestamp(r["created_at"], datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        } for r in rows]
+
+
+# Ranked candidate sets from get_smart_candidates, addressed by cursor token
+_candidate_cursors = _TTLCache(CURSOR_TTL_SECONDS, CURSOR_MAX_SETS, CURSOR_MAX_ITEMS)
+# Formatted playlist snapshots for paged manage_playlist(get), same bounds as candidate sets
+_playlist_snapshots = _TTLCache(CURSOR_TTL_SECONDS, CURSOR_MAX_SETS, CURSOR_MAX_ITEMS)
+# Remainders of budget-truncated responses, addressed by continuation token
+_response_continuations = _TTLCache(CURSOR_TTL_SECONDS, CURSOR_MAX_SETS, CURSOR_MAX_ITEMS)
+# Running quality counters of playlists being built incrementally
+_assessment_sessions = _TTLCache(SESSION_TTL_SECONDS, CURSOR_MAX_SETS)
+_library = _LibraryIndex()
+_playlists = _PlaylistIndex()
+_tags = _TagIndex()
+_state_db = _open_state_db(STATE_DB_PATH)
+_journal = _WriteJournal(_state_db)
+_history = _PlaylistHistory(_state_db)
+_write_limiter = _RateLimiter(WRITE_RATE_PER_SECOND)
+_journal_wakeup = threading.Event()
+_journal_worker = None
+
+
+def _throttle_write():
+    """
+    Spaces Navidrome write requests issued by the background journal worker
+    (NAVIDROME_WRITE_RATE). Synchronous writes are not throttled: the caller is waiting.
+    """
+    if threading.current_thread() is _journal_worker:
+        _write_limiter.wait()
+
+
+def _reset_state():
+    """
+    Drops the in-process caches (used by tests). The write journal and playlist history
+    live in the state database and are never touched here.
+    """
+    _candidate_cursors.clear()
+    _playlist_snapshots.clear()
+    _response_continuations.clear()
+    _assessment_sessions.clear()
+    _playlists.clear()
+    _tags.clear()
+    _library.clear()
+    _library._scan_generation = None
+    _library._scan_checked_at = 0.0
+
+
 def _calculate_smart_score(s: Dict) -> int:
     """
     Calculates the 'Smart Score' based on user ratings and favorites.
@@ -206,6 +1087,13 @@ def _format_song(s):
         "path": s.get('path', '')
     }
     
+    # Every song the server hands us is a valid catalog member until the next scan
+    _library.mark_known(formatted["id"])
+
+    # Virtual tags from the local reverse index (no extra round trip). Always present so every
+    # call returns the same keys; empty until the index knows the track's tag playlists.
+    formatted["tags"] = _tags.tags_for(formatted["id"])
+
     formatted["smart_score"] = _calculate_smart_score(formatted)
     return formatted
 
@@ -238,21 +1126,1774 @@ def _fetch_search_results(query: str, song_count: int = 20, album_count: int = 0
         return {"song": [], "album": [], "artist": []}
 
 
-def _fetch_albums(criteria: str, size: int = 50, genre: str = None) -> List[Dict]:
+def _fetch_albums(criteria: str, size: int = 50, genre: str = None) -> List[Dict]:
+    """
+    Wrapper for getAlbumList2 to abstract 'ltype' parameter.
+    Criteria: 'frequent', 'newest', 'starred', 'random', 'alphabeticalByName', 'byGenre'
+    """
+    conn = get_conn()
+    try:
+        if criteria == 'byGenre' and genre:
+            res = conn.getAlbumList2(ltype=criteria, genre=genre, size=size)
+        else:
+            res = conn.getAlbumList2(ltype=criteria, size=size)
+        return res.get('albumList2', {}).get('album', [])
+    except Exception as e:
+        logger.error(f"Failed to fetch albums for criteria {criteria}: {e}")
+        return []
+
+
+def _drop_rank_keys(tracks: List[Dict]) -> List[Dict]:
+    """Removes ranking-only keys (mood_score) so they never reach the tool output."""
+    for t in tracks:
+        t.pop('mood_score', None)
+    return tracks
+
+
+def _rank_candidates(candidates: List[Dict], k: int, rng: random.Random, score_key: str = 'smart_score') -> List[Dict]:
+    """
+    Returns the top-k candidates by smart_score in O(n log k), without sorting the full pool.
+    Ties are handled by score bucket: if the k-th slot falls inside a bucket of equal scores,
+    the boundary bucket is sampled uniformly (not by input order), and each bucket is shuffled
+    with the supplied RNG so a seeded generator yields a reproducible ranking.
+    """
+    if k <= 0 or not candidates:
+        return []
+    score = lambda c: c.get(score_key, 0)
+
+    top = heapq.nlargest(k, candidates, key=score)
+    cutoff = score(top[-1])
+
+    above = [c for c in top if score(c) > cutoff]
+    ties = [c for c in candidates if score(c) == cutoff]
+    boundary = rng.sample(ties, min(len(ties), k - len(above)))
+
+    buckets = {}
+    for c in above + boundary:
+        buckets.setdefault(score(c), []).append(c)
+
+    ranked = []
+    for s in sorted(buckets, reverse=True):
+        bucket = buckets[s]
+        rng.shuffle(bucket)
+        ranked.extend(bucket)
+    return ranked
+
+
+def _select_top_candidates(candidates: List[Dict], limit: int, rng: random.Random, score_key: str = 'smart_score') -> List[Dict]:
+    """
+    Smart Selection: keeps the top tier (limit * 2) by smart_score and samples `limit`
+    tracks from it, so results favour quality but still vary between calls.
+    """
+    top_tier = _rank_candidates(candidates, limit * 2, rng, score_key)
+    rng.shuffle(top_tier)
+    return top_tier[:limit]
+
+
+def _diversity_value(track: Dict, dim: str) -> Optional[Any]:
+    """Normalized attribute used for similarity; None never matches anything."""
+    if dim == "decade":
+        year = str(track.get('year') or '')
+        return int(year) // 10 * 10 if year.isdigit() and int(year) > 0 else None
+    value = track.get(dim)
+    if not value or value == 'Unknown':
+        return None
+    return str(value).strip().lower()
+
+
+def _mmr_rerank(
+    candidates: List[Dict],
+    k: int,
+    lambda_: float = DIVERSITY_LAMBDA,
+    weights: Optional[Dict[str, float]] = None,
+    caps: Optional[Dict[str, int]] = None,
+    score_key: str = 'smart_score'
+) -> List[Dict]:
+    """
+    Maximal Marginal Relevance re-ranking.
+
+    Picks k tracks one at a time, maximizing
+        lambda * relevance - (1 - lambda) * max_similarity_to_already_picked
+    where relevance is the normalized score (smart_score by default) and similarity is the weighted share of
+    attributes (artist, album, genre, decade) two tracks have in common.
+
+    Max-similarity is updated incrementally against the last pick only, through per-attribute
+    inverted indexes, so the whole pass is O(n * k) at worst. Caps (e.g. {"artist": 2}) are hard limits
+    per attribute value. On equal MMR values the earlier candidate wins, so callers should
+    pass candidates already ranked.
+    """
+    weights = {d: w for d, w in (weights or DIVERSITY_WEIGHTS).items() if w > 0}
+    caps = {d: c for d, c in (caps or {}).items() if c}
+    dims = list(dict.fromkeys(list(weights) + list(caps)))
+    total_weight = sum(weights.values()) or 1.0
+
+    keys = [[_diversity_value(c, d) for d in dims] for c in candidates]
+    scores = [c.get(score_key, 0) for c in candidates]
+    lo, hi = (min(scores), max(scores)) if scores else (0, 0)
+    span = (hi - lo) or 1
+    relevance = [(sc - lo) / span for sc in scores]
+
+    # Inverted index per attribute: value -> candidate positions sharing it
+    groups = [{} for _ in dims]
+    for i, row in enumerate(keys):
+        for j, value in enumerate(row):
+            if value is not None:
+                groups[j].setdefault(value, []).append(i)
+    dim_weights = [weights.get(d, 0) / total_weight for d in dims]
+    cap_slots = [(dims.index(d), limit, Counter()) for d, limit in caps.items()]
+
+    max_sim = [0.0] * len(candidates)
+    alive = [True] * len(candidates)
+    remaining = list(range(len(candidates)))
+    novelty = 1 - lambda_
+    picked = []
+
+    while remaining and len(picked) < k:
+        best, best_value = None, None
+        for i in remaining:
+            value = lambda_ * relevance[i] - novelty * max_sim[i]
+            if best_value is None or value > best_value:
+                best, best_value = i, value
+        picked.append(best)
+        alive[best] = False
+        best_keys = keys[best]
+
+        # Incremental bookkeeping: only candidates sharing an attribute with the pick change
+        shared = {}
+        for j, value in enumerate(best_keys):
+            if value is not None and dim_weights[j]:
+                for i in groups[j][value]:
+                    shared[i] = shared.get(i, 0.0) + dim_weights[j]
+        for i, sim in shared.items():
+            if sim > max_sim[i]:
+                max_sim[i] = sim
+
+        capped = False
+        for j, limit, counts in cap_slots:
+            value = best_keys[j]
+            if value is None:
+                continue
+            counts[value] += 1
+            if counts[value] >= limit:
+                for i in groups[j][value]:
+                    alive[i] = False
+                capped = True
+        remaining = [i for i in remaining if alive[i]] if capped else [i for i in remaining if i != best]
+
+    return [candidates[i] for i in picked]
+
+
+# --- MOOD REGISTRY & TRACK FILTERS ---
+
+_RANGE_FIELDS = ("bpm", "year", "duration")
+
+
+@functools.lru_cache(maxsize=256)
+def _compile_track_filter(
+    include_genres: Tuple[str, ...] = (),
+    exclude_genres: Tuple[str, ...] = (),
+    ranges: Tuple[Tuple[str, Optional[int], Optional[int]], ...] = ()
+) -> Callable[[Dict], bool]:
+    """
+    Compiles a filter spec into a single predicate over formatted tracks.
+    Genre terms are case-insensitive substring matches. For numeric ranges a missing value (0)
+    fails a lower bound (strict, see the BPM loophole fix) but passes an upper bound.
+    Cached per spec, so each distinct mood/filter combination is compiled only once.
+    """
+    include = tuple(g.lower() for g in include_genres)
+    exclude = tuple(g.lower() for g in exclude_genres)
+    bounds = tuple((f, lo, hi) for f, lo, hi in ranges if lo or hi)
+
+    def predicate(track: Dict) -> bool:
+        if include or exclude:
+            genre = (track.get('genre') or '').lower()
+            if include and not any(term in genre for term in include):
+                return False
+            if exclude and any(term in genre for term in exclude):
+                return False
+        for f, lo, hi in bounds:
+            try:
+                value = int(track.get(f) or 0)
+            except (TypeError, ValueError):
+                value = 0
+            if lo and value < lo:
+                return False
+            if hi and value > 0 and value > hi:
+                return False
+        return True
+
+    return predicate
+
+
+@dataclass(frozen=True)
+class MoodProfile:
+    """A named set of filters and score weights loaded from the mood registry."""
+    name: str
+    description: str = ""
+    include_genres: Tuple[str, ...] = ()
+    exclude_genres: Tuple[str, ...] = ()
+    ranges: Dict[str, Tuple[Optional[int], Optional[int]]] = field(default_factory=dict)
+    # Genre term -> smart score bonus used for ranking (e.g. {"ambient": 2})
+    score_weights: Dict[str, float] = field(default_factory=dict)
+
+    def resolve(
+        self,
+        include_genres: Optional[List[str]] = None,
+        exclude_genres: Optional[List[str]] = None,
+        **overrides: Optional[int]
+    ) -> Callable[[Dict], bool]:
+        """
+        Merges request arguments into the profile and returns the compiled predicate.
+        Genre lists are combined; explicit min_/max_ values override the profile bounds.
+        """
+        ranges = []
+        for f in _RANGE_FIELDS:
+            lo, hi = self.ranges.get(f, (None, None))
+            if overrides.get(f"min_{f}") is not None: lo = overrides[f"min_{f}"]
+            if overrides.get(f"max_{f}") is not None: hi = overrides[f"max_{f}"]
+            ranges.append((f, lo, hi))
+        return _compile_track_filter(
+            tuple(dict.fromkeys(self.include_genres + tuple(include_genres or ()))),
+            tuple(dict.fromkeys(self.exclude_genres + tuple(exclude_genres or ()))),
+            tuple(ranges)
+        )
+
+    def score(self, track: Dict) -> float:
+        """Smart score plus the mood's genre bonuses."""
+        base = track.get('smart_score', 0)
+        if not self.score_weights:
+            return base
+        genre = (track.get('genre') or '').lower()
+        return base + sum(w for term, w in self.score_weights.items() if term in genre)
+
+
+# Neutral profile used when no mood is requested
+_NO_MOOD = MoodProfile(name="none")
+
+
+def _load_mood_registry(path: str) -> Dict[str, MoodProfile]:
+    """
+    Loads mood profiles from a JSON file and compiles their default predicates.
+    A missing or invalid file is logged and yields an empty registry (moods are ignored).
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            raw = json.load(f)
+    except Exception as e:
+        logger.error(f"Failed to load mood registry from {path}: {e}", extra={"action": "startup_mood_error"})
+        return {}
+
+    registry = {}
+    for name, spec in raw.items():
+        profile = MoodProfile(
+            name=name.lower(),
+            description=spec.get("description", ""),
+            include_genres=tuple(spec.get("include_genres", [])),
+            exclude_genres=tuple(spec.get("exclude_genres", [])),
+            ranges={f: (spec.get(f"min_{f}"), spec.get(f"max_{f}")) for f in _RANGE_FIELDS},
+            score_weights={k.lower(): v for k, v in spec.get("score_weights", {}).items()}
+        )
+        profile.resolve()  # warm the compiled predicate for the plain mood
+        registry[profile.name] = profile
+    return registry
+
+
+MOOD_REGISTRY = _load_mood_registry(MOODS_FILE)
+
+
+def _encode_cursor(set_id: str, offset: int) -> str:
+    return f"{set_id}:{offset}"
+
+
+def _project_fields(tracks: List[Dict], fields: Optional[List[str]]) -> List[Dict]:
+    """Keeps only the requested keys of each track ('id' is always kept)."""
+    if not fields:
+        return tracks
+    keep = ["id"] + [f for f in fields if f != "id"]
+    return [{k: t[k] for k in keep if k in t} for t in tracks]
+
+
+def _check_track_format(format: str) -> Optional[str]:
+    if format not in TRACK_FORMATS:
+        return f"Error: Unknown format '{format}'. Use one of {list(TRACK_FORMATS)}."
+    return None
+
+
+def _shape_tracks(tracks: List[Dict], fields: Optional[List[str]] = None, format: str = "json") -> Any:
+    """
+    Projects a track list to the requested fields and layout:
+    'json'/'compact' keep one object per track, 'columnar' sends the keys once as
+    {"columns", "rows"}, 'ids' returns the bare ID list.
+    """
+    if format == "ids":
+        return [t.get("id") for t in tracks]
+    tracks = _project_fields(tracks, fields)
+    if format == "columnar":
+        columns = list(dict.fromkeys(k for t in tracks for k in t))
+        return {"columns": columns, "rows": [[t.get(c) for c in columns] for t in tracks]}
+    return tracks
+
+
+def _payload_of(text: str) -> Any:
+    """The object behind a tool response: its payload if it has one, else the text itself."""
+    payload = getattr(text, "payload", None)
+    return text if payload is None else payload
+
+
+class _ToolResult(str):
+    """
+    A serialized tool response (what the client receives) that also keeps the object it was
+    built from and optional summary metadata. log_execution logs `meta` (or a summary derived
+    from `payload`) without parsing the text again. Pages of a cached set carry the set ID in
+    `page_set`, so a budget cut can move their cursor instead of caching a continuation.
+    """
+    payload: Any = None
+    meta: Optional[Dict] = None
+    page_set: Optional[str] = None
+
+
+def _dumps(payload: Any, format: str = "json", meta: Optional[Dict] = None) -> str:
+    """Pretty JSON for the default format, whitespace-free JSON for the compact ones."""
+    text = _ToolResult(_json_dumps(payload, indent=format == "json"))
+    text.payload = payload
+    text.meta = meta
+    return text
+
+
+def _format_tracks(tracks: List[Dict], fields: Optional[List[str]] = None, format: str = "json") -> str:
+    """Shared response formatter of the track-returning tools."""
+    return _dumps(_shape_tracks(tracks, fields, format), format)
+
+
+def _page_cached_set(cache: _TTLCache, cursor: str, page_size: int, expired_hint: str,
+                     fields: Optional[List[str]] = None, extra: Optional[Dict] = None,
+                     format: str = "json") -> str:
+    """
+    Serves one page of a cached ordered set. The cursor carries the set ID and the offset,
+    so pages can be re-read or skipped without any call to Navidrome.
+    """
+    set_id, _, offset_str = cursor.partition(":")
+    items = cache.get(set_id)
+    if items is None:
+        return f"Error: Cursor '{cursor}' has expired or is unknown. {expired_hint}"
+    try:
+        offset = max(0, int(offset_str or 0))
+    except ValueError:
+        return f"Error: Malformed cursor '{cursor}'."
+
+    page = items[offset:offset + page_size]
+    next_offset = offset + len(page)
+    text = _dumps({
+        **(extra or {}),
+        "cursor": _encode_cursor(set_id, next_offset) if next_offset < len(items) else None,
+        "offset": offset,
+        "total": len(items),
+        "tracks": _shape_tracks(page, fields, format)
+    }, format)
+    text.page_set = set_id
+    return text
+
+
+def _page_candidates(cursor: str, page_size: int, fields: Optional[List[str]] = None, format: str = "json") -> str:
+    """Serves one page of a cached ranked candidate set from get_smart_candidates."""
+    return _page_cached_set(
+        _candidate_cursors, cursor, page_size, "Re-run get_smart_candidates without cursor.",
+        fields=fields, format=format
+    )
+
+
+# --- RESPONSE BUDGET ---
+
+def _fit_prefix(render: Callable[[int], str], n: int, budget_bytes: int) -> Tuple[int, str]:
+    """
+    Largest k (at least 1, so every call makes progress) whose rendering of the first
+    k items fits the budget. Binary search: O(log n) renderings of budget-sized output.
+    """
+    lo, hi = 1, n
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if len(render(mid)) <= budget_bytes:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo, render(lo)
+
+
+def _is_columnar(value: Any) -> bool:
+    return isinstance(value, dict) and isinstance(value.get("columns"), list) and isinstance(value.get("rows"), list)
+
+
+def _truncate_response(text: str, max_tokens: int) -> str:
+    """
+    Cuts an oversized JSON result at a list boundary: a top-level list, or the largest
+    list inside a top-level object (for a columnar {"columns", "rows"} value, its rows).
+    A page of a cached set is shortened and its cursor moved to the first track left out;
+    any other remainder is cached under a continuation token. Plain-text results and objects
+    without lists are returned unchanged. Reads the payload the response was serialized
+    from, so nothing is parsed back.
+    """
+    budget = max_tokens * BYTES_PER_TOKEN
+    if len(text) <= budget:
+        return text
+    payload = getattr(text, "payload", None)
+    columns = None
+    if isinstance(payload, list):
+        key, items = "items", payload
+    elif isinstance(payload, dict):
+        lists = [(k, v["rows"] if _is_columnar(v) else v) for k, v in payload.items()
+                 if isinstance(v, list) or _is_columnar(v)]
+        if not lists:
+            return text
+        key, items = max(lists, key=lambda kv: len(_json_dumps(kv[1])))
+        if _is_columnar(payload[key]):
+            columns = payload[key]["columns"]
+        elif key == "rows" and isinstance(payload.get("columns"), list):
+            columns = payload["columns"]
+    else:
+        return text
+    if len(items) < 2:
+        return text
+
+    fmt = "json" if "\n" in text else "compact"
+
+    def body(k):
+        if isinstance(payload, list):
+            out = {key: items[:k]}
+        else:
+            value = {**payload[key], "rows": items[:k]} if _is_columnar(payload[key]) else items[:k]
+            out = {**payload, key: value}
+        out["truncated"] = {"key": key, "returned": k, "total": len(items)}
+        return out
+
+    page_set = getattr(text, "page_set", None)
+    if page_set is not None and key == "tracks":
+        # Paging continues with the cursor, starting at the first track cut from this page
+        def render(k):
+            out = body(k)
+            if k < len(items):
+                out["cursor"] = _encode_cursor(page_set, payload["offset"] + k)
+            return _dumps(out, fmt)
+        return _fit_prefix(render, len(items), budget)[1]
+
+    entry = {"key": "rows" if columns is not None else key, "items": items}
+    if columns is not None:
+        entry["columns"] = columns
+    set_id = _response_continuations.put(entry, size=len(items))
+
+    def render(k):
+        out = body(k)
+        out["continuation"] = _encode_cursor(set_id, k) if k < len(items) else None
+        return _dumps(out, fmt)
+
+    return _fit_prefix(render, len(items), budget)[1]
+
+
+def budgeted_response(func):
+    """
+    Adds a `max_response_tokens` argument to a tool (defaults to NAVIDROME_RESPONSE_TOKEN_BUDGET,
+    0 = unlimited) and truncates larger results with a continuation token.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, max_response_tokens: Optional[int] = None, **kwargs):
+        result = func(*args, **kwargs)
+        budget = RESPONSE_TOKEN_BUDGET if max_response_tokens is None else max_response_tokens
+        if budget > 0 and isinstance(result, str):
+            return _truncate_response(result, budget)
+        return result
+
+    # Expose the extra argument in the tool schema
+    signature = inspect.signature(func)
+    extra = inspect.Parameter("max_response_tokens", inspect.Parameter.KEYWORD_ONLY,
+                              default=None, annotation=Optional[int])
+    wrapper.__signature__ = signature.replace(parameters=[*signature.parameters.values(), extra])
+    return wrapper
+
+
+def _fetch_album_tracks(conn, album_id: str) -> List[Dict]:
+    """
+    Ordered raw songs of an album. Served from the local library index when possible,
+    otherwise fetched with one getMusicDirectory call and recorded for later requests.
+    """
+    cached = _library.album_tracks(album_id)
+    if cached is not None:
+        return cached
+    res = conn.getMusicDirectory(album_id)
+    songs = [s for s in res.get('directory', {}).get('child', []) if not s.get('isDir')]
+    _library.record_album(album_id, songs)
+    return songs
+
+
+def _resolve_playlist_id(conn, name: str) -> Optional[str]:
+    entry = _playlists.lookup(conn, name)
+    return entry["id"] if entry else None
+
+
+def _create_playlist(conn, name: str, song_ids: List[str]) -> Optional[str]:
+    """
+    Creates a playlist and returns its ID. Servers implementing API 1.14+ return the new
+    playlist in the createPlaylist response; older ones return an empty body, in which case
+    the index is reloaded once to find it.
+    """
+    _throttle_write()
+    res = conn.createPlaylist(name=name, songIds=song_ids)
+    created = res.get('playlist') if isinstance(res, dict) else None
+    if isinstance(created, dict) and created.get('id'):
+        _playlists.record(name, created['id'], created.get('songCount', len(song_ids)), created.get('changed'))
+        return created['id']
+
+    time.sleep(0.5)  # Wait a beat for server consistency before listing
+    _playlists.refresh(conn)
+    return _resolve_playlist_id(conn, name)
+
+
+def _playlist_edit_script(current: List[str], target: List[str]) -> Tuple[List[int], List[str]]:
+    """
+    Minimal edit script under Subsonic updatePlaylist semantics (remove by index, append at end).
+    Keeps the longest prefix of `target` that already appears in order in `current` (greedy
+    subsequence scan, O(n)), removes every other entry and appends the rest of `target`.
+    Returns (indexes_to_remove in descending order, ids_to_add).
+    """
+    removes = []
+    j = 0
+    for i, tid in enumerate(current):
+        if j < len(target) and tid == target[j]:
+            j += 1
+        else:
+            removes.append(i)
+    removes.reverse()
+    return removes, list(target[j:])
+
+
+def _request_budget() -> int:
+    """Usable bytes for list parameters in one write request (query string for GET, body for POST)."""
+    overhead = len(NAVIDROME_URL) + 256  # view path, auth token/salt, client params, playlistId
+    return (MAX_URL_LENGTH if USE_GET else MAX_BODY_LENGTH) - overhead
+
+
+def _chunk_by_length(params: List[Tuple[str, Any]], budget: Optional[int] = None) -> List[List[Tuple[str, Any]]]:
+    """
+    Packs (name, value) list parameters greedily into requests whose encoded length stays
+    within the budget. Every chunk holds at least one parameter.
+    """
+    budget = _request_budget() if budget is None else budget
+    chunks, current, used = [], [], 0
+    for name, value in params:
+        cost = len(urlencode({name: value})) + 1
+        if current and used + cost > budget:
+            chunks.append(current)
+            current, used = [], 0
+        current.append((name, value))
+        used += cost
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _first_batch(track_ids: List[str]) -> List[str]:
+    """The IDs that fit in a createPlaylist request."""
+    chunks = _chunk_by_length([('songId', tid) for tid in track_ids])
+    return [tid for _, tid in chunks[0]] if chunks else []
+
+
+def _send_bisect(send: Callable[[List[str]], Any], ids: List[str]) -> Dict:
+    """
+    Sends IDs with send(ids). A failing batch is split in halves and retried, so a single
+    bad ID only costs O(log n) extra requests instead of failing the whole batch.
+    Returns {"landed", "failed", "requests"}.
+    """
+    report = {"landed": [], "failed": [], "requests": 0}
+    stack = [ids]
+    while stack:
+        batch = stack.pop()
+        if not batch:
+            continue
+        report["requests"] += 1
+        _throttle_write()
+        try:
+            send(batch)
+            report["landed"].extend(batch)
+        except Exception as e:
+            if len(batch) == 1:
+                logger.warning(f"Playlist write rejected track {batch[0]}: {e}")
+                report["failed"].append(batch[0])
+            else:
+                mid = len(batch) // 2
+                stack.extend([batch[mid:], batch[:mid]])  # left half is retried first
+    return report
+
+
+def _append_tracks(conn, pl_id: str, track_ids: List[str], report: Optional[Dict] = None,
+                   on_batch: Optional[Callable[[], None]] = None) -> Dict:
+    """
+    Appends IDs in length-aware batches, bisecting failed batches. Results accumulate into
+    `report` (if given) and on_batch() runs after each batch, e.g. to checkpoint progress.
+    """
+    report = report if report is not None else {"landed": [], "failed": [], "requests": 0}
+    for chunk in _chunk_by_length([('songIdToAdd', tid) for tid in track_ids]):
+        part = _send_bisect(lambda ids: conn.updatePlaylist(pl_id, songIdsToAdd=ids), [tid for _, tid in chunk])
+        for key in ("landed", "failed", "requests"):
+            report[key] += part[key]
+        if on_batch:
+            on_batch()
+    return report
+
+
+def _playlist_track_ids(conn, pl_id: str) -> List[str]:
+    entries = conn.getPlaylist(pl_id).get('playlist', {}).get('entry', [])
+    return [e.get('id') for e in entries]
+
+
+def _verify_track_ids(conn, track_ids: List[str]) -> Tuple[List[str], List[str]]:
+    """
+    Splits IDs into (valid, dropped). IDs in the catalog membership set are accepted locally;
+    only never-seen IDs are checked with getSong. This prevents "Success" responses when
+    tracks are actually silently rejected by the API.
+    """
+    _library.sync(conn)
+    rejected = set()
+    for tid in dict.fromkeys(track_ids):
+        if _library.is_known(tid):
+            continue
+        try:
+            res = conn.getSong(tid)
+            if res.get('song'):
+                _library.record_songs([res['song']])
+                _library.mark_known(tid)
+            else:
+                rejected.add(tid)
+        except Exception:
+            rejected.add(tid)
+    valid_ids = [tid for tid in track_ids if tid not in rejected]
+    dropped_ids = [tid for tid in track_ids if tid in rejected]
+    return valid_ids, dropped_ids
+
+
+def _create_with_first_batch(conn, name: str, track_ids: List[str]) -> Tuple[Optional[str], List[str]]:
+    """
+    Creates a playlist holding the first request-sized batch of `track_ids`.
+    Returns (playlist_id, ids_written); the caller appends the remainder.
+    """
+    first = _first_batch(track_ids)
+    try:
+        return _create_playlist(conn, name, first), list(first)
+    except Exception as e:
+        # A bad ID in the first batch: create empty, then let bisection isolate it
+        logger.warning(f"createPlaylist with tracks failed ({e}); creating '{name}' empty.")
+        return _create_playlist(conn, name, []), []
+
+
+def _sync_playlist(conn, pl_id: str, target_ids: List[str], current: Optional[List[str]] = None) -> Dict:
+    """
+    Brings an existing playlist to `target_ids` in place (the playlist ID is preserved).
+    Removals go out highest index first so earlier indexes stay valid between requests;
+    appends never shift existing indexes, so removals and appends share requests.
+    Pass `current` when the playlist contents were just fetched to skip the getPlaylist call.
+    """
+    if current is None:
+        current = _playlist_track_ids(conn, pl_id)
+    removes, adds = _playlist_edit_script(current, target_ids)
+
+    report = {"landed": [], "failed": [], "requests": 0}
+    params = [('songIndexToRemove', i) for i in removes] + [('songIdToAdd', tid) for tid in adds]
+    for chunk in _chunk_by_length(params):
+        chunk_removes = [v for k, v in chunk if k == 'songIndexToRemove']
+        chunk_adds = [v for k, v in chunk if k == 'songIdToAdd']
+        kwargs = {}
+        if chunk_removes: kwargs['songIndexesToRemove'] = chunk_removes
+        if chunk_adds: kwargs['songIdsToAdd'] = chunk_adds
+        report["requests"] += 1
+        _throttle_write()
+        try:
+            conn.updatePlaylist(pl_id, **kwargs)
+            report["landed"].extend(chunk_adds)
+        except Exception:
+            if not chunk_adds:
+                raise
+            # Apply the removals on their own, then isolate the bad IDs among the additions
+            if chunk_removes:
+                _throttle_write()
+                conn.updatePlaylist(pl_id, songIndexesToRemove=chunk_removes)
+                report["requests"] += 1
+            part = _send_bisect(lambda ids: conn.updatePlaylist(pl_id, songIdsToAdd=ids), chunk_adds)
+            for key in report:
+                report[key] += part[key]
+
+    report.update({
+        "kept": len(current) - len(removes),
+        "removed": len(removes),
+        "added": len(report["landed"])
+    })
+    return report
+
+
+def _apply_playlist_write(conn, job: Dict, checkpoint: Callable[[Dict], None]) -> str:
+    """
+    Executes a journaled create/append/sync job and returns its JSON report.
+    After the playlist exists, progress (playlist ID and IDs processed so far) is checkpointed
+    after every batch; a resumed job continues from there instead of re-appending tracks.
+    Sync jobs are idempotent and simply re-run.
+    """
+    name, operation, track_ids = job["name"], job["operation"], job["track_ids"]
+    progress = job.get("progress") or {}
+
+    # --- ID VERIFICATION (Sync Ghost Fix) ---
+    valid_ids, dropped_ids = _verify_track_ids(conn, track_ids)
+
+    if not valid_ids:
+        return f"Error: All {len(track_ids)} provided track IDs were invalid or stale. No changes made."
+        
+    if dropped_ids:
+        logger.warning(f"Dropped {len(dropped_ids)} stale/ghost IDs from playlist request: {dropped_ids}")
+        # Update the working list to only include valid IDs
+        track_ids = valid_ids
+
+    # Contents before this write, so the history can always undo it (live unless appending)
+    before = _history_baseline(conn, name, live=operation != "append")
+
+    # --- BATCHED WRITES ---
+    # Batch sizes follow the encoded request length; the report lists exactly which IDs landed
+    writes = {
+        "landed": list(progress.get("landed", [])),
+        "failed": list(progress.get("failed", [])),
+        "requests": progress.get("requests", 0)
+    }
+    pl_id = progress.get("playlist_id")
+
+    def save():
+        checkpoint({"playlist_id": pl_id, **writes})
+
+    def report(message: str, after: List[str]) -> str:
+        return _dumps({
+            "result": message,
+            "playlist_id": pl_id,
+            "landed": writes["landed"],
+            "failed": writes["failed"],
+            "dropped": dropped_ids,
+            "requests": writes["requests"],
+            "version": _history.record(name, after, operation, _playlists.stamp(name))
+        })
+
+    def create_with_first_batch() -> Optional[str]:
+        new_id, first = _create_with_first_batch(conn, name, track_ids)
+        writes.update({"landed": list(first), "failed": [], "requests": 1})
+        return new_id
+
+    def append_remaining():
+        processed = len(writes["landed"]) + len(writes["failed"])
+        if pl_id and processed < len(track_ids):
+            _append_tracks(conn, pl_id, track_ids[processed:], writes, on_batch=save)
+
+    if operation == "create":
+        if not pl_id:
+            existing_id = _resolve_playlist_id(conn, name)
+            if existing_id:
+                # Subsonic API might allow duplicates, we enforce unique name by ID
+                conn.deletePlaylist(existing_id)
+                _playlists.forget(name)
+                _tags.forget(name)
+                logger.info(f"Deleted existing playlist: {name} (ID: {existing_id})")
+            pl_id = create_with_first_batch()
+            save()
+        if not pl_id and len(writes["landed"]) < len(track_ids):
+            return f"Warning: Created playlist '{name}' but could not verify existence for batch appending. Only first {len(writes['landed'])} tracks saved."
+        append_remaining()
+        if pl_id:
+            changed = _playlists.record(name, pl_id, song_count=len(writes["landed"]))
+            _tags.set_playlist(name, writes["landed"], changed)
+        logger.info(f"Created playlist '{name}' with {len(writes['landed'])} tracks ({writes['requests']} requests).")
+        return report(f"Created playlist '{name}' with {len(writes['landed'])} tracks ({writes['requests']} batches).", writes["landed"])
+
+    elif operation == "sync":
+        existing_id = pl_id or _resolve_playlist_id(conn, name)
+        if not existing_id:
+            pl_id = create_with_first_batch()
+            if not pl_id:
+                return f"Warning: Created playlist '{name}' but could not resolve its ID to sync the remaining tracks."
+            save()
+            append_remaining()
+            changed = _playlists.record(name, pl_id, song_count=len(writes["landed"]))
+            _tags.set_playlist(name, writes["landed"], changed)
+            return report(f"Synced playlist '{name}' (ID: {pl_id}): created with {len(writes['landed'])} tracks.", writes["landed"])
+        pl_id = existing_id
+        stats = _sync_playlist(conn, pl_id, track_ids)
+        writes.update({k: stats[k] for k in ("landed", "failed", "requests")})
+        changed = _playlists.record(name, pl_id, song_count=stats["kept"] + stats["added"])
+        rejected = set(stats["failed"])
+        after = [tid for tid in track_ids if tid not in rejected]
+        _tags.set_playlist(name, after, changed)
+        return report(
+            f"Synced playlist '{name}' (ID: {pl_id}): kept {stats['kept']}, removed {stats['removed']}, "
+            f"added {stats['added']} ({stats['requests']} requests).",
+            after
+        )
+
+    elif operation == "append":
+        if not pl_id:
+            pl_id = _resolve_playlist_id(conn, name)
+            if not pl_id:
+                pl_id = create_with_first_batch()
+                if not pl_id:
+                    return f"Created new playlist '{name}' with initial batch, but failed to resolve ID for full append."
+            save()
+        append_remaining()
+        after = before + writes["landed"]
+        _tags.add(name, writes["landed"], _playlists.record(name, pl_id, song_count=len(after)))
+        return report(f"Appended {len(writes['landed'])} tracks to '{name}' ({writes['requests']} batches).", after)
+
+    return f"Unknown operation: {operation}"
+
+
+def _history_baseline(conn, name: str, live: bool = False) -> List[str]:
+    """
+    Current contents of a playlist as known to the history, recorded before a write.
+
+    Destructive writes (create, sync, restore, delete) pass live=True and always read the
+    playlist from the server (one getPlaylist call): the cached index only sees our own
+    writes until its TTL expires, so hand edits made in between would otherwise be replaced
+    without ever being stored. Appends trust the latest stored version while it matches the
+    playlist index (track count and 'changed' stamp). Whenever the live contents differ from
+    the latest version they are recorded first, so a restore can bring them back.
+    """
+    latest = _history.latest(name)
+    entry = _playlists.lookup(conn, name)
+    if entry is None:
+        if latest is not None and latest[1]:
+            _history.record(name, [], "external")
+        return []
+    if (not live and latest is not None and entry.get("song_count") in (None, len(latest[1]))
+            and _history.stamp(name) in (None, entry.get("changed"))):
+        return latest[1]
+    current = _playlist_track_ids(conn, entry["id"])
+    _history.record(name, current, "baseline" if latest is None else "external", entry.get("changed"))
+    return current
+
+
+def _run_playlist_job(conn, job: Optional[Dict]) -> str:
+    """Runs a claimed job to completion, recording the outcome in the journal."""
+    if job is None:
+        return "Error: Playlist job is no longer pending (already claimed by another writer)."
+    try:
+        result = _apply_playlist_write(conn, job, lambda progress: _journal.checkpoint(job["id"], progress))
+    except Exception as e:
+        _journal.fail(job["id"], str(e))
+        raise
+    _journal.finish(job["id"], result)
+    return result
+
+
+def _process_pending_jobs() -> int:
+    """Applies every pending journal job in submission order. Returns how many ran."""
+    processed = 0
+    while True:
+        job = _journal.claim()
+        if job is None:
+            return processed
+        processed += 1
+        try:
+            _run_playlist_job(get_conn(), job)
+        except Exception as e:
+            logger.error(f"Playlist job {job['id']} failed: {e}", extra={"action": "journal_job_failed"})
+
+
+def _journal_worker_loop():
+    while True:
+        _journal_wakeup.wait(timeout=30)
+        _journal_wakeup.clear()
+        try:
+            _process_pending_jobs()
+        except Exception as e:
+            logger.error(f"Playlist journal worker error: {e}", extra={"action": "journal_worker_error"})
+
+
+def _ensure_journal_worker():
+    """Starts the background worker once and wakes it up."""
+    global _journal_worker
+    if _journal_worker is None or not _journal_worker.is_alive():
+        _journal_worker = threading.Thread(target=_journal_worker_loop, name="playlist-journal", daemon=True)
+        _journal_worker.start()
+    _journal_wakeup.set()
+
+
+def _job_summary(job: Dict) -> Dict:
+    progress = job.get("progress") or {}
+    summary = {
+        "job_id": job["id"],
+        "status": job["status"],
+        "name": job["name"],
+        "operation": job["operation"],
+        "total_tracks": len(job["track_ids"]),
+        "landed_so_far": len(progress.get("landed", [])),
+        "attempts": job["attempts"]
+    }
+    if job.get("result"):
+        summary["result"] = _json_loads(job["result"]) if job["result"].startswith("{") else job["result"]
+    if job.get("error"):
+        summary["error"] = job["error"]
+    return summary
+
+
+def _tag_playlist_name(tag: str) -> str:
+    """
+    'Focus' -> 'NG:Mood:Focus'; names in a VIRTUAL_TAG_PREFIXES namespace are kept as-is.
+    Any other name containing ':' raises ValueError, so ordinary playlists such as
+    'Road Trip: 2024' can never be edited as tags.
+    """
+    tag = str(tag).strip()
+    if tag.startswith(VIRTUAL_TAG_PREFIXES):
+        if tag in VIRTUAL_TAG_PREFIXES:
+            raise ValueError(f"Tag '{tag}' has no name after the prefix.")
+        return tag
+    if not tag:
+        raise ValueError("Tag names must not be empty.")
+    if ":" in tag:
+        raise ValueError(f"Tag '{tag}' is not in a virtual-tag namespace {list(VIRTUAL_TAG_PREFIXES)}; "
+                         f"use a bare name or one of those prefixes.")
+    return f"{DEFAULT_TAG_PREFIX}{tag}"
+
+
+def _group_tag_assignments(assignments: Dict) -> Dict[str, Dict[str, List[str]]]:
+    """Inverts {track_id: {"add": [...], "remove": [...]}} into {playlist: {"add": ids, "remove": ids}}."""
+    groups: Dict[str, Dict[str, List[str]]] = {}
+    for track_id, change in assignments.items():
+        if isinstance(change, (list, tuple)):
+            change = {"add": change}
+        for op in ("add", "remove"):
+            for tag in change.get(op) or []:
+                ids = groups.setdefault(_tag_playlist_name(tag), {"add": [], "remove": []})[op]
+                if track_id not in ids:
+                    ids.append(track_id)
+    return groups
+
+
+def _normalize_text(value: Optional[str]) -> str:
+    """Case/accent/punctuation-insensitive form used to match titles and artists."""
+    text = unicodedata.normalize("NFKD", str(value or "")).casefold()
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(re.sub(r"[^\w]+", " ", text).split())
+
+
+def _normalize_path(value: Optional[str]) -> str:
+    """Case-insensitive forward-slash path with leading './' and '/' prefixes removed ('../' is kept)."""
+    path = str(value or "").replace("\\", "/")
+    while path.startswith(("./", "/")):
+        path = path.removeprefix("./").removeprefix("/")
+    return path.casefold()
+
+
+def _iter_m3u8(lines) -> Iterator[Dict]:
+    """Streams entries of an (extended) M3U playlist: {"path", "artist", "title", "duration"}."""
+    info = {}
+    for raw in lines:
+        line = raw.strip()
+        if not line:
+            continue
+        if line.startswith("#EXTINF:"):
+            duration, _, label = line[len("#EXTINF:"):].partition(",")
+            artist, sep, title = label.partition(" - ")
+            info = {"artist": artist.strip(), "title": title.strip()} if sep else {"title": label.strip()}
+            try:
+                info["duration"] = int(float(duration))
+            except ValueError:
+                pass
+        elif not line.startswith("#"):
+            yield {"path": line, **info}
+            info = {}
+
+
+def _iter_jsonl(lines) -> Iterator[Dict]:
+    for number, raw in enumerate(lines, 1):
+        if raw.strip():
+            try:
+                yield _json_loads(raw)
+            except ValueError:
+                logger.warning(f"Skipping malformed JSONL line {number}")
+
+
+class _TrackMatcher:
+    """
+    Local path and artist/title index for playlist import, filled from search3 results.
+    Entries are matched by path first, then by normalized (artist, title); each distinct
+    query is searched at most once.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.by_path: Dict[str, str] = {}
+        self.by_key: Dict[Tuple[str, str], str] = {}
+        self._searched = set()
+
+    def add(self, songs: List[Dict]):
+        _library.record_songs(songs)
+        for song in songs:
+            if song.get('path'):
+                self.by_path.setdefault(_normalize_path(song['path']), song['id'])
+            self.by_key.setdefault((_normalize_text(song.get('artist')), _normalize_text(song.get('title'))), song['id'])
+
+    def _lookup(self, path: str, key: Tuple[str, str]) -> Tuple[Optional[str], Optional[str]]:
+        if path and path in self.by_path:
+            return self.by_path[path], "path"
+        if key[1] and key in self.by_key:
+            return self.by_key[key], "artist_title"
+        return None, None
+
+    def match(self, entry: Dict) -> Tuple[Optional[str], Optional[str]]:
+        """Returns (track_id, matched_by) or (None, None)."""
+        path = _normalize_path(entry.get('path'))
+        title = entry.get('title')
+        if not title and entry.get('path'):
+            # Bare M3U: fall back to the file name without track number and extension
+            title = re.sub(r"^\d+[\s.\-_]*", "", Path(entry['path']).stem)
+        key = (_normalize_text(entry.get('artist')), _normalize_text(title))
+
+        found = self._lookup(path, key)
+        if found[0]:
+            return found
+        query = " ".join(part for part in (entry.get('artist'), title) if part)
+        if query and query not in self._searched:
+            self._searched.add(query)
+            res = self.conn.search3(query, songCount=20, albumCount=0, artistCount=0)
+            songs = res.get('searchResult3', {}).get('song', [])
+            self.add(songs if isinstance(songs, list) else [songs])
+            return self._lookup(path, key)
+        return None, None
+
+
+# --- DUPLICATE DETECTION ---
+
+_VERSION_WORDS = r"(remaster(ed)?|live|version|mix|edit|mono|stereo|demo|acoustic|bonus|deluxe|single|radio|instrumental|take)"
+_BRACKETS_RE = re.compile(r"[\(\[][^\)\]]*[\)\]]")
+_VERSION_SUFFIX_RE = re.compile(r"\s+[-/]\s+[^-]*\b" + _VERSION_WORDS + r"\b.*$", re.IGNORECASE)
+_FEAT_RE = re.compile(r"\s+(feat\.?|ft\.?|featuring)\s.*$", re.IGNORECASE)
+# Bracketed parts that name a different piece, not a different release of it
+_REMIX_RE = re.compile(r"\bremix", re.IGNORECASE)
+_QUALIFIER_RE = re.compile(r"\d|\b(part|pt|no|nr|vol|volume|chapter|movement|act)\b", re.IGNORECASE)
+_RELEASE_RE = re.compile(r"\b" + _VERSION_WORDS + r"\b|\b(feat|ft|featuring)\b", re.IGNORECASE)
+
+
+def _strip_bracket(match: re.Match) -> str:
+    """Drops a bracketed release marker; keeps remixes and part/number qualifiers."""
+    inner = match.group(0)[1:-1]
+    if _REMIX_RE.search(inner) or (_QUALIFIER_RE.search(inner) and not _RELEASE_RE.search(inner)):
+        return f" {inner} "
+    return " "
+
+
+def _normalize_title(title: Optional[str]) -> str:
+    """'Song (Live) - Remastered 2011 [feat. X]' -> 'song'; 'Song (Part 2)' -> 'song part 2'."""
+    text = _BRACKETS_RE.sub(_strip_bracket, str(title or ""))
+    text = _VERSION_SUFFIX_RE.sub("", text)
+    text = _FEAT_RE.sub("", text)
+    return _normalize_text(text)
+
+
+def _normalize_artist(artist: Optional[str]) -> str:
+    return _normalize_text(_FEAT_RE.sub("", str(artist or "")))
+
+
+class _DuplicateIndex:
+    """
+    Groups alternate versions of the same recording (studio, remaster, live, compilation).
+
+    Tracks are hashed on normalized artist + normalized title; a track joins the first group
+    under that key whose known durations are all within `tolerance` seconds of its own
+    (abs(d1 - d2) <= tolerance, so the match does not depend on the order tracks arrive in).
+    A track of unknown duration matches on artist/title alone.
+    """
+
+    def __init__(self, tolerance: int = DUPLICATE_DURATION_TOLERANCE):
+        self.tolerance = tolerance
+        self._groups: Dict[Tuple[str, str], List[int]] = {}
+        self._durations: List[List[int]] = []
+        self.members: List[List[Dict]] = []
+
+    def _fits(self, group: int, duration: int) -> bool:
+        if not self.tolerance or not duration:
+            return True
+        return all(abs(duration - d) <= self.tolerance for d in self._durations[group])
+
+    def add(self, track: Dict) -> int:
+        """Adds a formatted track and returns its group number."""
+        artist, title = _normalize_artist(track.get('artist')), _normalize_title(track.get('title'))
+        duration = track.get('duration') or 0
+        if not title:
+            self.members.append([track])
+            self._durations.append([])
+            return len(self.members) - 1
+        candidates = self._groups.setdefault((artist, title), [])
+        group = next((g for g in candidates if self._fits(g, duration)), None)
+        if group is None:
+            group = len(self.members)
+            self.members.append([])
+            self._durations.append([])
+            candidates.append(group)
+        if duration:
+            self._durations[group].append(duration)
+        self.members[group].append(track)
+        return group
+
+    def duplicate_groups(self) -> List[List[Dict]]:
+        return [m for m in self.members if len(m) > 1]
+
+
+def _pick_version(versions: List[Dict], keep: str, score_key: str = 'smart_score') -> Dict:
+    if keep == "first":
+        return versions[0]
+    if keep == "original":
+        # Earliest known year, then the best score
+        return min(versions, key=lambda t: (t.get('year') or 9999, -(t.get(score_key) or 0)))
+    return max(versions, key=lambda t: t.get(score_key) or 0)
+
+
+def _dedupe_versions(tracks: List[Dict], keep: str = "smart_score", score_key: str = 'smart_score') -> Tuple[List[Dict], List[Dict]]:
+    """
+    Keeps one version per recording, at the position of its first occurrence.
+    Returns (kept_tracks, removed) where removed lists {"id", "title", "kept_id"}.
+    """
+    index = _DuplicateIndex()
+    order = []
+    for t in tracks:
+        group = index.add(t)
+        if len(index.members[group]) == 1:
+            order.append(group)
+    kept, removed = [], []
+    for group in order:
+        versions = index.members[group]
+        chosen = _pick_version(versions, keep, score_key)
+        kept.append(chosen)
+        removed.extend({"id": t['id'], "title": t.get('title'), "kept_id": chosen['id']}
+                       for t in versions if t is not chosen)
+    return kept, removed
+
+
+# --- PLAYLIST ANALYSIS ---
+
+def _resolve_songs(conn, track_ids: List[str]) -> Tuple[Dict[str, Dict], List[str]]:
+    """
+    Resolves IDs to raw songs in one batch: the local library index first, then concurrent
+    getSong calls for the misses (recorded into the index for the next tool).
+    Returns ({id: song}, missing_ids).
+    """
+    _library.sync(conn)
+    found: Dict[str, Dict] = {}
+    misses = []
+    for tid in dict.fromkeys(track_ids):
+        song = _library.songs.get(tid)
+        if song is not None:
+            found[tid] = song
+        else:
+            misses.append(tid)
+
+    def fetch(tid):
+        try:
+            return tid, conn.getSong(tid).get('song')
+        except Exception as e:
+            logger.warning(f"getSong failed for {tid}: {e}")
+            return tid, None
+
+    missing = []
+    if misses:
+        with ThreadPoolExecutor(max_workers=max(1, min(RESOLVE_CONCURRENCY, len(misses)))) as pool:
+            for tid, song in pool.map(fetch, misses):
+                if song:
+                    found[tid] = song
+                    _library.record_songs([song])
+                else:
+                    missing.append(tid)
+    return found, missing
+
+
+@dataclass
+class _TrackTable:
+    """Column-oriented view of a resolved track list (one list per attribute, playlist order)."""
+    ids: List[str] = field(default_factory=list)
+    titles: List[str] = field(default_factory=list)
+    artists: List[Optional[str]] = field(default_factory=list)
+    albums: List[Optional[str]] = field(default_factory=list)
+    genres: List[str] = field(default_factory=list)
+    years: List[int] = field(default_factory=list)
+    durations: List[int] = field(default_factory=list)
+    bpms: List[int] = field(default_factory=list)
+    scores: List[float] = field(default_factory=list)
+    tags: List[List[str]] = field(default_factory=list)
+
+    @classmethod
+    def from_songs(cls, songs: List[Dict]) -> "_TrackTable":
+        table = cls()
+        for raw in songs:
+            t = _format_song(raw)
+            table.ids.append(t['id'])
+            table.titles.append(t.get('title') or '')
+            table.artists.append(t.get('artist'))
+            table.albums.append(t.get('album'))
+            table.genres.append(t.get('genre') or 'Unknown')
+            table.years.append(t.get('year') or 0)
+            table.durations.append(t.get('duration') or 0)
+            table.bpms.append(t.get('bpm') or 0)
+            table.scores.append(t['smart_score'])
+            table.tags.append(_tags.tags_for(t['id']))
+        return table
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def _entropy(counts: Counter) -> Dict:
+    """Shannon entropy in bits, plus the value normalized by its maximum (log2 of distinct values)."""
+    total = sum(counts.values())
+    if not total:
+        return {"bits": 0.0, "normalized": 0.0, "distinct": 0}
+    bits = -sum((c / total) * math.log2(c / total) for c in counts.values())
+    return {
+        "bits": round(bits, 3),
+        "normalized": round(bits / math.log2(len(counts)), 3) if len(counts) > 1 else 0.0,
+        "distinct": len(counts)
+    }
+
+
+def _distribution(values: List[float]) -> Optional[Dict]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    quartiles = statistics.quantiles(ordered, n=4) if len(ordered) > 1 else [ordered[0]] * 3
+    return {
+        "min": ordered[0],
+        "p25": round(quartiles[0], 2),
+        "median": round(quartiles[1], 2),
+        "p75": round(quartiles[2], 2),
+        "max": ordered[-1],
+        "mean": round(sum(ordered) / len(ordered), 2)
+    }
+
+
+def _analyze_table(table: _TrackTable) -> Dict:
+    """
+    Computes every playlist metric in one pass over the track table: artist/album/genre
+    entropy, decade spread, BPM distribution and transition jumps, total duration,
+    smart-score distribution and adjacent same-artist runs.
+    """
+    artist_counts, album_counts, genre_counts, decade_counts = Counter(), Counter(), Counter(), Counter()
+    known_bpms, jumps = [], []
+    total_duration = 0
+    runs = []  # (start_index, length) of adjacent same-artist runs
+    run_start = 0
+    prev_bpm = None
+    versions = _DuplicateIndex()
+    n = len(table)
+
+    for i in range(n):
+        artist = table.artists[i]
+        versions.add({"id": table.ids[i], "title": table.titles[i], "artist": artist, "duration": table.durations[i]})
+        artist_counts[artist] += 1
+        album_counts[(table.albums[i], artist)] += 1
+        genre_counts[table.genres[i]] += 1
+        if table.years[i]:
+            decade_counts[(table.years[i] // 10) * 10] += 1
+        total_duration += table.durations[i]
+        bpm = table.bpms[i]
+        if bpm:
+            known_bpms.append(bpm)
+            if prev_bpm is not None:
+                jumps.append(abs(bpm - prev_bpm))
+            prev_bpm = bpm
+        if i and (artist is None or artist != table.artists[i - 1]):
+            if i - run_start > 1:
+                runs.append((run_start, i - run_start))
+            run_start = i
+    if n and n - run_start > 1:
+        runs.append((run_start, n - run_start))
+
+    decades = sorted(decade_counts)
+    return {
+        "total_tracks": n,
+        "total_duration_sec": total_duration,
+        "entropy": {
+            "artist": _entropy(artist_counts),
+            "album": _entropy(album_counts),
+            "genre": _entropy(genre_counts)
+        },
+        "artist_counts": artist_counts,
+        "decades": {
+            "counts": {f"{d}s": decade_counts[d] for d in decades},
+            "span_years": (decades[-1] - decades[0] + 10) if decades else 0,
+            "unknown_year": n - sum(decade_counts.values())
+        },
+        "bpm": {
+            "known": len(known_bpms),
+            "distribution": _distribution(known_bpms),
+            "transitions": {
+                "mean_jump": round(sum(jumps) / len(jumps), 1) if jumps else 0.0,
+                "max_jump": max(jumps) if jumps else 0,
+                "jumps_over_threshold": sum(1 for j in jumps if j > BPM_JUMP_THRESHOLD),
+                "threshold": BPM_JUMP_THRESHOLD
+            }
+        },
+        "smart_score": _distribution(table.scores),
+        "alternate_versions": [
+            {"artist": group[0]["artist"], "title": group[0]["title"], "track_ids": list(dict.fromkeys(t["id"] for t in group))}
+            for group in versions.duplicate_groups()
+            if len({t["id"] for t in group}) > 1
+        ],
+        "same_artist_runs": {
+            "adjacent_pairs": sum(length - 1 for _, length in runs),
+            "longest": max((length for _, length in runs), default=1 if n else 0),
+            "runs": [
+                {"artist": table.artists[start], "position": start, "length": length}
+                for start, length in runs[:10]
+            ]
+        }
+    }
+
+
+def _analyze_playlist(conn, track_ids: List[str]) -> Tuple[_TrackTable, Dict, List[str]]:
+    """Resolves the IDs in one batch and analyzes them. Returns (table, analysis, missing_ids)."""
+    found, missing = _resolve_songs(conn, track_ids)
+    table = _TrackTable.from_songs([found[tid] for tid in track_ids if tid in found])
+    return table, _analyze_table(table), missing
+
+
+class _EntropyCounter:
+    """
+    Value counts with a running sum of c*log2(c), so entropy updates in O(1) per change.
+    Values are also bucketed by count, which keeps the most frequent value current in O(1).
+    """
+
+    def __init__(self):
+        self.counts = Counter()
+        self.total = 0
+        self._clogc = 0.0
+        self._by_count: Dict[int, Dict[Any, None]] = {}
+        self._max = 0
+
+    @staticmethod
+    def _term(c: int) -> float:
+        return c * math.log2(c) if c > 1 else 0.0
+
+    def add(self, value, delta: int = 1):
+        c = self.counts[value]
+        self._clogc += self._term(c + delta) - self._term(c)
+        self.total += delta
+        if c:
+            bucket = self._by_count[c]
+            del bucket[value]
+            if not bucket:
+                del self._by_count[c]
+        if c + delta:
+            self.counts[value] = c + delta
+            self._by_count.setdefault(c + delta, {})[value] = None
+            self._max = max(self._max, c + delta)
+        else:
+            del self.counts[value]
+        while self._max and self._max not in self._by_count:
+            self._max -= 1
+
+    def top(self) -> Optional[Tuple[Any, int]]:
+        """(value, count) of a most frequent value, or None when empty."""
+        if not self._max:
+            return None
+        return next(iter(self._by_count[self._max])), self._max
+
+    def entropy(self) -> Dict:
+        if not self.total:
+            return {"bits": 0.0, "normalized": 0.0, "distinct": 0}
+        bits = max(0.0, math.log2(self.total) - self._clogc / self.total)
+        distinct = len(self.counts)
+        return {
+            "bits": round(bits, 3),
+            "normalized": round(bits / math.log2(distinct), 3) if distinct > 1 else 0.0,
+            "distinct": distinct
+        }
+
+
+class _AssessmentSession:
+    """
+    Running quality counters for a playlist built a few tracks at a time.
+
+    Tracks live in a doubly linked list (entry key -> prev/next), so adding at the end or
+    removing anywhere only touches the neighbouring transitions, and counters/entropy sums
+    are adjusted per track: every update is O(delta). metrics() reads the running sums and
+    the tracked top artist; only the decade histogram it returns is rebuilt (a handful of
+    keys). Removing a track ID removes its most recently added occurrence.
+    """
+
+    def __init__(self):
+        self.entries: Dict[int, Dict] = {}
+        self.prev: Dict[int, Optional[int]] = {}
+        self.next: Dict[int, Optional[int]] = {}
+        self.by_track: Dict[str, List[int]] = {}
+        self.head = self.tail = None
+        self._seq = 0
+        self.dims = {dim: _EntropyCounter() for dim in ("artist", "album", "genre", "decade")}
+        self.duration = 0
+        self.score_sum = 0.0
+        self.bpm_n, self.bpm_sum, self.bpm_sq = 0, 0.0, 0.0
+        self.same_artist_pairs = 0
+        self.jump_n, self.jump_sum, self.jumps_over = 0, 0.0, 0
+        self.lock = threading.Lock()
+
+    def _pair(self, a: Optional[int], b: Optional[int], sign: int):
+        if a is None or b is None:
+            return
+        x, y = self.entries[a], self.entries[b]
+        if x["artist"] and x["artist"] == y["artist"]:
+            self.same_artist_pairs += sign
+        if x["bpm"] and y["bpm"]:
+            jump = abs(x["bpm"] - y["bpm"])
+            self.jump_n += sign
+            self.jump_sum += sign * jump
+            if jump > BPM_JUMP_THRESHOLD:
+                self.jumps_over += sign
+
+    def _count(self, t: Dict, sign: int):
+        self.dims["artist"].add(t["artist"], sign)
+        self.dims["album"].add((t["album"], t["artist"]), sign)
+        self.dims["genre"].add(t["genre"], sign)
+        if t["year"]:
+            self.dims["decade"].add((t["year"] // 10) * 10, sign)
+        self.duration += sign * t["duration"]
+        self.score_sum += sign * t["smart_score"]
+        if t["bpm"]:
+            self.bpm_n += sign
+            self.bpm_sum += sign * t["bpm"]
+            self.bpm_sq += sign * t["bpm"] ** 2
+
+    def append(self, song: Dict):
+        f = _format_song(song)
+        t = {
+            "id": f["id"], "artist": f.get("artist"), "album": f.get("album"), "genre": f.get("genre") or "Unknown",
+            "year": f.get("year") or 0, "duration": f.get("duration") or 0, "bpm": f.get("bpm") or 0,
+            "smart_score": f["smart_score"]
+        }
+        key = self._seq
+        self._seq += 1
+        self.entries[key] = t
+        self.prev[key], self.next[key] = self.tail, None
+        if self.tail is not None:
+            self.next[self.tail] = key
+        else:
+            self.head = key
+        self._pair(self.tail, key, 1)
+        self.tail = key
+        self.by_track.setdefault(t["id"], []).append(key)
+        self._count(t, 1)
+
+    def remove(self, track_id: str) -> bool:
+        keys = self.by_track.get(track_id)
+        if not keys:
+            return False
+        key = keys.pop()
+        if not keys:
+            del self.by_track[track_id]
+        p, n = self.prev.pop(key), self.next.pop(key)
+        self._pair(p, key, -1)
+        self._pair(key, n, -1)
+        if p is not None:
+            self.next[p] = n
+        else:
+            self.head = n
+        if n is not None:
+            self.prev[n] = p
+        else:
+            self.tail = p
+        self._pair(p, n, 1)
+        self._count(self.entries.pop(key), -1)
+        return True
+
+    def track_ids(self) -> List[str]:
+        out, key = [], self.head
+        while key is not None:
+            out.append(self.entries[key]["id"])
+            key = self.next[key]
+        return out
+
+    def metrics(self) -> Dict:
+        n = len(self.entries)
+        artists = self.dims["artist"]
+        top = artists.top()
+        bpm_mean = self.bpm_sum / self.bpm_n if self.bpm_n else 0.0
+        return {
+            "total_tracks": n,
+            "unique_artists": len(artists.counts),
+            "most_repetitive_artist": {
+                "name": top[0], "count": top[1], "warning": top[1] > n * 0.3
+            } if top else None,
+            "diversity_score": round(len(artists.counts) / n, 2) if n else 0.0,
+            "total_duration_sec": self.duration,
+            "entropy": {dim: self.dims[dim].entropy() for dim in ("artist", "album", "genre")},
+            "decades": {f"{d}s": c for d, c in sorted(self.dims["decade"].counts.items())},
+            "bpm": {
+                "known": self.bpm_n,
+                "mean": round(bpm_mean, 1),
+                "stdev": round(math.sqrt(max(0.0, self.bpm_sq / self.bpm_n - bpm_mean ** 2)), 1) if self.bpm_n else 0.0,
+                "mean_jump": round(self.jump_sum / self.jump_n, 1) if self.jump_n else 0.0,
+                "jumps_over_threshold": self.jumps_over
+            },
+            "smart_score_mean": round(self.score_sum / n, 2) if n else 0.0,
+            "same_artist_adjacent_pairs": self.same_artist_pairs
+        }
+
+
+# --- PLAYLIST RULE ENGINE ---
+# Rules are compiled once into column checks: each check scans one column of a _TrackTable in
+# a single linear pass and returns structured violation records.
+
+_RULE_CAP_COLUMNS = {"artist": "artists", "album": "albums", "genre": "genres"}
+_RULE_RANGE_COLUMNS = {"bpm": "bpms", "year": "years", "duration": "durations"}
+
+
+def _violation(rule: str, message: str, table: Optional[_TrackTable] = None, i: Optional[int] = None, **details) -> Dict:
+    record = {"rule": rule, "message": message}
+    if table is not None and i is not None:
+        record.update({"position": i, "track_id": table.ids[i], "title": table.titles[i]})
+    record.update(details)
+    return record
+
+
+def _rule_keys(table: _TrackTable, dim: str) -> List[Tuple[Any, Any]]:
+    """
+    (group key, display value) per track for cap/gap rules. Albums are keyed on
+    (album, artist) like _analyze_table, so two artists' "Greatest Hits" stay apart.
+    """
+    values = getattr(table, _RULE_CAP_COLUMNS[dim])
+    if dim == "album":
+        return [((album, artist) if album is not None else None, album)
+                for album, artist in zip(values, table.artists)]
+    return [(value, value) for value in values]
+
+
+def _cap_check(rule: str, dim: str, cap: int) -> Callable[[_TrackTable], List[Dict]]:
+    def check(table):
+        counts = Counter()
+        out = []
+        for i, (key, value) in enumerate(_rule_keys(table, dim)):
+            counts[key] += 1
+            if counts[key] > cap:
+                out.append(_violation(rule, f"Track '{table.titles[i]}': Exceeds max per {dim} ({value}).",
+                                      table, i, value=value, limit=cap))
+        return out
+    return check
+
+
+def _range_check(rule: str, dim: str, lo: Optional[float], hi: Optional[float]) -> Callable[[_TrackTable], List[Dict]]:
+    column = _RULE_RANGE_COLUMNS[dim]
+    label = dim.upper() if dim == "bpm" else dim.capitalize()
+
+    def check(table):
+        out = []
+        # Unknown values (0) are not judged, as with the original BPM checks
+        for i, value in enumerate(getattr(table, column)):
+            if not value:
+                continue
+            if lo is not None and value < lo:
+                out.append(_violation(rule, f"Track '{table.titles[i]}': {label} {value} is too low (target > {lo}).",
+                                      table, i, value=value, limit=lo))
+            elif hi is not None and value > hi:
+                out.append(_violation(rule, f"Track '{table.titles[i]}': {label} {value} is too high (target < {hi}).",
+                                      table, i, value=value, limit=hi))
+        return out
+    return check
+
+
+def _genre_check(rule: str, terms: List[str], exclude: bool) -> Callable[[_TrackTable], List[Dict]]:
+    terms = [t.lower() for t in terms]
+
+    def check(table):
+        out = []
+        for i, genre in enumerate(table.genres):
+            hit = any(term in genre.lower() for term in terms)
+            if exclude and hit:
+                out.append(_violation(rule, f"Track '{table.titles[i]}': Prohibited genre '{genre}'.", table, i, value=genre))
+            elif not exclude and not hit:
+                out.append(_violation(rule, f"Track '{table.titles[i]}': Genre '{genre}' is not in {terms}.", table, i, value=genre))
+        return out
+    return check
+
+
+def _tag_check(rule: str, tags: List[str]) -> Callable[[_TrackTable], List[Dict]]:
+    wanted = {t.strip().lower() for t in tags}
+
+    def check(table):
+        out = []
+        for i, track_tags in enumerate(table.tags):
+            names = {n.lower() for n in track_tags} | {n.lower().rsplit(":", 1)[-1] for n in track_tags}
+            if not wanted & names:
+                out.append(_violation(rule, f"Track '{table.titles[i]}': Missing required tag (one of {sorted(wanted)}).",
+                                      table, i, value=track_tags))
+        return out
+    return check
+
+
+def _gap_check(rule: str, dim: str, gap: int) -> Callable[[_TrackTable], List[Dict]]:
+    def check(table):
+        last_seen = {}
+        out = []
+        for i, (key, value) in enumerate(_rule_keys(table, dim)):
+            if key is not None and key in last_seen and i - last_seen[key] - 1 < gap:
+                between = i - last_seen[key] - 1
+                out.append(_violation(rule, f"Track '{table.titles[i]}': Only {between} track(s) since the previous {dim} ({value}) track.",
+                                      table, i, value=between, limit=gap))
+            last_seen[key] = i
+        return out
+    return check
+
+
+def _bpm_jump_check(rule: str, max_jump: float) -> Callable[[_TrackTable], List[Dict]]:
+    def check(table):
+        out = []
+        prev = None
+        for i, bpm in enumerate(table.bpms):
+            if not bpm:
+                continue
+            if prev is not None and abs(bpm - prev) > max_jump:
+                out.append(_violation(rule, f"Track '{table.titles[i]}': BPM jump {abs(bpm - prev)} from the previous track.",
+                                      table, i, value=abs(bpm - prev), limit=max_jump))
+            prev = bpm
+        return out
+    return check
+
+
+def _total_duration_check(rule: str, lo: Optional[float], hi: Optional[float]) -> Callable[[_TrackTable], List[Dict]]:
+    def check(table):
+        total = sum(table.durations)
+        if lo is not None and total < lo:
+            return [_violation(rule, f"Total duration {total}s is below {lo}s.", value=total, limit=lo)]
+        if hi is not None and total > hi:
+            return [_violation(rule, f"Total duration {total}s exceeds {hi}s.", value=total, limit=hi)]
+        return []
+    return check
+
+
+@dataclass(frozen=True)
+class _RuleSet:
+    checks: Tuple[Callable[[_TrackTable], List[Dict]], ...]
+    needs_tags: bool
+    unknown: Tuple[str, ...]
+
+    def evaluate(self, table: _TrackTable) -> List[Dict]:
+        violations = [v for check in self.checks for v in check(table)]
+        violations.sort(key=lambda v: v.get("position", len(table)))
+        return violations
+
+
+@functools.lru_cache(maxsize=64)
+def _compile_rules_cached(rules_json: str) -> _RuleSet:
+    rules = json.loads(rules_json)
+    checks = []
+    used = set()
+
+    for dim in _RULE_CAP_COLUMNS:
+        key = f"max_tracks_per_{dim}"
+        if rules.get(key):
+            checks.append(_cap_check(key, dim, int(rules[key])))
+            used.add(key)
+    for dim in _RULE_RANGE_COLUMNS:
+        lo, hi = rules.get(f"min_{dim}"), rules.get(f"max_{dim}")
+        used.update({f"min_{dim}", f"max_{dim}"})
+        if lo or hi:
+            checks.append(_range_check(f"{dim}_range", dim, lo or None, hi or None))
+    if rules.get("exclude_genres"):
+        checks.append(_genre_check("exclude_genres", rules["exclude_genres"], exclude=True))
+    if rules.get("include_genres"):
+        checks.append(_genre_check("include_genres", rules["include_genres"], exclude=False))
+    if rules.get("required_tags"):
+        checks.append(_tag_check("required_tags", rules["required_tags"]))
+    for dim in ("artist", "album"):
+        key = f"min_{dim}_gap"
+        if rules.get(key):
+            checks.append(_gap_check(key, dim, int(rules[key])))
+            used.add(key)
+    if rules.get("max_bpm_jump"):
+        checks.append(_bpm_jump_check("max_bpm_jump", rules["max_bpm_jump"]))
+    lo, hi = rules.get("min_total_duration"), rules.get("max_total_duration")
+    if lo or hi:
+        checks.append(_total_duration_check("total_duration", lo or None, hi or None))
+    used.update({"exclude_genres", "include_genres", "required_tags", "max_bpm_jump",
+                 "min_total_duration", "max_total_duration"})
+
+    return _RuleSet(
+        checks=tuple(checks),
+        needs_tags=bool(rules.get("required_tags")),
+        unknown=tuple(sorted(set(rules) - used))
+    )
+
+
+def _compile_rules(rules: Dict) -> _RuleSet:
+    """Compiles a rule dict once; identical rule sets share the compiled checks."""
+    return _compile_rules_cached(json.dumps(rules or {}, sort_keys=True))
+
+
+# --- PLAYLIST SEQUENCING ---
+
+def _transition_matrix(table: _TrackTable, weights: Dict[str, float]) -> List[List[float]]:
     """
-    Wrapper for getAlbumList2 to abstract 'ltype' parameter.
-    Criteria: 'frequent', 'newest', 'starred', 'random', 'alphabeticalByName', 'byGenre'
+    Symmetric cost of playing track j right after track i. BPM (scaled by 40) and era (year
+    distance scaled by 20) saturate at 1; unknown values cost 0.5. Different genres cost 1,
+    the same artist back to back costs 1; each term is multiplied by its weight.
     """
-    conn = get_conn()
-    try:
-        if criteria == 'byGenre' and genre:
-            res = conn.getAlbumList2(ltype=criteria, genre=genre, size=size)
-        else:
-            res = conn.getAlbumList2(ltype=criteria, size=size)
-        return res.get('albumList2', {}).get('album', [])
-    except Exception as e:
-        logger.error(f"Failed to fetch albums for criteria {criteria}: {e}")
-        return []
+    n = len(table)
+    w_bpm, w_genre = weights.get("bpm", 0.0), weights.get("genre", 0.0)
+    w_era, w_artist = weights.get("era", 0.0), weights.get("artist", 0.0)
+    genres = [g.lower() for g in table.genres]
+    artists = [(a or "").lower() for a in table.artists]
+    matrix = [[0.0] * n for _ in range(n)]
+    for i in range(n):
+        bpm_i, year_i, row = table.bpms[i], table.years[i], matrix[i]
+        for j in range(i + 1, n):
+            bpm_j, year_j = table.bpms[j], table.years[j]
+            cost = 0.0
+            if w_bpm:
+                cost += w_bpm * (min(abs(bpm_i - bpm_j) / 40.0, 1.0) if bpm_i and bpm_j else 0.5)
+            if w_era:
+                cost += w_era * (min(abs(year_i - year_j) / 20.0, 1.0) if year_i and year_j else 0.5)
+            if w_genre and genres[i] != genres[j]:
+                cost += w_genre
+            if w_artist and artists[i] and artists[i] == artists[j]:
+                cost += w_artist
+            row[j] = matrix[j][i] = cost
+    return matrix
+
+
+def _path_cost(order: List[int], matrix: List[List[float]]) -> float:
+    return sum(matrix[a][b] for a, b in zip(order, order[1:]))
+
+
+def _sequence_order(matrix: List[List[float]], start: int = 0, time_budget: float = 0.3) -> Tuple[List[int], int]:
+    """
+    Open-path TSP heuristic: greedy nearest neighbour from `start`, then 2-opt segment
+    reversals (first track fixed) until no move improves or the time budget runs out.
+    Returns (order, completed_2opt_passes).
+    """
+    n = len(matrix)
+    deadline = time.monotonic() + time_budget
+    remaining = set(range(n)) - {start}
+    order = [start]
+    while remaining:
+        row = matrix[order[-1]]
+        nxt = min(remaining, key=row.__getitem__)
+        order.append(nxt)
+        remaining.remove(nxt)
+
+    passes = 0
+    improved = True
+    while improved and time.monotonic() < deadline:
+        improved = False
+        for i in range(1, n - 1):
+            a, b = order[i - 1], order[i]
+            row_a, row_b = matrix[a], matrix[b]
+            for j in range(i + 1, n):
+                c = order[j]
+                if j + 1 < n:
+                    e = order[j + 1]
+                    delta = row_a[c] + row_b[e] - row_a[b] - matrix[c][e]
+                else:
+                    delta = row_a[c] - row_a[b]
+                if delta < -1e-9:
+                    order[i:j + 1] = reversed(order[i:j + 1])
+                    b, row_b = order[i], matrix[order[i]]
+                    improved = True
+            if time.monotonic() >= deadline:
+                break
+        passes += 1
+    return order, passes
 
 
 # --- RESOURCES & PROMPTS: DISCOVERY & INFO ---
@@ -260,13 +2901,26 @@ def _fetch_albums(criteria: str, size: int = 50, genre: str = None) -> List[Dict
 @mcp.resource("navidrome://info")
 def get_server_info() -> str:
     """Returns server identity, version, and connectivity status."""
-    return json.dumps({
+    return _json_dumps({
         "server": "Navigravity",
         "version": __version__,
         "status": "connected", # Static for now, could be dynamic
         "capabilities": ["playback", "playlists", "discovery", "curation"]
     })
 
+@mcp.resource("navidrome://moods")
+def get_mood_registry() -> str:
+    """Lists the mood profiles available to get_smart_candidates(mood=...)."""
+    return _dumps({
+        name: {
+            "description": p.description,
+            "include_genres": list(p.include_genres),
+            "exclude_genres": list(p.exclude_genres),
+            "ranges": {f: list(r) for f, r in p.ranges.items() if any(r)},
+            "score_weights": p.score_weights
+        } for name, p in MOOD_REGISTRY.items()
+    })
+
 @mcp.tool()
 def check_connection() -> str:
     """Verifies connection to the backend Navidrome instance."""
@@ -275,10 +2929,53 @@ def check_connection() -> str:
         if conn.ping():
             # Clean up the URL in case it has user info
             safe_url = conn.baseUrl.split('@')[-1] if '@' in conn.baseUrl else conn.baseUrl
-            return json.dumps({"result": f"Connected to Navidrome at {safe_url}"}, ensure_ascii=False)
-        return json.dumps({"error": "Failed to connect to Navidrome (ping failed)"}, ensure_ascii=False)
+            return _json_dumps({"result": f"Connected to Navidrome at {safe_url}"})
+        return _json_dumps({"error": "Failed to connect to Navidrome (ping failed)"})
     except Exception as e:
-        return json.dumps({"error": f"Failed to connect to Navidrome: {str(e)}"}, ensure_ascii=False)
+        return _json_dumps({"error": f"Failed to connect to Navidrome: {str(e)}"})
+
+@mcp.tool()
+@log_execution
+def continue_response(continuation: str, max_response_tokens: Optional[int] = None) -> str:
+    """
+    Serves the rest of a response that was cut to fit a token budget, from the server-side
+    cache (no Navidrome calls). Pass the 'continuation' token of the truncated response.
+
+    Args:
+        continuation: Token from a truncated response (or from a previous continue_response).
+        max_response_tokens: Budget for this chunk (default NAVIDROME_RESPONSE_TOKEN_BUDGET, 0 = rest at once).
+
+    Returns JSON {"key", <key>: [...], "offset", "total", "continuation"} where "continuation"
+    is null once the list is exhausted. Columnar rows come back as {"key": "rows", "columns",
+    "rows", ...}.
+    """
+    set_id, _, offset_str = continuation.partition(":")
+    entry = _response_continuations.get(set_id)
+    if entry is None:
+        return f"Error: Continuation '{continuation}' has expired or is unknown. Re-run the original call."
+    try:
+        offset = max(0, int(offset_str or 0))
+    except ValueError:
+        return f"Error: Malformed continuation '{continuation}'."
+
+    key, items = entry["key"], entry["items"]
+    rest = items[offset:]
+
+    def render(k):
+        end = offset + k
+        return _dumps({
+            "key": key,
+            **({"columns": entry["columns"]} if "columns" in entry else {}),
+            key: rest[:k],
+            "offset": offset,
+            "total": len(items),
+            "continuation": _encode_cursor(set_id, end) if end < len(items) else None
+        })
+
+    budget = RESPONSE_TOKEN_BUDGET if max_response_tokens is None else max_response_tokens
+    if budget <= 0 or not rest:
+        return render(len(rest))
+    return _fit_prefix(render, len(rest), budget * BYTES_PER_TOKEN)[1]
 
 @mcp.prompt()
 def usage_guide() -> str:
@@ -372,6 +3069,7 @@ def curator_mode() -> str:
 
 @mcp.tool()
 @log_execution
+@budgeted_response
 def analyze_library(mode: str = "composition") -> str:
     """
     Analyzes the library inventory and user stats.
@@ -406,14 +3104,14 @@ def analyze_library(mode: str = "composition") -> str:
                     "percentage": round((g.get('songCount', 0) / total_songs * 100), 2) if total_songs > 0 else 0
                 })
                 
-            return json.dumps({
+            return _dumps({
                 "total_stats": {
                     "songs": total_songs,
                     "albums": total_albums,
                     "genres": len(genres)
                 },
                 "composition": top_genres
-            }, indent=2)
+            })
 
         elif mode == "pillars":
             # NOTE: libsonic's getArtists() usually maps to getIndexes.
@@ -436,7 +3134,7 @@ def analyze_library(mode: str = "composition") -> str:
                     "album_count": int(a.get('albumCount', 0)),
                     "id": a.get('id')
                 })
-            return json.dumps(pillars, indent=2)
+            return _dumps(pillars)
 
         elif mode == "taste_profile":
             freq = _fetch_albums("frequent", size=100)
@@ -463,12 +3161,12 @@ def analyze_library(mode: str = "composition") -> str:
                 top_decades = [f"{d}s" for d, _ in Counter(decades).most_common(3)]
                 eras = top_decades
                 
-            return json.dumps({
+            return _dumps({
                 "top_artists": top_artists,
                 "top_genres": top_genres,
                 "favorite_eras": eras,
                 "total_albums_analyzed": len(combined)
-            }, indent=2)
+            })
         
         else:
             return f"Unknown mode: {mode}"
@@ -477,6 +3175,7 @@ def analyze_library(mode: str = "composition") -> str:
 
 @mcp.tool()
 @log_execution
+@budgeted_response
 def batch_check_library_presence(query: List[Dict[str, str]]) -> str:
     """
     Checks if artists/albums exist in the library.
@@ -535,14 +3234,25 @@ def batch_check_library_presence(query: List[Dict[str, str]]) -> str:
             
         results.append(status)
         
-    return json.dumps(results, indent=2)
+    return _dumps(results)
 
 @mcp.tool()
 @log_execution
-def search_by_tag(tags: List[str], logic: str = "OR") -> str:
+@budgeted_response
+def search_by_tag(tags: List[str], logic: str = "OR", fields: Optional[List[str]] = None, format: str = "json") -> str:
     """
     Multi-genre intersection/union for 'vibe' search.
+
+    Args:
+        tags: Search terms (genres, moods).
+        logic: 'OR' (union) or 'AND' (intersection).
+        fields: Track keys to return, e.g. ["id", "title", "artist"] ('id' is always kept).
+        format: 'json' (default), 'compact' (no whitespace), 'columnar' ({"columns", "rows"})
+                or 'ids' (bare ID list).
     """
+    error = _check_track_format(format)
+    if error:
+        return error
     all_results = []
     for tag in tags:
         # We use our new helper which handles retries and serialization
@@ -550,7 +3260,7 @@ def search_by_tag(tags: List[str], logic: str = "OR") -> str:
         all_results.append(set(s['id'] for s in results.get('song', [])))
     
     if not all_results:
-        return json.dumps([])
+        return _dumps([])
         
     if logic.upper() == "AND":
         # Intersection
@@ -577,78 +3287,322 @@ def search_by_tag(tags: List[str], logic: str = "OR") -> str:
             final_songs.append(_format_song(s))
             seen.add(s['id'])
             
-    return json.dumps(final_songs, indent=2)
+    return _format_tracks(final_songs, fields, format)
 
 @mcp.tool()
 @log_execution
+@budgeted_response
 def validate_playlist_rules(track_ids: List[str], rules: Dict) -> str:
     """
     Dry-run validation for diversity and mood.
     Example rules: {"max_tracks_per_artist": 2, "exclude_genres": ["Metal"], "min_bpm": 100}
+
+    Supported rules:
+        max_tracks_per_artist / max_tracks_per_album / max_tracks_per_genre: Caps per value.
+        include_genres / exclude_genres: Genre terms (case-insensitive partial match).
+        min_bpm / max_bpm, min_year / max_year, min_duration / max_duration: Per-track ranges
+            (tracks with unknown values are not judged).
+        required_tags: Every track must carry one of these virtual tags ('Focus', 'System:Mood:Focus').
+        min_artist_gap / min_album_gap: Minimum number of other tracks between two tracks of the
+            same artist/album (1 = no adjacent repeats).
+        max_bpm_jump: Maximum BPM change between consecutive tracks with known BPM.
+        min_total_duration / max_total_duration: Playlist length bounds in seconds.
+
+    Returns JSON {"is_valid", "violations": [{"rule", "message", "position", "track_id", "title",
+    "value", "limit"}], "summary"}, or an "Error: ..." string for malformed rules.
     """
     conn = get_conn()
-    violations = []
-    artist_counts = Counter()
-    
-    max_per_artist = rules.get("max_tracks_per_artist")
-    exclude_genres = [g.lower() for g in rules.get("exclude_genres", [])]
-    min_bpm = rules.get("min_bpm")
-    max_bpm = rules.get("max_bpm")
 
+    clean_ids = []
     for tid in track_ids:
-        try:
-            # Extract ID if it's a markdown link or has trailing chars
-            clean_id = tid
-            if "(" in tid and ")" in tid:
-                match = re.search(r'\(([0-9a-f]{32})\)', tid)
-                if match: clean_id = match.group(1)
-            clean_id = clean_id.strip().strip(',')
-
-            res = conn.getSong(clean_id)
-            song = res.get('song')
-            if not song:
-                violations.append(f"Track {tid}: Not found in library.")
-                continue
-            
-            # 1. Artist Diversity
-            art = song.get('artist')
-            artist_counts[art] += 1
-            if max_per_artist and artist_counts[art] > max_per_artist:
-                violations.append(f"Track '{song.get('title')}': Exceeds max per artist ({art}).")
-            
-            # 2. Genre Exclusion
-            genre = song.get('genre', '').lower()
-            if any(eg in genre for eg in exclude_genres):
-                violations.append(f"Track '{song.get('title')}': Prohibited genre '{song.get('genre')}'.")
-            
-            # 3. BPM Range
-            bpm = song.get('bpm', 0)
-            if min_bpm and bpm > 0 and bpm < min_bpm:
-                violations.append(f"Track '{song.get('title')}': BPM {bpm} is too low (target > {min_bpm}).")
-            if max_bpm and bpm > max_bpm:
-                violations.append(f"Track '{song.get('title')}': BPM {bpm} is too high (target < {max_bpm}).")
+        # Extract ID if it's a markdown link or has trailing chars
+        clean_id = tid
+        if "(" in tid and ")" in tid:
+            match = re.search(r'\(([0-9a-f]{32})\)', tid)
+            if match: clean_id = match.group(1)
+        clean_ids.append(clean_id.strip().strip(','))
 
-        except Exception as e:
-            violations.append(f"Track {tid}: Error during validation - {str(e)}")
+    try:
+        ruleset = _compile_rules(rules)
+        if ruleset.needs_tags:
+            _tags.sync(conn)
+        table, analysis, missing = _analyze_playlist(conn, clean_ids)
+        violations = [_violation("not_found", f"Track {tid}: Not found in library.", track_id=tid) for tid in missing]
+        violations.extend(ruleset.evaluate(table))
+    except Exception as e:
+        logger.error(f"Error in validate_playlist_rules: {e}")
+        return f"Error: Validation failed - {e}"
 
-    return json.dumps({
+    result = {
         "is_valid": len(violations) == 0,
         "violations": violations,
         "summary": {
             "total_checked": len(track_ids),
-            "unique_artists": len(artist_counts)
+            "unique_artists": len(analysis["artist_counts"]),
+            "total_duration_sec": analysis["total_duration_sec"],
+            "same_artist_adjacent_pairs": analysis["same_artist_runs"]["adjacent_pairs"],
+            "violations_by_rule": dict(Counter(v["rule"] for v in violations))
+        }
+    }
+    if ruleset.unknown:
+        result["unknown_rules"] = list(ruleset.unknown)
+    return _dumps(result)
+
+@mcp.tool()
+@log_execution
+@budgeted_response
+def sequence_playlist(
+    track_ids: List[str],
+    objective: Optional[Dict[str, float]] = None,
+    playlist_name: Optional[str] = None,
+    time_budget_ms: int = 300
+) -> str:
+    """
+    Orders tracks for smooth listening: small BPM jumps, few genre/era breaks and no
+    back-to-back artists. The first track stays the opener.
+
+    Args:
+        track_ids: Tracks to order.
+        objective: Transition weights, merged over the defaults
+                   {"bpm": 1.0, "genre": 0.5, "era": 0.5, "artist": 2.0}; 0 disables a term.
+        playlist_name: If set, the playlist is synced to the new order (minimal diff).
+        time_budget_ms: Time allowed for 2-opt refinement after the greedy pass.
+
+    Returns JSON {"order", "cost_before", "cost_after", "adjacent_same_artist_before/after",
+    "passes", "elapsed_ms", "missing", "write"?}.
+    """
+    conn = get_conn()
+    try:
+        started = time.monotonic()
+        weights = {**SEQUENCE_WEIGHTS, **(objective or {})}
+        unknown = set(weights) - set(SEQUENCE_WEIGHTS)
+        if unknown:
+            return f"Error: Unknown objective terms {sorted(unknown)}. Use {sorted(SEQUENCE_WEIGHTS)}."
+
+        found, missing = _resolve_songs(conn, track_ids)
+        table = _TrackTable.from_songs([found[tid] for tid in track_ids if tid in found])
+        if len(table) < 2:
+            return _dumps({"order": table.ids, "missing": missing, "result": "Nothing to sequence."})
+
+        matrix = _transition_matrix(table, weights)
+        identity = list(range(len(table)))
+        order, passes = _sequence_order(matrix, 0, max(0, time_budget_ms) / 1000.0)
+
+        def same_artist_pairs(seq):
+            return sum(1 for a, b in zip(seq, seq[1:]) if table.artists[a] and table.artists[a] == table.artists[b])
+
+        result = {
+            "order": [table.ids[i] for i in order],
+            "cost_before": round(_path_cost(identity, matrix), 3),
+            "cost_after": round(_path_cost(order, matrix), 3),
+            "adjacent_same_artist_before": same_artist_pairs(identity),
+            "adjacent_same_artist_after": same_artist_pairs(order),
+            "passes": passes,
+            "elapsed_ms": round((time.monotonic() - started) * 1000, 1),
+            "missing": missing
+        }
+
+        if playlist_name:
+            job, created = _journal.submit(playlist_name, "sync", result["order"], claim=True)
+            if created:
+                written = _run_playlist_job(conn, job)
+                result["write"] = _payload_of(written)
+            else:
+                result["write"] = {"deduplicated": True, **_job_summary(job)}
+        return _dumps(result)
+    except Exception as e:
+        logger.error(f"Error in sequence_playlist: {e}")
+        return str(e)
+
+# Spec keys forwarded verbatim to get_smart_candidates for the harvest stage
+CURATE_HARVEST_KEYS = (
+    "mode", "limit", "include_genres", "exclude_genres", "min_bpm", "max_bpm", "mood",
+    "include_tags", "exclude_tags", "seed", "dedupe", "max_tracks_per_artist",
+    "diversity", "diversity_caps", "diversity_weights"
+)
+CURATE_KEYS = CURATE_HARVEST_KEYS + (
+    "name", "operation", "rules", "min_tracks", "min_artist_entropy",
+    "sequence", "time_budget_ms", "dry_run", "return_ids"
+)
+
+
+def _compact_write(written: str) -> Any:
+    """Reduces a write report to counts; the track lists are what the caller sent."""
+    if not isinstance(_payload_of(written), dict):
+        return written
+    report = _payload_of(written)
+    return {
+        "result": report["result"],
+        "playlist_id": report["playlist_id"],
+        "landed": len(report["landed"]),
+        "failed": len(report["failed"]),
+        "dropped": len(report["dropped"]),
+        "requests": report["requests"],
+        "version": report["version"]
+    }
+
+
+@mcp.tool()
+@log_execution
+@budgeted_response
+def curate_playlist(spec: Dict) -> str:
+    """
+    Builds a playlist server-side in one call: harvest -> dedupe/diversify -> quality
+    gates -> optional sequencing -> write. Only a compact summary is returned, so the
+    candidate list never has to travel through the conversation.
+
+    Example spec:
+        {"name": "Sunday Jazz", "mode": "hidden_gems,top_rated", "limit": 30,
+         "include_genres": ["Jazz"], "max_tracks_per_artist": 2,
+         "rules": {"min_artist_gap": 1}, "min_tracks": 20, "sequence": true}
+
+    Spec keys:
+        name: Target playlist (required unless dry_run).
+        mode, limit, include_genres, exclude_genres, min_bpm, max_bpm, mood, include_tags,
+        exclude_tags, seed, dedupe, max_tracks_per_artist, diversity, diversity_caps,
+        diversity_weights: Harvest options, as in get_smart_candidates (limit defaults to 30).
+        rules: Quality gate in validate_playlist_rules syntax, checked after sequencing.
+        min_tracks: Minimum harvested tracks (default 1).
+        min_artist_entropy: Minimum normalized artist entropy (0..1).
+        sequence: true, or transition weights as in sequence_playlist's objective.
+        time_budget_ms: Sequencing refinement budget (default 300).
+        operation: 'create' (default), 'sync' or 'append'.
+        dry_run: Run every stage but skip the write.
+        return_ids: Include the final track IDs (default: only on dry_run).
+
+    Returns JSON {"name", "status" (written|failed|deduplicated|rejected|dry_run), "stages",
+    "metrics", "violations", "preview", "write"?, "track_ids"?}. A rejected playlist is not
+    written; "failed" means the write raised or some batches were rejected (see "write").
+    """
+    unknown = sorted(set(spec) - set(CURATE_KEYS))
+    if unknown:
+        return f"Error: Unknown spec keys {unknown}. Use {sorted(CURATE_KEYS)}."
+    if not spec.get("mode"):
+        return "Error: spec.mode is required (e.g. 'hidden_gems' or 'top_rated,rediscover')."
+    name = spec.get("name")
+    dry_run = bool(spec.get("dry_run"))
+    if not name and not dry_run:
+        return "Error: spec.name is required unless dry_run is set."
+    operation = spec.get("operation", "create")
+    if operation not in ("create", "sync", "append"):
+        return f"Error: Unknown operation '{operation}'. Use 'create', 'sync' or 'append'."
+    weights = dict(SEQUENCE_WEIGHTS)
+    if isinstance(spec.get("sequence"), dict):
+        weights.update(spec["sequence"])
+        unknown = set(weights) - set(SEQUENCE_WEIGHTS)
+        if unknown:
+            return f"Error: Unknown objective terms {sorted(unknown)}. Use {sorted(SEQUENCE_WEIGHTS)}."
+    try:
+        ruleset = _compile_rules(spec.get("rules") or {})
+    except (TypeError, ValueError) as e:
+        return f"Error: Invalid spec.rules - {e}"
+
+    conn = get_conn()
+    try:
+        # --- 1. HARVEST (filters, mood, dedupe, diversity) ---
+        harvest = {k: spec[k] for k in CURATE_HARVEST_KEYS if k in spec}
+        harvest.setdefault("limit", 30)
+        raw = get_smart_candidates(**harvest, max_response_tokens=0)
+        tracks = _payload_of(raw)
+        if not isinstance(tracks, list):
+            return raw if raw.startswith("Error") else f"Error: Harvest failed - {raw}"
+        stages = {"harvested": len(tracks)}
+
+        if ruleset.needs_tags:
+            _tags.sync(conn)
+        table = _TrackTable.from_songs(tracks)
+
+        # --- 2. SEQUENCING ---
+        if spec.get("sequence") and len(table) > 2:
+            matrix = _transition_matrix(table, weights)
+            identity = list(range(len(table)))
+            budget = max(0, spec.get("time_budget_ms", 300)) / 1000.0
+            order, passes = _sequence_order(matrix, 0, budget)
+            stages["sequenced"] = {
+                "cost_before": round(_path_cost(identity, matrix), 3),
+                "cost_after": round(_path_cost(order, matrix), 3),
+                "passes": passes
+            }
+            table = _TrackTable.from_songs([tracks[i] for i in order])
+
+        # --- 3. QUALITY GATES ---
+        analysis = _analyze_table(table)
+        violations = ruleset.evaluate(table)
+        min_tracks = spec.get("min_tracks", 1)
+        if len(table) < min_tracks:
+            violations.append(_violation("min_tracks", f"Only {len(table)} tracks harvested.", value=len(table), limit=min_tracks))
+        min_entropy = spec.get("min_artist_entropy")
+        artist_entropy = analysis["entropy"]["artist"]["normalized"]
+        if min_entropy is not None and artist_entropy < min_entropy:
+            violations.append(_violation(
+                "min_artist_entropy", f"Artist entropy {artist_entropy} is below {min_entropy}.",
+                value=artist_entropy, limit=min_entropy
+            ))
+
+        result = {
+            "name": name,
+            "status": "rejected" if violations else ("dry_run" if dry_run else "pending"),
+            "stages": stages,
+            "metrics": {
+                "tracks": len(table),
+                "total_duration_sec": analysis["total_duration_sec"],
+                "unique_artists": len(analysis["artist_counts"]),
+                "entropy": {dim: e["normalized"] for dim, e in analysis["entropy"].items()},
+                "decade_span_years": analysis["decades"]["span_years"],
+                "bpm_max_jump": analysis["bpm"]["transitions"]["max_jump"],
+                "same_artist_adjacent_pairs": analysis["same_artist_runs"]["adjacent_pairs"]
+            },
+            "violations": {
+                "count": len(violations),
+                "by_rule": dict(Counter(v["rule"] for v in violations)),
+                "first": [v["message"] for v in violations[:5]]
+            },
+            "preview": [f"{table.artists[i]} - {table.titles[i]}" for i in range(min(5, len(table)))]
         }
-    }, indent=2)
+        if ruleset.unknown:
+            result["unknown_rules"] = list(ruleset.unknown)
+        if spec.get("return_ids", dry_run):
+            result["track_ids"] = list(table.ids)
+
+        # --- 4. WRITE ---
+        if result["status"] == "pending":
+            job, created = _journal.submit(name, operation, list(table.ids), claim=True)
+            if created:
+                try:
+                    written = _run_playlist_job(conn, job)
+                except Exception as e:
+                    written = f"Error: {e}"
+                report = _payload_of(written)
+                result["status"] = "written" if isinstance(report, dict) and not report["failed"] else "failed"
+                result["write"] = _compact_write(written)
+            else:
+                result["status"] = "deduplicated"
+                result["write"] = {"job_id": job["id"], "job_status": job["status"]}
+        return _dumps(result)
+    except Exception as e:
+        logger.error(f"Error in curate_playlist: {e}")
+        return str(e)
 
 # --- TOOLS: DISCOVERY ---
 
 @mcp.tool()
 @log_execution
-def get_genre_tracks(genre: Any, limit: int = 100) -> str:
+@budgeted_response
+def get_genre_tracks(genre: Any, limit: int = 100, fields: Optional[List[str]] = None, format: str = "json") -> str:
     """
     Fetches random tracks for specific genre(s). 
     Accepts a single string or a list of strings.
+
+    Args:
+        genre: Genre name or list of names.
+        limit: Max tracks to return (default 100).
+        fields: Track keys to return, e.g. ["id", "title", "artist"] ('id' is always kept).
+        format: 'json' (default), 'compact' (no whitespace), 'columnar' ({"columns", "rows"})
+                or 'ids' (bare ID list).
     """
+    error = _check_track_format(format)
+    if error:
+        return error
     conn = get_conn()
     genres = [genre] if isinstance(genre, str) else genre
     all_songs = []
@@ -676,11 +3630,12 @@ def get_genre_tracks(genre: Any, limit: int = 100) -> str:
     final_list = list(unique_songs.values())
     random.shuffle(final_list)
     
-    return json.dumps(final_list[:limit], indent=2)
+    return _format_tracks(final_list[:limit], fields, format)
 
 
 @mcp.tool()
 @log_execution
+@budgeted_response
 def get_similar_artists(artist_id: Optional[str] = None, artist_name: Optional[str] = None, limit: int = 20) -> str:
     """
     Gets similar artists. Provide artist_id OR artist_name (name will be resolved to ID first).
@@ -769,7 +3724,7 @@ def get_similar_artists(artist_id: Optional[str] = None, artist_name: Optional[s
                 "source": source_type
             })
         
-        return json.dumps(output, indent=2, ensure_ascii=False)
+        return _dumps(output)
     except Exception as e:
         logger.error(f"Error in get_similar_artists: {e}")
         return str(e)
@@ -777,8 +3732,21 @@ def get_similar_artists(artist_id: Optional[str] = None, artist_name: Optional[s
 
 @mcp.tool()
 @log_execution
-def get_similar_songs(song_id: str, limit: int = 50) -> str:
-    """Gets similar songs to the target song (Radio Mode)."""
+@budgeted_response
+def get_similar_songs(song_id: str, limit: int = 50, fields: Optional[List[str]] = None, format: str = "json") -> str:
+    """
+    Gets similar songs to the target song (Radio Mode).
+
+    Args:
+        song_id: Seed track.
+        limit: Max tracks to return (default 50).
+        fields: Track keys to return, e.g. ["id", "title", "artist"] ('id' is always kept).
+        format: 'json' (default), 'compact' (no whitespace), 'columnar' ({"columns", "rows"})
+                or 'ids' (bare ID list).
+    """
+    error = _check_track_format(format)
+    if error:
+        return error
     conn = get_conn()
     try:
         # getSimilarSongs2 returns songs from the library similar to query
@@ -786,12 +3754,13 @@ def get_similar_songs(song_id: str, limit: int = 50) -> str:
         songs = res.get('similarSongs2', {}).get('song', [])
         
         output = [_format_song(s) for s in songs]
-        return json.dumps(output, indent=2)
+        return _format_tracks(output, fields, format)
     except Exception as e: return str(e)
 
 
 @mcp.tool()
 @log_execution
+@budgeted_response
 def get_genres() -> str:
     """Lists all available genres with track and album counts."""
     conn = get_conn()
@@ -808,11 +3777,12 @@ def get_genres() -> str:
                 "tracks": g.get('songCount'),
                 "albums": g.get('albumCount')
             })
-        return json.dumps(output, indent=2)
+        return _dumps(output)
     except Exception as e: return str(e)
 
 @mcp.tool()
 @log_execution
+@budgeted_response
 def explore_genre(genre: str, limit: int = 50) -> str:
     """Gets detailed metrics for a genre (Top Artists, Album counts)."""
     conn = get_conn()
@@ -846,12 +3816,13 @@ def explore_genre(genre: str, limit: int = 50) -> str:
             "unique_artists": len(sorted_artists),
             "top_artists": sorted_artists[:limit]
         }
-        return json.dumps(output, indent=2)
+        return _dumps(output)
     except Exception as e: return str(e)
 
 
 @mcp.tool()
 @log_execution
+@budgeted_response
 def get_smart_candidates(
     mode: str, 
     limit: int = 50,
@@ -860,7 +3831,18 @@ def get_smart_candidates(
     min_bpm: Optional[int] = None,
     max_bpm: Optional[int] = None,
     mood: Optional[str] = None,
-    max_tracks_per_artist: Optional[int] = None
+    max_tracks_per_artist: Optional[int] = None,
+    seed: Optional[int] = None,
+    cursor: Optional[str] = None,
+    page_size: Optional[int] = None,
+    diversity: Optional[float] = None,
+    diversity_caps: Optional[Dict[str, int]] = None,
+    diversity_weights: Optional[Dict[str, float]] = None,
+    include_tags: Optional[List[str]] = None,
+    exclude_tags: Optional[List[str]] = None,
+    dedupe: str = "smart_score",
+    fields: Optional[List[str]] = None,
+    format: str = "json"
 ) -> str:
     """
     Generates lists based on stats with advanced filtering.
@@ -874,25 +3856,57 @@ def get_smart_candidates(
         exclude_genres: List of genres to exclude
         min_bpm: Minimum BPM
         max_bpm: Maximum BPM
-        mood: 'relax', 'energy', 'focus', etc.
-        max_tracks_per_artist: Diversity constraint
+        mood: Name of a profile in the mood registry ('relax', 'energy', 'focus', ...).
+              Explicit genre/BPM arguments are combined with (and override) the profile.
+        max_tracks_per_artist: Diversity constraint (shortcut for diversity_caps={"artist": N})
+        seed: Optional RNG seed for reproducible local sampling. Given the same harvested pool,
+              the same seed returns the same tracks in the same order.
+        cursor: Token from a previous paged call. Serves the next page from the server-side
+                cache (no Navidrome calls); all other filter arguments are ignored.
+        page_size: Enables paging. The full ranked harvest is cached under a cursor and the
+                   response becomes {"cursor", "offset", "total", "tracks"}.
+        diversity: Enables MMR re-ranking. Trade-off between smart score (1.0) and novelty
+                   w.r.t. already picked tracks (0.0). Default 0.7 when any diversity option is set.
+        diversity_caps: Hard caps per attribute value, e.g. {"artist": 2, "album": 1, "decade": 10}.
+        diversity_weights: Similarity weights for artist/album/genre/decade
+                           (default {"artist": 0.5, "album": 0.2, "genre": 0.2, "decade": 0.1}).
+        include_tags: Keep only tracks carrying any of these virtual tags ('Focus' or 'System:Mood:Focus').
+        exclude_tags: Drop tracks carrying any of these virtual tags.
+        dedupe: Alternate versions (remaster, live, compilation copy) of the same song are
+                collapsed to one: 'smart_score' keeps the best scored, 'original' the earliest
+                year, 'first' the first harvested; 'none' disables.
+        fields: Track keys to return, e.g. ["id", "title", "artist"] ('id' is always kept).
+        format: 'json' (default), 'compact' (no whitespace), 'columnar' ({"columns", "rows"})
+                or 'ids' (bare ID list).
     """
+    error = _check_track_format(format)
+    if error:
+        return error
+    if cursor:
+        return _page_candidates(cursor, page_size or limit, fields, format)
+    if dedupe and dedupe not in DUPLICATE_KEEP_POLICIES + ("none",):
+        return f"Error: Unknown dedupe policy '{dedupe}'. Use one of {list(DUPLICATE_KEEP_POLICIES)} or 'none'."
+
     conn = get_conn()
+    rng = random.Random(seed)
     try:
-        # --- 1. MOOD MAPPING ---
+        # --- 1. MOOD PROFILE ---
+        profile = _NO_MOOD
         if mood:
-            mood = mood.lower()
-            if mood == "relax":
-                if max_bpm is None: max_bpm = 115
-                if exclude_genres is None: exclude_genres = []
-                exclude_genres.extend(["Metal", "Hard Rock", "Punk", "Industrial", "Techno", "Drum and Bass"])
-            elif mood in ["energy", "workout"]:
-                if min_bpm is None: min_bpm = 120
-            elif mood == "focus":
-                if exclude_genres is None: exclude_genres = []
-                exclude_genres.extend(["Pop", "Hip-Hop", "Rap", "Vocal"])
+            profile = MOOD_REGISTRY.get(mood.lower(), _NO_MOOD)
+            if profile is _NO_MOOD:
+                logger.warning(f"Unknown mood '{mood}'. Known moods: {sorted(MOOD_REGISTRY)}")
+        track_filter = profile.resolve(include_genres, exclude_genres, min_bpm=min_bpm, max_bpm=max_bpm)
                 
         # --- 2. MULTI-MODE DISPATCH ---
+        _library.sync(conn)
+        try:
+            _tags.sync(conn)
+        except Exception as e:
+            # Tags are enrichment; harvesting proceeds without them
+            logger.warning(f"Tag index sync failed: {e}")
+            if include_tags or exclude_tags:
+                return f"Error: Could not load virtual tags for tag filtering: {e}"
         modes = [m.strip() for m in mode.split(",")]
         candidates = []
         today = datetime.datetime.now()
@@ -906,8 +3920,7 @@ def get_smart_candidates(
                 albums = _fetch_albums("newest", size=fetch_limit)
                 for alb in albums:
                     try:
-                        res = conn.getMusicDirectory(alb['id'])
-                        songs = [s for s in res.get('directory', {}).get('child', []) if not s.get('isDir')]
+                        songs = _fetch_album_tracks(conn, alb['id'])
                         if songs: pool.append(_format_song(songs[0]))
                     except: continue
 
@@ -915,8 +3928,7 @@ def get_smart_candidates(
                 frequent_albums = _fetch_albums("frequent", size=fetch_limit)
                 for alb in frequent_albums:
                     try:
-                        res = conn.getMusicDirectory(alb['id'])
-                        pool.extend([_format_song(s) for s in res.get('directory', {}).get('child', []) if not s.get('isDir')])
+                        pool.extend([_format_song(s) for s in _fetch_album_tracks(conn, alb['id'])])
                     except: continue
                 pool.sort(key=lambda x: x.get('play_count', 0), reverse=True)
 
@@ -935,11 +3947,10 @@ def get_smart_candidates(
                 alb_pool = _fetch_albums("random", size=20)
                 for alb in alb_pool:
                      try:
-                         res = conn.getMusicDirectory(alb['id'])
-                         songs = [s for s in res.get('directory', {}).get('child', []) if not s.get('isDir')]
+                         songs = _fetch_album_tracks(conn, alb['id'])
                          if songs:
                              # Pick a random track from the album
-                             pool.append(_format_song(random.choice(songs)))
+                             pool.append(_format_song(rng.choice(songs)))
                      except: continue
 
             elif current_mode == "rediscover_deep":
@@ -965,28 +3976,26 @@ def get_smart_candidates(
 
             elif current_mode == "fallen_pillars":
                 # Identify top artists and scan for forgotten tracks
-                pillars = json.loads(analyze_library(mode="pillars"))[:10]
+                pillars = _payload_of(analyze_library(mode="pillars", max_response_tokens=0))[:10]
                 for p in pillars:
                     try:
                         # getArtist returns albums, we need tracks
                         res = conn.getArtist(p['id'])
                         albums = res.get('artist', {}).get('album', [])
                         for alb in albums[:3]: # Scan top 3 albums
-                            songs_res = conn.getMusicDirectory(alb['id'])
-                            for s in songs_res.get('directory', {}).get('child', []):
-                                if not s.get('isDir'):
-                                    lp_str = s.get('played')
-                                    if not lp_str or (today - datetime.datetime.fromisoformat(lp_str.replace("Z", ""))).days > 365:
-                                        pool.append(_format_song(s))
+                            for s in _fetch_album_tracks(conn, alb['id']):
+                                lp_str = s.get('played')
+                                if not lp_str or (today - datetime.datetime.fromisoformat(lp_str.replace("Z", ""))).days > 365:
+                                    pool.append(_format_song(s))
                     except: continue
 
             elif current_mode == "similar_to_starred":
                 starred = conn.getStarred()
                 if 'starred' in starred and 'song' in starred['starred']:
-                    seeds = random.sample(starred['starred']['song'], min(3, len(starred['starred']['song'])))
-                    for seed in seeds:
+                    seeds = rng.sample(starred['starred']['song'], min(3, len(starred['starred']['song'])))
+                    for seed_track in seeds:
                         try:
-                            sim = conn.getSimilarSongs2(seed['id'], count=10)
+                            sim = conn.getSimilarSongs2(seed_track['id'], count=10)
                             pool.extend([_format_song(s) for s in sim.get('similarSongs2', {}).get('song', [])])
                         except: continue
 
@@ -994,10 +4003,11 @@ def get_smart_candidates(
                  # (Legacy divergent logic kept as fallback)
                  freq = _fetch_albums("frequent", size=10)
                  top_genres = {a.get('genre') for a in freq if a.get('genre')}
-                 all_genres = [g['name'] for g in json.loads(get_genres())]
+                 all_genres = [g['name'] for g in _payload_of(get_genres(max_response_tokens=0))]
                  divergent = list(set(all_genres) - top_genres)
                  if divergent:
-                     random.shuffle(divergent)
+                     divergent.sort()
+                     rng.shuffle(divergent)
                      for g in divergent[:3]:
                          res = conn.getRandomSongs(size=5, genre=g)
                          if 'randomSongs' in res:
@@ -1009,44 +4019,49 @@ def get_smart_candidates(
         unique_candidates = {c['id']: c for c in candidates}
         candidates = list(unique_candidates.values())
         
-        filtered = []
-        for c in candidates:
-            # Genre
-            gv = c.get('genre', '').lower()
-            if include_genres and not any(i.lower() in gv for i in include_genres): continue
-            if exclude_genres and any(e.lower() in gv for e in exclude_genres): continue
-            # BPM
-            bv = c.get('bpm', 0)
-            if min_bpm and bv < min_bpm: continue
-            if max_bpm and bv > 0 and bv > max_bpm: continue
-            filtered.append(c)
+        # Single pass with the compiled mood/request predicate
+        filtered = [c for c in candidates if track_filter(c)]
+        if include_tags:
+            filtered = [c for c in filtered if _tags.matches(c['id'], include_tags)]
+        if exclude_tags:
+            filtered = [c for c in filtered if not _tags.matches(c['id'], exclude_tags)]
+        if profile.score_weights:
+            # Ranking-only key; dropped again before the tracks are shaped for output
+            for c in filtered:
+                c['mood_score'] = profile.score(c)
+        score_key = 'mood_score' if profile.score_weights else 'smart_score'
+        if dedupe and dedupe != "none":
+            filtered, _ = _dedupe_versions(filtered, dedupe, score_key)
             
         if not filtered and (mood or min_bpm):
             return "Error: Strict filtering eliminated all candidates. Try removing mood/BPM constraints."
 
-        # Diversify
+        # --- 4. SMART SELECTION (Top-K) ---
+        caps = dict(diversity_caps or {})
         if max_tracks_per_artist:
-            counts = Counter()
-            final_div = []
-            for c in filtered:
-                art = c['artist']
-                if counts[art] < max_tracks_per_artist:
-                    final_div.append(c)
-                    counts[art] += 1
-            filtered = final_div
-
-        # --- 4. SMART SELECTION (New Sort Logic) ---
-        # Sort by Smart Score Descending to prioritize better tracks
-        filtered.sort(key=lambda x: x.get('smart_score', 0), reverse=True)
-        
-        # Take the top bucket (Limit * 2) to maintain quality but allow variety
-        top_tier = filtered[:limit*2]
-        
-        # Shuffle the top tier for variety
-        random.shuffle(top_tier)
-        
-        # Return limit
-        return json.dumps(top_tier[:limit], indent=2)
+            caps.setdefault("artist", max_tracks_per_artist)
+        diversify = diversity is not None or bool(caps) or bool(diversity_weights)
+
+        if page_size:
+            # Paged harvest: rank the whole pool once and keep it server-side
+            ranked = _rank_candidates(filtered, len(filtered), rng, score_key)
+            if diversify:
+                ranked = _mmr_rerank(
+                    ranked, min(len(ranked), DIVERSITY_MAX_DEPTH),
+                    DIVERSITY_LAMBDA if diversity is None else diversity, diversity_weights, caps, score_key
+                )
+            set_id = _candidate_cursors.put(_drop_rank_keys(ranked), size=len(ranked))
+            return _page_candidates(_encode_cursor(set_id, 0), page_size, fields, format)
+
+        if diversify:
+            # MMR over the ranked pool: score vs. similarity to already picked tracks
+            ranked = _rank_candidates(filtered, len(filtered), rng, score_key)
+            return _format_tracks(_drop_rank_keys(_mmr_rerank(
+                ranked, limit, DIVERSITY_LAMBDA if diversity is None else diversity, diversity_weights, caps, score_key
+            )), fields, format)
+
+        # Heap-based top tier (Limit * 2) by Smart Score, sampled with the request RNG
+        return _format_tracks(_drop_rank_keys(_select_top_candidates(filtered, limit, rng, score_key)), fields, format)
 
     except Exception as e:
         logger.error(f"get_smart_candidates failed: {e}", exc_info=True)
@@ -1056,7 +4071,22 @@ def get_smart_candidates(
 
 @mcp.tool()
 @log_execution
-def manage_playlist(name: str, operation: str = "get", track_ids: List[str] = None) -> str:
+@budgeted_response
+def manage_playlist(
+    name: str,
+    operation: str = "get",
+    track_ids: List[str] = None,
+    background: bool = False,
+    idempotency_key: Optional[str] = None,
+    offset: int = 0,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    shuffle: bool = False,
+    fields: Optional[List[str]] = None,
+    version: Optional[int] = None,
+    dedupe: Optional[str] = None,
+    format: str = "json"
+) -> str:
     """
     Manages playlists and moods.
     
@@ -1065,125 +4095,347 @@ def manage_playlist(name: str, operation: str = "get", track_ids: List[str] = No
         operation: 
             - 'create': Replaces/Creates playlist with track_ids.
             - 'append': Adds track_ids to playlist (creates if missing).
-            - 'get': Returns tracks in playlist.
-        track_ids: List of track IDs (required for create/append).
+            - 'sync': Makes the playlist equal to track_ids with a minimal diff of removals and
+                      appends. Keeps the playlist ID (creates if missing).
+            - 'get': Returns a page of the playlist in playlist order:
+                     {"playlist_id", "cursor", "offset", "total", "tracks"} ("playlist_id" on
+                     the first page only).
+            - 'history': Lists the stored versions of the playlist (newest first, up to `limit`).
+            - 'restore': Brings the playlist back to `version` with a minimal-diff sync.
+        track_ids: List of track IDs (required for create/append/sync).
+        background: Queue the write in the journal and return a job ID immediately.
+                    Poll with get_playlist_job_status(job_id).
+        idempotency_key: Optional client key; retrying with the same key never writes twice.
+        offset / limit: Page window for 'get' (default first 50 tracks). A get without a
+                        cursor always downloads the current playlist.
+        cursor: Token from a previous 'get' page. Serves the next page from the server-side
+                snapshot of the playlist (no download); name/offset/shuffle are ignored.
+        shuffle: Return the playlist in random order (the snapshot keeps that order while paging).
+        fields: Track keys to return for 'get', e.g. ["id", "title", "artist"].
+        format: Track layout for 'get': 'json' (default), 'compact', 'columnar' or 'ids'.
+        version: Version number for 'restore' (see 'history').
+        dedupe: Collapse alternate versions of the same song in track_ids before writing:
+                'smart_score', 'original' (earliest year) or 'first'. Off by default.
+
+    Writes are journaled, batched by encoded request length (see NAVIDROME_USE_GET /
+    NAVIDROME_MAX_*_LENGTH) and return JSON: {"result", "playlist_id", "landed", "failed",
+    "dropped", "requests", "version"}. Every write (and delete) is recorded in the playlist
+    history, so it can be undone with 'restore'.
     """
     conn = get_conn()
     try:
-        BATCH_SIZE = 10
-        
-        # Find playlist by name
-        playlists = conn.getPlaylists().get('playlists', {}).get('playlist', [])
-        pl_id = next((p['id'] for p in playlists if p['name'] == name), None)
+        if operation in ("get", "delete"):
+            # Find playlist by name (cached index)
+            pl_id = _resolve_playlist_id(conn, name)
         
         if operation == "get":
-            if not pl_id: return "[]"
+            error = _check_track_format(format)
+            if error:
+                return error
+            if cursor:
+                return _page_cached_set(_playlist_snapshots, cursor, limit,
+                                        "Call manage_playlist get without cursor.", fields, format=format)
+            if not pl_id:
+                return _dumps({"playlist_id": None, "cursor": None, "offset": 0, "total": 0, "tracks": []})
+            # A get without a cursor always downloads the playlist, so edits made in other
+            # clients are seen; only the cursor it returns pages through the snapshot.
             entries = conn.getPlaylist(pl_id).get('playlist', {}).get('entry', [])
-            random.shuffle(entries)
-            # Limit default return to 50 for safety
-            return json.dumps([_format_song(s) for s in entries[:50]], indent=2)
+            tracks = [_format_song(s) for s in entries]
+            if shuffle:
+                random.shuffle(tracks)
+            snapshot_key = _playlist_snapshots.put(tracks, size=len(tracks))
+            return _page_cached_set(_playlist_snapshots, _encode_cursor(snapshot_key, offset), limit,
+                                    "Call manage_playlist get without cursor.", fields, {"playlist_id": pl_id}, format)
 
         if operation == "delete":
             if not pl_id:
                 return f"Playlist '{name}' not found."
+            _history_baseline(conn, name, live=True)
             conn.deletePlaylist(pl_id)
+            _playlists.forget(name)
+            _tags.forget(name)
+            _history.record(name, [], "delete")
             return f"Deleted playlist '{name}' (ID: {pl_id})."
 
+        if operation == "history":
+            return _dumps({"playlist": name, "versions": _history.versions(name, limit)})
+
+        if operation == "restore":
+            if version is None:
+                return "Error: version required for restore (see operation='history')."
+            target = _history.at(name, version)
+            if target is None:
+                return f"Error: Version {version} of '{name}' is not in the history."
+            if not target:
+                return f"Error: Version {version} of '{name}' is empty; use operation='delete' instead."
+            # Restores are ordinary journaled syncs: minimal diff against the live playlist
+            operation, track_ids = "sync", target
+
+        if operation not in ("create", "append", "sync"):
+            return f"Unknown operation: {operation}"
+
         if not track_ids:
-            return "Error: track_ids required for create/append."
-        # --- ID VERIFICATION (Sync Ghost Fix) ---
-        valid_ids = []
-        dropped_ids = []
-        
-        # Verify each ID existence and 'freshness'
-        # This prevents "Success" responses when tracks are actually silently rejected by the API
-        for tid in track_ids:
+            return "Error: track_ids required for create/append/sync."
+
+        if dedupe:
+            if dedupe not in DUPLICATE_KEEP_POLICIES:
+                return f"Error: Unknown dedupe policy '{dedupe}'. Use one of {list(DUPLICATE_KEEP_POLICIES)}."
+            found, missing = _resolve_songs(conn, track_ids)
+            kept, removed = _dedupe_versions([_format_song(found[t]) for t in track_ids if t in found], dedupe)
+            if removed:
+                logger.info(f"Dropped {len(removed)} alternate versions before writing '{name}'.")
+            # Unresolvable IDs stay in and are reported by the write verification
+            track_ids = [t['id'] for t in kept] + missing
+
+        # --- WRITE-AHEAD JOURNAL ---
+        # Synchronous writes are claimed on insert so the background worker cannot race us
+        job, created = _journal.submit(name, operation, list(track_ids), idempotency_key, claim=not background)
+        if not created:
+            return _dumps({"deduplicated": True, **_job_summary(job)})
+
+        if background:
+            _ensure_journal_worker()
+            return _dumps({
+                "job_id": job["id"],
+                "status": "pending",
+                "result": f"Queued {operation} of {len(track_ids)} tracks for '{name}'. Poll get_playlist_job_status."
+            })
+
+        return _run_playlist_job(conn, job)
+
+    except Exception as e:
+        logger.error(f"Error in manage_playlist {name}: {e}")
+        return str(e)
+
+
+@mcp.tool()
+@log_execution
+@budgeted_response
+def bulk_tag(assignments: Dict[str, Any]) -> str:
+    """
+    Adds/removes virtual tags (mood playlists) for many tracks in one call.
+
+    Args:
+        assignments: {track_id: {"add": [tags], "remove": [tags]}} (a plain list means "add").
+                     Tags are playlist names; bare names get the 'NG:Mood:' prefix
+                     (e.g. "Focus" -> "NG:Mood:Focus"). Prefixed names must use the
+                     'System:Mood:' or 'NG:Mood:' namespace; other names containing ':'
+                     are rejected.
+
+    IDs are verified once, changes are grouped per playlist and each playlist receives the
+    minimal set of updates. Returns JSON with per-tag results.
+    """
+    if not assignments:
+        return "Error: assignments is empty."
+    try:
+        groups = _group_tag_assignments(assignments)
+    except ValueError as e:
+        return f"Error: {e}"
+    conn = get_conn()
+    try:
+        to_verify = list(dict.fromkeys(tid for g in groups.values() for tid in g["add"]))
+        valid_ids, dropped_ids = _verify_track_ids(conn, to_verify)
+        valid = set(valid_ids)
+        if dropped_ids:
+            logger.warning(f"bulk_tag dropped {len(dropped_ids)} stale/ghost IDs: {dropped_ids}")
+
+        results = {}
+        for pl_name, change in groups.items():
+            adds = [tid for tid in change["add"] if tid in valid]
+            removes = set(change["remove"])
             try:
-                res = conn.getSong(tid)
-                if res.get('song'):
-                    valid_ids.append(tid)
+                pl_id = _resolve_playlist_id(conn, pl_name)
+                if not pl_id:
+                    if not adds:
+                        results[pl_name] = {"status": "unchanged", "added": 0, "removed": 0, "requests": 0}
+                        continue
+                    pl_id, first = _create_with_first_batch(conn, pl_name, adds)
+                    if not pl_id:
+                        results[pl_name] = {"status": "error", "error": "Created playlist but could not resolve its ID."}
+                        continue
+                    writes = _append_tracks(conn, pl_id, adds[len(first):],
+                                            {"landed": list(first), "failed": [], "requests": 1})
+                    changed = _playlists.record(pl_name, pl_id, song_count=len(writes["landed"]))
+                    _tags.set_playlist(pl_name, writes["landed"], changed)
+                    _history.record(pl_name, writes["landed"], "bulk_tag", changed)
+                    results[pl_name] = {"status": "created", "playlist_id": pl_id, "added": len(writes["landed"]),
+                                        "removed": 0, "failed": writes["failed"], "requests": writes["requests"]}
+                    continue
+
+                current = _playlist_track_ids(conn, pl_id)
+                # The live contents are the baseline of this edit (no-op if the history agrees)
+                _history.record(pl_name, current, "baseline", _playlists.stamp(pl_name))
+                present = set(current)
+                target = [tid for tid in current if tid not in removes]
+                target += [tid for tid in adds if tid not in present]
+                if target == current:
+                    results[pl_name] = {"status": "unchanged", "playlist_id": pl_id, "added": 0, "removed": 0, "requests": 0}
+                    continue
+                stats = _sync_playlist(conn, pl_id, target, current=current)
+                changed = _playlists.record(pl_name, pl_id, song_count=stats["kept"] + stats["added"])
+                rejected = set(stats["failed"])
+                after = [tid for tid in target if tid not in rejected]
+                _tags.set_playlist(pl_name, after, changed)
+                _history.record(pl_name, after, "bulk_tag", changed)
+                results[pl_name] = {"status": "updated", "playlist_id": pl_id, "added": stats["added"],
+                                    "removed": stats["removed"], "failed": stats["failed"], "requests": stats["requests"]}
+            except Exception as e:
+                logger.error(f"bulk_tag failed for {pl_name}: {e}")
+                results[pl_name] = {"status": "error", "error": str(e)}
+
+        return _dumps({
+            "tags": results,
+            "dropped": dropped_ids,
+            "requests": sum(r.get("requests", 0) for r in results.values())
+        })
+    except Exception as e:
+        logger.error(f"Error in bulk_tag: {e}")
+        return str(e)
+
+
+@mcp.tool()
+@log_execution
+@budgeted_response
+def export_playlist(name: str, file_path: str, format: str = "m3u8") -> str:
+    """
+    Exports a playlist to a local file, one line (pair) per entry, in playlist order.
+
+    Args:
+        name: Playlist name.
+        file_path: Target file inside NAVIDROME_PLAYLIST_DIR (relative paths are resolved from it).
+        format: 'm3u8' (extended M3U using each track's library path) or 'jsonl'
+                (one JSON object per track: id, path, artist, album, title, duration).
+    """
+    if format not in ("m3u8", "jsonl"):
+        return f"Error: Unknown format '{format}'. Use 'm3u8' or 'jsonl'."
+    try:
+        target = _playlist_file(file_path)
+    except ValueError as e:
+        return f"Error: {e}"
+    conn = get_conn()
+    try:
+        pl_id = _resolve_playlist_id(conn, name)
+        if not pl_id:
+            return f"Playlist '{name}' not found."
+        entries = conn.getPlaylist(pl_id).get('playlist', {}).get('entry', [])
+
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = target.with_name(target.name + ".tmp")
+        # Entries are written one by one to a temp file, then swapped in atomically
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            if format == "m3u8":
+                fh.write(f"#EXTM3U\n#PLAYLIST:{name}\n")
+            for e in entries:
+                if format == "m3u8":
+                    fh.write(f"#EXTINF:{e.get('duration', 0)},{e.get('artist', '')} - {e.get('title', '')}\n{e.get('path', '')}\n")
                 else:
-                    dropped_ids.append(tid)
-            except Exception:
-                dropped_ids.append(tid)
+                    fh.write(_json_dumps({k: e.get(k) for k in ("id", "path", "artist", "album", "title", "duration")}) + "\n")
+        os.replace(tmp_path, target)
+        logger.info(f"Exported playlist '{name}' ({len(entries)} tracks) to {target}", extra={"action": "playlist_export"})
+        return _dumps({"playlist": name, "playlist_id": pl_id, "file": str(target), "format": format, "tracks": len(entries)})
+    except Exception as e:
+        logger.error(f"Error exporting playlist {name}: {e}")
+        return str(e)
 
-        if not valid_ids:
-            return f"Error: All {len(track_ids)} provided track IDs were invalid or stale. No changes made."
-            
-        if dropped_ids:
-            logger.warning(f"Dropped {len(dropped_ids)} stale/ghost IDs from playlist request: {dropped_ids}")
-            # Update the working list to only include valid IDs
-            track_ids = valid_ids
-        
-        # --- BATCHING LOGIC ---
-        chunks = [track_ids[i:i + BATCH_SIZE] for i in range(0, len(track_ids), BATCH_SIZE)]
-        
-        if operation == "create":
-            if pl_id:
-                # Subsonic API might allow duplicates, we enforce unique name by ID
-                conn.deletePlaylist(pl_id)
-                logger.info(f"Deleted existing playlist: {name} (ID: {pl_id})")
-                pl_id = None
-            
-            if not chunks: return f"Created empty playlist '{name}'."
 
-            # Create with first chunk
-            conn.createPlaylist(name=name, songIds=chunks[0])
-            logger.info(f"Created base playlist '{name}' with {len(chunks[0])} tracks.")
-            
-            # If valid remaining chunks, we need to append
-            if len(chunks) > 1:
-                 # Wait a beat for server consistency
-                 time.sleep(0.5)
-                 
-                 # Re-fetch ID if we don't have it (we just created it, so we don't)
-                 playlists = conn.getPlaylists().get('playlists', {}).get('playlist', [])
-                 pl_id = next((p['id'] for p in playlists if p['name'] == name), None)
-                 
-                 if not pl_id:
-                     return f"Warning: Created playlist '{name}' but could not verify existence for batch appending. Only first {len(chunks[0])} tracks saved."
-                 
-                 for i, chunk in enumerate(chunks[1:]):
-                     time.sleep(0.2) # Kindness delay
-                     conn.updatePlaylist(pl_id, songIdsToAdd=chunk)
-                     logger.info(f"Batch {i+2}/{len(chunks)} appended ({len(chunk)} tracks).")
-
-            return f"Created playlist '{name}' with {len(track_ids)} tracks ({len(chunks)} batches)."
-
-        elif operation == "append":
-            start_index = 0
-            if not pl_id:
-                 if not chunks: return "Nothing to append and playlist logic error."
-                 # Create with first chunk if missing
-                 conn.createPlaylist(name=name, songIds=chunks[0])
-                 start_index = 1
-                 time.sleep(0.5)
-                 # Fetch ID for subsequent
-                 if len(chunks) > 1:
-                     playlists = conn.getPlaylists().get('playlists', {}).get('playlist', [])
-                     pl_id = next((p['id'] for p in playlists if p['name'] == name), None)
-            
-            # Append remaining or all chunks
-            if pl_id:
-                for i, chunk in enumerate(chunks[start_index:]):
-                    conn.updatePlaylist(pl_id, songIdsToAdd=chunk)
-                    time.sleep(0.2)
-                return f"Appended {len(track_ids)} tracks to '{name}' ({len(chunks)} batches)."
-            else:
-                 return f"Created new playlist '{name}' with initial batch, but failed to resolve ID for full append."
-            
-        return f"Unknown operation: {operation}"
+@mcp.tool()
+@log_execution
+@budgeted_response
+def import_playlist(file_path: str, name: str, format: Optional[str] = None, operation: str = "create") -> str:
+    """
+    Imports an M3U8 or JSONL playlist file into Navidrome.
+
+    Args:
+        file_path: Source file inside NAVIDROME_PLAYLIST_DIR (relative paths are resolved from it).
+        name: Target playlist name.
+        format: 'm3u8' or 'jsonl' (default: from the file extension).
+        operation: How to write the matched tracks: 'create' (replace), 'append' or 'sync'.
+
+    Entries are streamed and matched by library path first, then by normalized artist/title;
+    matched tracks are written with the batched playlist write path.
+    """
+    try:
+        source = _playlist_file(file_path, must_exist=True)
+    except ValueError as e:
+        return f"Error: {e}"
+    format = format or ("jsonl" if source.suffix.lower() in (".jsonl", ".ndjson") else "m3u8")
+    if format not in ("m3u8", "jsonl"):
+        return f"Error: Unknown format '{format}'. Use 'm3u8' or 'jsonl'."
+    if operation not in ("create", "append", "sync"):
+        return f"Error: operation must be 'create', 'append' or 'sync', not '{operation}'."
+
+    conn = get_conn()
+    try:
+        matcher = _TrackMatcher(conn)
+        track_ids = []
+        matched_by = Counter()
+        unmatched = []
+        unmatched_count = 0
+        with open(source, encoding="utf-8-sig") as fh:
+            for entry in (_iter_m3u8(fh) if format == "m3u8" else _iter_jsonl(fh)):
+                tid, how = matcher.match(entry)
+                if tid:
+                    track_ids.append(tid)
+                    matched_by[how] += 1
+                else:
+                    unmatched_count += 1
+                    if len(unmatched) < 20:
+                        unmatched.append(entry.get('path') or f"{entry.get('artist', '')} - {entry.get('title', '')}")
 
+        summary = {
+            "file": str(source),
+            "matched": len(track_ids),
+            "matched_by": dict(matched_by),
+            "unmatched": unmatched_count,
+            "unmatched_sample": unmatched
+        }
+        if not track_ids:
+            return _dumps({"result": "Error: No entries could be matched. Nothing written.", **summary})
+
+        job, created = _journal.submit(name, operation, track_ids, claim=True)
+        if not created:
+            summary["write"] = {"deduplicated": True, **_job_summary(job)}
+        else:
+            written = _run_playlist_job(conn, job)
+            summary["write"] = _payload_of(written)
+        return _dumps(summary)
     except Exception as e:
-        logger.error(f"Error in manage_playlist {name}: {e}")
+        logger.error(f"Error importing playlist {file_path}: {e}")
         return str(e)
+
+
+@mcp.tool()
+@log_execution
+@budgeted_response
+def get_playlist_job_status(job_id: Optional[str] = None, limit: int = 10) -> str:
+    """
+    Reports background playlist writes queued with manage_playlist(background=True).
+
+    Args:
+        job_id: A specific job. If omitted, lists the most recent jobs.
+        limit: Number of recent jobs to list.
+    """
+    if job_id:
+        job = _journal.get(job_id)
+        if not job:
+            return f"Error: Unknown job '{job_id}'."
+        return _dumps(_job_summary(job))
+    return _dumps([_job_summary(j) for j in _journal.recent(limit)])
+
 @mcp.tool()
 @log_execution
+@budgeted_response
 def assess_playlist_quality(song_ids: List[str]) -> str:
-    """(Bliss) Checks diversity and repetition."""
+    """
+    (Bliss) Checks diversity and repetition.
+
+    Besides the diversity summary, "metrics" carries the full analysis: artist/album/genre
+    entropy, decade spread, BPM distribution and transitions, total duration, smart-score
+    distribution and adjacent same-artist runs.
+    """
     conn = get_conn()
     try:
-        songs = []
+        sids = []
         warnings = []
         
         for sid_raw in song_ids:
@@ -1192,51 +4444,129 @@ def assess_playlist_quality(song_ids: List[str]) -> str:
             if not match:
                 warnings.append(f"{sid_raw} (Invalid ID Format)")
                 continue
-            
-            sid = match.group(1)
-            try:
-                res = conn.getSong(sid)
-                s = res.get('song')
-                if s: 
-                    songs.append(s)
-                else:
-                    warnings.append(f"{sid} (Not found in library)")
-            except Exception:
-                warnings.append(sid)
+            sids.append(match.group(1))
+
+        table, analysis, missing = _analyze_playlist(conn, sids)
+        warnings.extend(f"{sid} (Not found in library)" for sid in missing)
 
-        if not songs: 
-            return json.dumps({"error": "No valid songs found", "warnings": warnings})
+        if not len(table):
+            return _dumps({"error": "No valid songs found", "warnings": warnings})
         
-        artists = [s.get('artist') for s in songs]
-        artist_counts = Counter(artists)
-        most_common = artist_counts.most_common(1)[0] if artists else ("None", 0)
+        artist_counts = analysis.pop("artist_counts")
+        most_common = artist_counts.most_common(1)[0]
         
         result = {
-            "total_tracks": len(songs),
-            "unique_artists": len(set(artists)),
+            "total_tracks": len(table),
+            "unique_artists": len(artist_counts),
             "most_repetitive_artist": {
                 "name": most_common[0],
                 "count": most_common[1],
-                "warning": most_common[1] > (len(songs) * 0.3)
+                "warning": most_common[1] > (len(table) * 0.3)
             },
-            "diversity_score": round(len(set(artists)) / len(songs), 2)
+            "diversity_score": round(len(artist_counts) / len(table), 2),
+            "metrics": analysis
         }
         
+        for group in analysis["alternate_versions"]:
+            warnings.append(f"'{group['title']}' by {group['artist']} is present in {len(group['track_ids'])} versions")
+
         if warnings:
             result["warnings"] = warnings
             
-        return json.dumps(result, indent=2)
+        return _dumps(result, meta={
+            "total_tracks": result["total_tracks"],
+            "diversity_score": result["diversity_score"],
+            "repetition_warning": result["most_repetitive_artist"]["warning"],
+            "warnings": len(warnings)
+        })
     except Exception as e: return str(e)
 
 
 @mcp.tool()
 @log_execution
-def search_music_enriched(query: str, limit: int = 20) -> str:
-    """Standard search with full metadata."""
+@budgeted_response
+def assess_playlist_session(
+    session_id: Optional[str] = None,
+    add: Optional[List[str]] = None,
+    remove: Optional[List[str]] = None,
+    close: bool = False
+) -> str:
+    """
+    Incremental quality assessment for playlists built step by step.
+
+    Call without session_id to start a session, then send only the changes: each call costs
+    O(added + removed) instead of re-assessing the whole list. Sessions expire after
+    NAVIDROME_SESSION_TTL seconds of inactivity.
+
+    Args:
+        session_id: Session returned by a previous call (omit to start one).
+        add: Track IDs appended to the playlist.
+        remove: Track IDs removed (latest occurrence).
+        close: Drop the session after returning its final metrics.
+
+    Returns JSON {"session_id", "metrics", "track_ids"?, "warnings"?}.
+    """
+    conn = get_conn()
+    try:
+        if session_id:
+            session = _assessment_sessions.get(session_id)
+            if session is None:
+                return f"Error: Session '{session_id}' has expired or is unknown. Start a new one without session_id."
+        else:
+            session = _AssessmentSession()
+            session_id = _assessment_sessions.put(session)
+
+        warnings = []
+        found, missing = _resolve_songs(conn, add or [])
+        warnings.extend(f"{tid} (Not found in library)" for tid in missing)
+        with session.lock:
+            for tid in add or []:
+                if tid in found:
+                    session.append(found[tid])
+            for tid in remove or []:
+                if not session.remove(tid):
+                    warnings.append(f"{tid} (Not in session)")
+            result = {"session_id": session_id, "metrics": session.metrics()}
+            if close:
+                _assessment_sessions.pop(session_id)
+                result["track_ids"] = session.track_ids()
+                result["closed"] = True
+            else:
+                # Re-store to restart the idle TTL
+                _assessment_sessions.put(session, key=session_id)
+        if warnings:
+            result["warnings"] = warnings
+        return _dumps(result)
+    except Exception as e:
+        logger.error(f"Error in assess_playlist_session: {e}")
+        return str(e)
+
+
+@mcp.tool()
+@log_execution
+@budgeted_response
+def search_music_enriched(query: str, limit: int = 20, fields: Optional[List[str]] = None, format: str = "json") -> str:
+    """
+    Standard search with full metadata.
+
+    Args:
+        query: Search text.
+        limit: Max tracks to return (default 20).
+        fields: Track keys to return, e.g. ["id", "title", "artist"] ('id' is always kept).
+        format: 'json' (default), 'compact' (no whitespace), 'columnar' ({"columns", "rows"})
+                or 'ids' (bare ID list).
+    """
+    error = _check_track_format(format)
+    if error:
+        return error
     results = _fetch_search_results(query, song_count=limit)
     formatted = [_format_song(s) for s in results.get('song', [])]
-    return json.dumps(formatted, indent=2)
+    return _format_tracks(formatted, fields, format)
 
 
 if __name__ == "__main__":
+    # Resume playlist writes interrupted by a previous crash or restart. Only done when run as
+    # a script: importing the module (tests, embedding hosts) must not start writing.
+    if _journal.recover():
+        _ensure_journal_worker()
     mcp.run()
\ No newline at end of file
@@ -9,6 +9,17 @@ from unittest.mock import MagicMock
 # Ensure src is in path so we can import the server
 sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
 
+# Never let tests open the persistent state DB configured in .env (load_dotenv does not override)
+os.environ["NAVIDROME_STATE_DB"] = ":memory:"
+
+
+def _server_modules():
+    # The server is imported under two module names
+    for name in ("navidrome_mcp_server", "src.navidrome_mcp_server"):
+        module = sys.modules.get(name)
+        if module is not None and hasattr(module, "_reset_state"):
+            yield module
+
 @pytest.fixture(autouse=True)
 def mock_env_vars(monkeypatch):
     """Set environment variables required for the server to import."""
@@ -16,6 +27,22 @@ def mock_env_vars(monkeypatch):
     monkeypatch.setenv("NAVIDROME_USER", "mock_user")
     monkeypatch.setenv("NAVIDROME_PASS", "mock_pass")
 
+@pytest.fixture(autouse=True)
+def fresh_state_db(monkeypatch):
+    """Give each test its own in-memory write journal and playlist history."""
+    for module in list(_server_modules()):
+        db = module._open_state_db(None)
+        monkeypatch.setattr(module, "_state_db", db)
+        monkeypatch.setattr(module, "_journal", module._WriteJournal(db))
+        monkeypatch.setattr(module, "_history", module._PlaylistHistory(db))
+
+@pytest.fixture(autouse=True)
+def reset_server_state():
+    """Clear in-process caches between tests."""
+    yield
+    for module in _server_modules():
+        module._reset_state()
+
 @pytest.fixture
 def mock_conn(mocker):
     """Mock the libsonic connection used in the server."""
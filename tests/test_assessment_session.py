@@ -0,0 +1,67 @@
+# Copyright (c) 2026 Maurizio Delmonte
+# SPDX-License-Identifier: MIT
+
+import json
+import random
+
+import navidrome_mcp_server as server
+from navidrome_mcp_server import assess_playlist_session
+
+
+def _library(n=60, seed=3):
+    rng = random.Random(seed)
+    return {f's{i}': {'id': f's{i}', 'title': f'T{i}', 'artist': f'a{rng.randrange(8)}', 'album': f'al{rng.randrange(12)}',
+                      'genre': rng.choice(['Rock', 'Jazz', 'Pop']), 'year': rng.randrange(1960, 2024),
+                      'bpm': rng.choice([0, rng.randrange(60, 180)]), 'duration': rng.randrange(120, 400)}
+            for i in range(n)}
+
+
+def test_incremental_metrics_match_full_analysis(mock_conn):
+    songs = _library()
+    mock_conn.getSong.side_effect = lambda tid: {'song': songs[tid]}
+    rng = random.Random(7)
+    current = []
+    seen = set()
+    session_id = None
+    for step in range(15):
+        add = rng.sample(sorted(songs), 4)
+        remove = rng.sample(current, min(2, len(current)))
+        data = json.loads(assess_playlist_session(session_id=session_id, add=add, remove=remove))
+        session_id = data["session_id"]
+        current.extend(add)
+        seen.update(add)
+        for tid in remove:
+            del current[len(current) - 1 - current[::-1].index(tid)]
+
+    full = server._analyze_table(server._TrackTable.from_songs([songs[t] for t in current]))
+    metrics = data["metrics"]
+    assert metrics["total_tracks"] == full["total_tracks"]
+    assert metrics["total_duration_sec"] == full["total_duration_sec"]
+    assert metrics["entropy"] == full["entropy"]
+    assert metrics["same_artist_adjacent_pairs"] == full["same_artist_runs"]["adjacent_pairs"]
+    top_count = max(full["artist_counts"].values())
+    assert metrics["most_repetitive_artist"]["count"] == top_count
+    assert full["artist_counts"][metrics["most_repetitive_artist"]["name"]] == top_count
+
+    final = json.loads(assess_playlist_session(session_id=session_id, close=True))
+    assert final["track_ids"] == current
+    # Only deltas are resolved, each ID once
+    assert mock_conn.getSong.call_count == len(seen)
+
+
+def test_unknown_session_is_reported(mock_conn):
+    assert "expired or is unknown" in assess_playlist_session(session_id="nope", add=["x"])
+
+
+def test_top_value_follows_removals():
+    counter = server._EntropyCounter()
+    for value in "aabbbc":
+        counter.add(value)
+    assert counter.top() == ("b", 3)
+
+    counter.add("b", -1)
+    counter.add("b", -1)
+    assert counter.top() == ("a", 2)
+    for value in "aabc":
+        counter.add(value, -1)
+    assert counter.top() is None and not counter.counts
@@ -0,0 +1,59 @@
+# Copyright (c) 2026 Maurizio Delmonte
+# SPDX-License-Identifier: MIT
+
+import json
+
+import navidrome_mcp_server as server
+from navidrome_mcp_server import bulk_tag
+
+
+def _setup(mock_conn, monkeypatch, playlists, contents):
+    monkeypatch.setattr(server._write_limiter, "interval", 0.0)
+    mock_conn.getSong.side_effect = lambda tid: {'song': {'id': tid}} if tid != 'ghost' else {}
+    mock_conn.getPlaylists.return_value = {'playlists': {'playlist': playlists}}
+    mock_conn.getPlaylist.side_effect = lambda pl_id: {'playlist': {'entry': [{'id': t} for t in contents[pl_id]]}}
+    mock_conn.createPlaylist.return_value = {'playlist': {'id': 'new-pl'}}
+
+
+def test_groups_by_playlist_and_verifies_each_id_once(mock_conn, monkeypatch):
+    _setup(mock_conn, monkeypatch,
+           [{'id': 'pf', 'name': 'System:Mood:Focus'}, {'id': 'pe', 'name': 'NG:Mood:Energy'}],
+           {'pf': ['x'], 'pe': ['a', 'b']})
+
+    result = json.loads(bulk_tag({
+        "a": {"add": ["System:Mood:Focus", "Chill"], "remove": ["Energy"]},
+        "b": {"add": ["System:Mood:Focus", "Chill"]},
+        "ghost": ["Chill"],
+    }))
+
+    tags = result["tags"]
+    assert tags["System:Mood:Focus"]["added"] == 2
+    assert tags["NG:Mood:Energy"]["removed"] == 1
+    assert tags["NG:Mood:Chill"]["status"] == "created"
+    assert result["dropped"] == ["ghost"]
+    assert mock_conn.getSong.call_count == 3
+    assert mock_conn.getPlaylists.call_count == 1
+    mock_conn.createPlaylist.assert_called_once_with(name="NG:Mood:Chill", songIds=["a", "b"])
+    # One request per changed playlist
+    assert mock_conn.updatePlaylist.call_count == 2
+
+
+def test_already_tagged_tracks_are_left_alone(mock_conn, monkeypatch):
+    _setup(mock_conn, monkeypatch, [{'id': 'pf', 'name': 'NG:Mood:Focus'}], {'pf': ['a']})
+
+    result = json.loads(bulk_tag({"a": ["Focus"], "b": {"remove": ["Focus"]}}))
+
+    assert result["tags"]["NG:Mood:Focus"]["status"] == "unchanged"
+    mock_conn.updatePlaylist.assert_not_called()
+
+
+def test_only_virtual_tag_namespaces_are_accepted(mock_conn, monkeypatch):
+    _setup(mock_conn, monkeypatch, [{'id': 'rt', 'name': 'Road Trip: 2024'}], {'rt': ['a']})
+
+    assert bulk_tag({"b": ["Road Trip: 2024"]}).startswith("Error: Tag 'Road Trip: 2024' is not in a virtual-tag namespace")
+    assert bulk_tag({"a": {"remove": ["Other:Mood:Focus"]}}).startswith("Error:")
+    assert bulk_tag({"a": ["NG:Mood:"]}).startswith("Error:")
+    mock_conn.updatePlaylist.assert_not_called()
+    mock_conn.createPlaylist.assert_not_called()
+    assert server._tag_playlist_name(" Focus ") == "NG:Mood:Focus"
+    assert server._tag_playlist_name("System:Mood:Focus") == "System:Mood:Focus"
@@ -0,0 +1,56 @@
+# Copyright (c) 2026 Maurizio Delmonte
+# SPDX-License-Identifier: MIT
+
+import json
+import time
+from navidrome_mcp_server import _TTLCache, get_smart_candidates
+
+
+def _mock_pool(mock_conn, n=25):
+    mock_conn.getStarred.return_value = {}
+    mock_conn.getRandomSongs.return_value = {
+        'randomSongs': {'song': [
+            {'id': f's{i}', 'title': f'Song {i}', 'artist': f'A{i}', 'userRating': 3 + i % 3}
+            for i in range(n)
+        ]}
+    }
+
+
+def test_paging_walks_full_ranked_set_without_refetch(mock_conn):
+    _mock_pool(mock_conn)
+    first = json.loads(get_smart_candidates(mode="top_rated", limit=50, page_size=10, seed=1))
+    assert first['total'] == 25
+    assert first['offset'] == 0
+    assert len(first['tracks']) == 10
+    scores = [t['smart_score'] for t in first['tracks']]
+    assert scores == sorted(scores, reverse=True)
+
+    calls_before = mock_conn.getRandomSongs.call_count
+    seen = [t['id'] for t in first['tracks']]
+    cursor = first['cursor']
+    while cursor:
+        page = json.loads(get_smart_candidates(mode="top_rated", cursor=cursor, page_size=10))
+        seen.extend(t['id'] for t in page['tracks'])
+        cursor = page['cursor']
+
+    assert mock_conn.getRandomSongs.call_count == calls_before
+    assert len(seen) == 25 and len(set(seen)) == 25
+
+
+def test_unknown_cursor_returns_error(mock_conn):
+    result = get_smart_candidates(mode="top_rated", cursor="deadbeef:0")
+    assert result.startswith("Error")
+
+
+def test_ttl_cache_expiry_and_size_bound():
+    cache = _TTLCache(ttl_seconds=60, max_entries=10, max_size=100)
+    a = cache.put(["x"] * 60, size=60)
+    b = cache.put(["y"] * 60, size=60)
+    # Size bound evicts the oldest set
+    assert cache.get(a) is None
+    assert cache.get(b) is not None
+
+    short = _TTLCache(ttl_seconds=0, max_entries=10)
+    key = short.put("v")
+    time.sleep(0.01)
+    assert short.get(key) is None
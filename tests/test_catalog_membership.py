@@ -0,0 +1,41 @@
+# Copyright (c) 2026 Maurizio Delmonte
+# SPDX-License-Identifier: MIT
+
+import json
+
+import navidrome_mcp_server as server
+from navidrome_mcp_server import get_smart_candidates, manage_playlist
+
+
+def _setup(mock_conn, monkeypatch):
+    monkeypatch.setattr(server._write_limiter, "interval", 0.0)
+    mock_conn.getSong.side_effect = lambda tid: {'song': {'id': tid}}
+    mock_conn.getPlaylists.return_value = {'playlists': {'playlist': [{'id': 'pl1', 'name': 'Mix'}]}}
+    mock_conn.getScanStatus.return_value = {'scanStatus': {'lastScan': 's1', 'count': 3, 'folderCount': 1}}
+    mock_conn.getStarred.return_value = {}
+    mock_conn.getRandomSongs.return_value = {'randomSongs': {'song': [
+        {'id': t, 'title': t, 'artist': t, 'genre': 'Rock', 'userRating': 3} for t in ('a', 'b', 'c')
+    ]}}
+
+
+def test_harvested_ids_are_verified_without_network(mock_conn, monkeypatch):
+    _setup(mock_conn, monkeypatch)
+    ids = [t['id'] for t in json.loads(get_smart_candidates(mode="top_rated", limit=10))]
+
+    result = json.loads(manage_playlist(name="Mix", operation="append", track_ids=ids + ["new"]))
+
+    assert sorted(result["landed"]) == ['a', 'b', 'c', 'new']
+    mock_conn.getSong.assert_called_once_with("new")
+
+
+def test_scan_change_forgets_known_ids(mock_conn, monkeypatch):
+    _setup(mock_conn, monkeypatch)
+    monkeypatch.setattr(server, "SCAN_CHECK_SECONDS", 0)
+    server._verify_track_ids(mock_conn, ["a"])
+    assert server._library.is_known("a")
+
+    mock_conn.getScanStatus.return_value = {'scanStatus': {'lastScan': 's2', 'count': 2, 'folderCount': 1}}
+    mock_conn.getSong.side_effect = lambda tid: {}
+    valid, dropped = server._verify_track_ids(mock_conn, ["a"])
+
+    assert (valid, dropped) == ([], ["a"])
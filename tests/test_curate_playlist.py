@@ -0,0 +1,90 @@
+# Copyright (c) 2026 Maurizio Delmonte
+# SPDX-License-Identifier: MIT
+
+import json
+
+import navidrome_mcp_server as server
+from navidrome_mcp_server import curate_playlist
+
+SONGS = [
+    {'id': f's{i}', 'title': f'Song {i}', 'artist': f'Artist {i % 4}', 'genre': 'Jazz',
+     'year': 1960 + i, 'bpm': 80 + (i * 37) % 60, 'duration': 200, 'playCount': 0}
+    for i in range(12)
+]
+
+
+def _library(mock_conn):
+    mock_conn.getStarred.return_value = {}
+    mock_conn.getRandomSongs.return_value = {'randomSongs': {'song': SONGS}}
+    mock_conn.getPlaylists.return_value = {'playlists': {'playlist': []}}
+    mock_conn.createPlaylist.return_value = {'playlist': {'id': 'pl1'}}
+
+
+def test_pipeline_writes_and_returns_compact_summary(mock_conn, monkeypatch):
+    monkeypatch.setattr(server._write_limiter, "interval", 0.0)
+    _library(mock_conn)
+
+    raw = curate_playlist({"name": "Late Jazz", "mode": "hidden_gems", "limit": 8, "seed": 3,
+                           "max_tracks_per_artist": 2, "sequence": True, "rules": {"min_artist_gap": 1}})
+    data = json.loads(raw)
+
+    assert data["status"] == "written"
+    assert data["metrics"]["tracks"] == 8
+    assert data["stages"]["sequenced"]["cost_after"] <= data["stages"]["sequenced"]["cost_before"]
+    assert data["write"]["landed"] == 8 and data["write"]["version"] == 1
+    assert "track_ids" not in data
+    written = mock_conn.createPlaylist.call_args.kwargs["songIds"]
+    assert len(written) == 8
+    assert not any(s['id'] in raw for s in SONGS if s['id'] not in written)
+
+
+def test_failed_gate_rejects_without_writing(mock_conn):
+    _library(mock_conn)
+
+    data = json.loads(curate_playlist({"name": "Tiny", "mode": "hidden_gems", "limit": 5, "min_tracks": 10}))
+
+    assert data["status"] == "rejected"
+    assert data["violations"]["by_rule"] == {"min_tracks": 1}
+    mock_conn.createPlaylist.assert_not_called()
+
+
+def test_failed_write_is_reported_as_failed(mock_conn, monkeypatch):
+    monkeypatch.setattr(server._write_limiter, "interval", 0.0)
+    _library(mock_conn)
+    mock_conn.createPlaylist.side_effect = RuntimeError("server down")
+
+    data = json.loads(curate_playlist({"name": "Down", "mode": "hidden_gems", "limit": 4}))
+
+    assert data["status"] == "failed"
+    assert data["write"] == "Error: server down"
+
+    # Created empty, but every batch is rejected
+    def create(name=None, songIds=()):
+        if songIds:
+            raise RuntimeError("bad id")
+        return {'playlist': {'id': 'pl2'}}
+    mock_conn.createPlaylist.side_effect = create
+    mock_conn.updatePlaylist.side_effect = RuntimeError("bad id")
+
+    data = json.loads(curate_playlist({"name": "Rejected", "mode": "hidden_gems", "limit": 4}))
+
+    assert data["status"] == "failed"
+    assert data["write"]["landed"] == 0 and data["write"]["failed"] == 4
+
+
+def test_dry_run_returns_ids_only(mock_conn):
+    _library(mock_conn)
+
+    data = json.loads(curate_playlist({"mode": "hidden_gems", "limit": 4, "dry_run": True}))
+
+    assert data["status"] == "dry_run"
+    assert len(data["track_ids"]) == 4
+    mock_conn.createPlaylist.assert_not_called()
+
+
+def test_spec_validation():
+    assert curate_playlist({"mode": "hidden_gems", "colour": "blue"}).startswith("Error: Unknown spec keys ['colour']")
+    assert curate_playlist({"mode": "hidden_gems"}).startswith("Error: spec.name is required")
+    assert curate_playlist({"name": "X"}).startswith("Error: spec.mode is required")
+    assert curate_playlist({"name": "X", "mode": "hidden_gems", "rules": {"min_artist_gap": "x"}}).startswith(
+        "Error: Invalid spec.rules")
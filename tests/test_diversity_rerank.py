@@ -0,0 +1,48 @@
+# Copyright (c) 2026 Maurizio Delmonte
+# SPDX-License-Identifier: MIT
+
+import json
+from collections import Counter
+from navidrome_mcp_server import _mmr_rerank, get_smart_candidates
+
+
+def _track(i, artist, album, genre="Rock", year=1975, score=3):
+    return {"id": f"t{i}", "artist": artist, "album": album, "genre": genre, "year": year, "smart_score": score}
+
+
+def test_mmr_prefers_novel_artist_over_slightly_better_repeat():
+    pool = [
+        _track(1, "Camel", "Mirage", score=9),
+        _track(2, "Camel", "Mirage", score=8),
+        _track(3, "Genesis", "Foxtrot", score=7),
+    ]
+    picked = _mmr_rerank(pool, 2, lambda_=0.5)
+    assert [t["id"] for t in picked] == ["t1", "t3"]
+
+
+def test_mmr_pure_relevance_keeps_score_order():
+    pool = [_track(i, "Same", "Same", score=10 - i) for i in range(5)]
+    picked = _mmr_rerank(pool, 5, lambda_=1.0)
+    assert [t["id"] for t in picked] == [f"t{i}" for i in range(5)]
+
+
+def test_mmr_enforces_per_dimension_caps():
+    pool = [_track(i, f"Artist {i % 2}", f"Album {i % 4}", genre="Jazz" if i % 3 else "Rock") for i in range(20)]
+    picked = _mmr_rerank(pool, 20, caps={"artist": 3, "genre": 4})
+    assert max(Counter(t["artist"] for t in picked).values()) <= 3
+    assert max(Counter(t["genre"] for t in picked).values()) <= 4
+
+
+def test_get_smart_candidates_max_tracks_per_artist_uses_caps(mock_conn):
+    mock_conn.getStarred.return_value = {}
+    mock_conn.getRandomSongs.return_value = {
+        'randomSongs': {'song': [
+            {'id': f's{i}', 'title': f'Song {i}', 'artist': 'Dominant' if i < 12 else f'Other {i}',
+             'album': f'Alb {i % 3}', 'userRating': 5 if i < 12 else 3}
+            for i in range(20)
+        ]}
+    }
+    data = json.loads(get_smart_candidates(mode="top_rated", limit=10, max_tracks_per_artist=2, seed=3))
+    counts = Counter(t['artist'] for t in data)
+    assert counts['Dominant'] == 2
+    assert len(data) == 10
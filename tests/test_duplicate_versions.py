@@ -0,0 +1,78 @@
+# Copyright (c) 2026 Maurizio Delmonte
+# SPDX-License-Identifier: MIT
+
+import json
+
+import navidrome_mcp_server as server
+from navidrome_mcp_server import get_smart_candidates, manage_playlist
+
+VERSIONS = [
+    {'id': 'studio', 'title': 'Wish You Were Here', 'artist': 'Pink Floyd', 'year': 1975, 'duration': 334, 'userRating': 3},
+    {'id': 'remaster', 'title': 'Wish You Were Here - 2011 Remaster', 'artist': 'Pink Floyd', 'year': 2011, 'duration': 335, 'userRating': 5, 'starred': 'x'},
+    {'id': 'comp', 'title': 'Wish You Were Here (feat. Stéphane Grappelli)', 'artist': 'Pink Floyd', 'year': 2001, 'duration': 338, 'userRating': 3},
+    {'id': 'other', 'title': 'Wish You Were Here', 'artist': 'Badfinger', 'year': 1974, 'duration': 334, 'userRating': 3},
+    {'id': 'jam', 'title': 'Wish You Were Here (Live)', 'artist': 'Pink Floyd', 'year': 1988, 'duration': 610, 'userRating': 3},
+]
+
+
+def test_title_normalization_strips_version_markers():
+    assert server._normalize_title("Wish You Were Here - Remastered 2011") == "wish you were here"
+    assert server._normalize_title("Money [Live at Pompeii]") == "money"
+    assert server._normalize_title("Song feat. Someone") == "song"
+    assert server._normalize_title("Hey - You") == "hey you"
+
+
+def test_part_numbers_and_remixes_are_distinct_songs():
+    assert server._normalize_title("Song (Part 1)") != server._normalize_title("Song (Part 2)")
+    assert server._normalize_title("Song (Dave Remix)") == "song dave remix"
+    assert server._normalize_title("Song (Remastered 2011)") == "song"
+
+    tracks = [{'id': f'p{n}', 'title': f'Echoes (Part {n})', 'artist': 'A', 'duration': 300} for n in (1, 2)]
+    kept, removed = server._dedupe_versions(tracks, "first")
+    assert [t['id'] for t in kept] == ['p1', 'p2'] and removed == []
+
+
+def test_duration_tolerance_is_symmetric():
+    def grouped(durations):
+        index = server._DuplicateIndex(tolerance=10)
+        return [index.add({'title': 'Song', 'artist': 'A', 'duration': d}) for d in durations]
+
+    assert grouped([100, 110]) == grouped([110, 100]) == [0, 0]
+    assert grouped([100, 111]) == grouped([111, 100]) == [0, 1]
+    # Unknown durations match either way round
+    assert grouped([0, 100]) == grouped([100, 0]) == [0, 0]
+
+
+def test_keep_policies():
+    tracks = [server._format_song(s) for s in VERSIONS]
+    best, removed = server._dedupe_versions(tracks, "smart_score")
+    assert [t['id'] for t in best] == ['remaster', 'other', 'jam']
+    assert {r['id'] for r in removed} == {'studio', 'comp'}
+
+    original, _ = server._dedupe_versions(tracks, "original")
+    assert [t['id'] for t in original] == ['studio', 'other', 'jam']
+
+
+def test_harvest_dedupes_versions_by_default(mock_conn):
+    mock_conn.getStarred.return_value = {}
+    mock_conn.getRandomSongs.return_value = {'randomSongs': {'song': VERSIONS}}
+
+    ids = {t['id'] for t in json.loads(get_smart_candidates(mode="top_rated", limit=10))}
+    assert ids == {'remaster', 'other', 'jam'}
+
+    ids = {t['id'] for t in json.loads(get_smart_candidates(mode="top_rated", limit=10, dedupe="none"))}
+    assert len(ids) == 5
+
+
+def test_quality_reports_and_create_drops_alternate_versions(mock_conn, monkeypatch):
+    monkeypatch.setattr(server._write_limiter, "interval", 0.0)
+    by_id = {s['id']: s for s in VERSIONS}
+    mock_conn.getSong.side_effect = lambda tid: {'song': by_id[tid]}
+    mock_conn.getPlaylists.return_value = {'playlists': {'playlist': []}}
+    mock_conn.createPlaylist.return_value = {'playlist': {'id': 'pl1'}}
+
+    report = server._analyze_table(server._TrackTable.from_songs(VERSIONS))
+    assert report["alternate_versions"][0]["track_ids"] == ['studio', 'remaster', 'comp']
+
+    manage_playlist(name="Floyd", operation="create", track_ids=['studio', 'remaster', 'comp', 'other'], dedupe="original")
+    mock_conn.createPlaylist.assert_called_once_with(name="Floyd", songIds=['studio', 'other'])
@@ -0,0 +1,46 @@
+# Copyright (c) 2026 Maurizio Delmonte
+# SPDX-License-Identifier: MIT
+
+import json
+
+import pytest
+
+import navidrome_mcp_server as server
+from navidrome_mcp_server import get_genres
+
+PAYLOAD = {"name": "Café del Mar", "decades": {1990: 3}, "tracks": [{"id": "a", "bpm": 120.5}, {"id": "b"}], "empty": []}
+
+
+def test_stdlib_backend_matches_json_module():
+    name, dumps, loads = server._load_json_backend("json")
+    assert name == "json"
+    assert dumps(PAYLOAD, indent=True) == json.dumps(PAYLOAD, indent=2, ensure_ascii=False)
+    assert loads(dumps(PAYLOAD)) == json.loads(json.dumps(PAYLOAD))
+
+
+@pytest.mark.parametrize("backend", ["orjson", "msgspec"])
+def test_fast_backends_emit_the_same_document(backend):
+    pytest.importorskip(backend)
+    name, dumps, loads = server._load_json_backend(backend)
+    assert name == backend
+    assert dumps(PAYLOAD, indent=True) == json.dumps(PAYLOAD, indent=2, ensure_ascii=False)
+    assert loads(dumps(PAYLOAD)) == json.loads(json.dumps(PAYLOAD))
+    with pytest.raises(ValueError):
+        loads("{not json")
+
+
+def test_unavailable_backend_falls_back_to_stdlib():
+    assert server._load_json_backend("simdjson-9000")[0] == "json"
+
+
+def test_responses_are_not_parsed_back_for_logging(mock_conn, monkeypatch):
+    mock_conn.getGenres.return_value = {'genres': {'genre': [{'value': 'Jazz', 'songCount': 3, 'albumCount': 1}]}}
+
+    def boom(*args, **kwargs):
+        raise AssertionError("response was re-parsed")
+    monkeypatch.setattr(server, "_json_loads", boom)
+    monkeypatch.setattr(server.json, "loads", boom)
+
+    result = get_genres()
+    assert server._payload_of(result)[0]["name"] == "Jazz"
+    assert result == server._json_dumps(server._payload_of(result), indent=True)
@@ -0,0 +1,51 @@
+# Copyright (c) 2026 Maurizio Delmonte
+# SPDX-License-Identifier: MIT
+
+import json
+import navidrome_mcp_server as server
+from navidrome_mcp_server import get_smart_candidates
+
+
+def _mock_albums(mock_conn, n=3):
+    mock_conn.getAlbumList2.return_value = {
+        'albumList2': {'album': [{'id': f'alb{i}', 'title': f'Album {i}', 'artist': f'Artist {i}'} for i in range(n)]}
+    }
+
+    def directory(album_id):
+        return {'directory': {'child': [
+            {'id': f'{album_id}-t{j}', 'title': f'{album_id} track {j}', 'artist': 'X', 'isDir': False}
+            for j in range(4)
+        ]}}
+    mock_conn.getMusicDirectory.side_effect = directory
+    mock_conn.getScanStatus.return_value = {'scanStatus': {'scanning': False, 'count': 100, 'lastScan': '2026-01-01T00:00:00Z'}}
+
+
+def test_recently_added_reuses_album_index(mock_conn):
+    _mock_albums(mock_conn)
+    first = json.loads(get_smart_candidates(mode="recently_added", limit=10, seed=1))
+    assert sorted(t['id'] for t in first) == ['alb0-t0', 'alb1-t0', 'alb2-t0']
+    assert mock_conn.getMusicDirectory.call_count == 3
+
+    # Album-level modes now resolve from the local index with zero directory fetches
+    get_smart_candidates(mode="recently_added", limit=10, seed=1)
+    get_smart_candidates(mode="most_played", limit=10, seed=1)
+    assert mock_conn.getMusicDirectory.call_count == 3
+
+
+def test_library_index_is_invalidated_by_new_scan(mock_conn):
+    _mock_albums(mock_conn)
+    get_smart_candidates(mode="recently_added", limit=10)
+    assert mock_conn.getMusicDirectory.call_count == 3
+
+    mock_conn.getScanStatus.return_value = {'scanStatus': {'scanning': False, 'count': 120, 'lastScan': '2026-02-01T00:00:00Z'}}
+    server._library._scan_checked_at = 0.0  # force the next periodic check
+    get_smart_candidates(mode="recently_added", limit=10)
+    assert mock_conn.getMusicDirectory.call_count == 6
+
+
+def test_album_tracks_preserve_order():
+    index = server._LibraryIndex()
+    songs = [{'id': f't{i}', 'title': str(i)} for i in (3, 1, 2)]
+    index.record_album('a', songs)
+    assert [s['id'] for s in index.album_tracks('a')] == ['t3', 't1', 't2']
+    assert index.album_tracks('missing') is None
@@ -0,0 +1,56 @@
+# Copyright (c) 2026 Maurizio Delmonte
+# SPDX-License-Identifier: MIT
+
+import json
+import logging
+
+import pytest
+
+import navidrome_mcp_server as server
+from navidrome_mcp_server import assess_playlist_quality, get_genres
+
+IDS = [f"{i:032x}" for i in range(500)]
+
+
+def _records(caplog):
+    return [r for r in caplog.records if getattr(r, "tool", None)]
+
+
+def test_large_inputs_and_results_log_a_constant_size_record(mock_conn, caplog):
+    mock_conn.getSong.side_effect = lambda tid: {'song': {'id': tid, 'artist': f'A{int(tid, 16) % 7}'}}
+
+    with caplog.at_level(logging.INFO, logger="navidrome_mcp"):
+        assess_playlist_quality(IDS[:20])
+        assess_playlist_quality(IDS)
+
+    small, large = _records(caplog)
+    logged = large.inputs["args"][0]
+    assert logged["len"] == 500 and len(logged["head"]) == server.LOG_MAX_ITEMS
+    assert logged["sha1"] == server._digest(IDS)
+    assert large.result_summary == {"total_tracks": 500, "diversity_score": 0.01, "repetition_warning": False, "warnings": 0}
+    size = lambda r: len(json.dumps({"inputs": r.inputs, "result_summary": r.result_summary}))
+    assert abs(size(large) - size(small)) < 50
+
+
+def test_long_strings_are_capped_and_small_values_kept():
+    assert server._cap_for_log("short") == "short"
+    capped = server._cap_for_log("x" * 1000)
+    assert capped["len"] == 1000 and len(capped["head"]) == server.LOG_MAX_CHARS
+    assert server._cap_for_log({"max_tracks_per_artist": 2}) == {"max_tracks_per_artist": 2}
+
+
+def test_sampling_skips_successes_but_not_failures(mock_conn, caplog, monkeypatch):
+    monkeypatch.setattr(server, "LOG_SAMPLE_RATE", 0.0)
+    mock_conn.getGenres.return_value = {'genres': {'genre': []}}
+
+    @server.log_execution
+    def broken_tool():
+        raise RuntimeError("down")
+
+    with caplog.at_level(logging.INFO, logger="navidrome_mcp"):
+        get_genres()
+        assert not _records(caplog)
+        with pytest.raises(RuntimeError):
+            broken_tool()
+
+    assert [(r.tool, r.levelno) for r in _records(caplog)] == [("broken_tool", logging.ERROR)]
@@ -0,0 +1,68 @@
+# Copyright (c) 2026 Maurizio Delmonte
+# SPDX-License-Identifier: MIT
+
+import json
+import navidrome_mcp_server as server
+from navidrome_mcp_server import MOOD_REGISTRY, _load_mood_registry, get_smart_candidates
+
+
+def _mock_pool(mock_conn, songs):
+    mock_conn.getStarred.return_value = {}
+    mock_conn.getRandomSongs.return_value = {'randomSongs': {'song': songs}}
+
+
+def test_default_registry_ships_legacy_moods():
+    assert {"relax", "energy", "workout", "focus"} <= set(MOOD_REGISTRY)
+    assert MOOD_REGISTRY["relax"].ranges["bpm"] == (None, 115)
+
+
+def test_relax_does_not_mutate_caller_exclude_list(mock_conn):
+    _mock_pool(mock_conn, [
+        {'id': '1', 'title': 'Calm', 'artist': 'A', 'genre': 'Ambient', 'bpm': 80, 'userRating': 3},
+        {'id': '2', 'title': 'Loud', 'artist': 'B', 'genre': 'Heavy Metal', 'bpm': 90, 'userRating': 3},
+        {'id': '3', 'title': 'Fast', 'artist': 'C', 'genre': 'Ambient', 'bpm': 160, 'userRating': 3},
+        {'id': '4', 'title': 'Jazz', 'artist': 'D', 'genre': 'Jazz', 'bpm': 70, 'userRating': 3},
+    ])
+    excludes = ["Jazz"]
+    data = json.loads(get_smart_candidates(mode="top_rated", mood="relax", exclude_genres=excludes, limit=10))
+    assert [t['title'] for t in data] == ['Calm']
+    assert excludes == ["Jazz"]
+
+
+def test_explicit_bpm_overrides_profile(mock_conn):
+    _mock_pool(mock_conn, [
+        {'id': '1', 'title': 'Mid', 'artist': 'A', 'genre': 'Rock', 'bpm': 125, 'userRating': 3},
+    ])
+    data = json.loads(get_smart_candidates(mode="top_rated", mood="relax", max_bpm=130, limit=10))
+    assert [t['title'] for t in data] == ['Mid']
+
+
+def test_custom_registry_file_adds_mood_without_code(tmp_path, mock_conn, monkeypatch):
+    cfg = tmp_path / "moods.json"
+    cfg.write_text(json.dumps({
+        "Nostalgia": {
+            "include_genres": ["Rock", "Pop"],
+            "max_year": 1989,
+            "score_weights": {"prog": 5}
+        }
+    }))
+    registry = _load_mood_registry(str(cfg))
+    monkeypatch.setattr(server, "MOOD_REGISTRY", registry)
+
+    _mock_pool(mock_conn, [
+        {'id': '1', 'title': 'Old Prog', 'artist': 'A', 'genre': 'Prog Rock', 'year': 1973, 'userRating': 3},
+        {'id': '2', 'title': 'Old Pop', 'artist': 'B', 'genre': 'Pop', 'year': 1984, 'userRating': 4},
+        {'id': '3', 'title': 'New Pop', 'artist': 'C', 'genre': 'Pop', 'year': 2015, 'userRating': 5},
+        {'id': '4', 'title': 'Old Jazz', 'artist': 'D', 'genre': 'Jazz', 'year': 1960, 'userRating': 5},
+    ])
+    data = json.loads(get_smart_candidates(mode="top_rated", mood="nostalgia", page_size=5))
+    titles = [t['title'] for t in data['tracks']]
+    assert titles == ['Old Prog', 'Old Pop']
+    # The mood score only ranks; the output keeps the regular track schema
+    assert not any('mood_score' in t for t in data['tracks'])
+    columnar = json.loads(get_smart_candidates(mode="top_rated", mood="nostalgia", limit=5, format="columnar"))
+    assert 'mood_score' not in columnar['columns']
+
+
+def test_missing_registry_file_yields_empty_registry(tmp_path):
+    assert _load_mood_registry(str(tmp_path / "nope.json")) == {}
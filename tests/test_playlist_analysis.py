@@ -0,0 +1,37 @@
+# Copyright (c) 2026 Maurizio Delmonte
+# SPDX-License-Identifier: MIT
+
+import json
+
+from navidrome_mcp_server import assess_playlist_quality, validate_playlist_rules
+
+SONGS = {
+    f"{i:032x}": {'id': f"{i:032x}", 'title': f"T{i}", 'artist': artist, 'album': album, 'genre': genre,
+                  'year': year, 'bpm': bpm, 'duration': 200}
+    for i, (artist, album, genre, year, bpm) in enumerate([
+        ("A", "X", "Rock", 1975, 100),
+        ("A", "X", "Rock", 1977, 104),
+        ("B", "Y", "Jazz", 1991, 150),
+        ("C", "Z", "Pop", 2004, 0),
+    ])
+}
+
+
+def test_quality_metrics_come_from_one_batch(mock_conn):
+    mock_conn.getSong.side_effect = lambda tid: {'song': SONGS[tid]} if tid in SONGS else {}
+    ids = list(SONGS)
+
+    data = json.loads(assess_playlist_quality(ids))
+    metrics = data["metrics"]
+
+    assert data["diversity_score"] == 0.75
+    assert metrics["total_duration_sec"] == 800
+    assert metrics["entropy"]["artist"]["bits"] == 1.5
+    assert metrics["decades"]["counts"] == {"1970s": 2, "1990s": 1, "2000s": 1}
+    assert metrics["bpm"]["transitions"]["max_jump"] == 46
+    assert metrics["bpm"]["transitions"]["jumps_over_threshold"] == 1
+    assert metrics["same_artist_runs"]["runs"] == [{"artist": "A", "position": 0, "length": 2}]
+
+    # The second tool on the same list is served from the local index
+    validate_playlist_rules(ids, {"max_tracks_per_artist": 1})
+    assert mock_conn.getSong.call_count == 4
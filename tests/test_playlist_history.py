@@ -0,0 +1,111 @@
+# Copyright (c) 2026 Maurizio Delmonte
+# SPDX-License-Identifier: MIT
+
+import json
+
+import navidrome_mcp_server as server
+from navidrome_mcp_server import manage_playlist
+
+
+class _FakeServer:
+    """Minimal in-memory playlist store behind the mocked connection."""
+
+    def __init__(self, mock_conn, contents, name='Curated'):
+        self.contents = list(contents)
+        mock_conn.getSong.side_effect = lambda tid: {'song': {'id': tid}}
+        mock_conn.getPlaylists.return_value = {'playlists': {'playlist': [{'id': 'pl1', 'name': name}]}}
+        mock_conn.getPlaylist.side_effect = lambda pl_id: {'playlist': {'entry': [{'id': t} for t in self.contents]}}
+        mock_conn.deletePlaylist.side_effect = lambda pl_id: self.contents.clear()
+        mock_conn.createPlaylist.side_effect = self.create
+        mock_conn.updatePlaylist.side_effect = self.update
+
+    def create(self, name=None, songIds=()):
+        self.contents = list(songIds)
+        return {'playlist': {'id': 'pl1'}}
+
+    def update(self, pl_id, songIndexesToRemove=(), songIdsToAdd=()):
+        for index in sorted(songIndexesToRemove, reverse=True):
+            del self.contents[index]
+        self.contents.extend(songIdsToAdd)
+
+
+def test_restore_undoes_destructive_create_with_minimal_diff(mock_conn, monkeypatch):
+    monkeypatch.setattr(server._write_limiter, "interval", 0.0)
+    fake = _FakeServer(mock_conn, ['a', 'b', 'c', 'd'])
+
+    created = json.loads(manage_playlist(name="Curated", operation="create", track_ids=['x', 'y']))
+    assert created["version"] == 2
+
+    history = json.loads(manage_playlist(name="Curated", operation="history"))
+    assert [(v["version"], v["operation"], v["tracks"]) for v in history["versions"]] == [
+        (2, "create", 2), (1, "baseline", 4)
+    ]
+
+    mock_conn.updatePlaylist.reset_mock()
+    restored = json.loads(manage_playlist(name="Curated", operation="restore", version=1))
+
+    assert fake.contents == ['a', 'b', 'c', 'd']
+    assert restored["version"] == 3
+    mock_conn.updatePlaylist.assert_called_once_with('pl1', songIndexesToRemove=[1, 0], songIdsToAdd=['a', 'b', 'c', 'd'])
+
+
+def test_deltas_replay_across_checkpoints_and_pruning(monkeypatch):
+    monkeypatch.setattr(server, "HISTORY_CHECKPOINT_EVERY", 3)
+    monkeypatch.setattr(server, "HISTORY_MAX_VERSIONS", 4)
+    history = server._PlaylistHistory(server._open_state_db(None))
+    states = [[str(i) for i in range(n)] + ['z'] * (n % 2) for n in range(1, 9)]
+    for state in states:
+        history.record("P", state, "sync")
+
+    assert [v["version"] for v in history.versions("P")] == [8, 7, 6, 5]
+    assert history.at("P", 5) == states[4]
+    assert history.at("P", 8) == states[7]
+    assert history.at("P", 4) is None
+
+
+def test_bulk_tag_writes_are_recorded_in_the_history(mock_conn, monkeypatch):
+    monkeypatch.setattr(server._write_limiter, "interval", 0.0)
+    fake = _FakeServer(mock_conn, ['a', 'b'], name='NG:Mood:Focus')
+
+    manage_playlist(name="NG:Mood:Focus", operation="append", track_ids=['c'])
+    server.bulk_tag({"a": {"remove": ["Focus"]}, "d": ["Focus"]})
+    manage_playlist(name="NG:Mood:Focus", operation="append", track_ids=['e'])
+
+    assert fake.contents == ['b', 'c', 'd', 'e']
+    assert server._history.latest("NG:Mood:Focus")[1] == ['b', 'c', 'd', 'e']
+
+    manage_playlist(name="NG:Mood:Focus", operation="restore", version=2)
+    assert fake.contents == ['a', 'b', 'c']
+
+
+def test_baseline_refetches_when_the_index_disagrees(mock_conn, monkeypatch):
+    monkeypatch.setattr(server._write_limiter, "interval", 0.0)
+    fake = _FakeServer(mock_conn, ['a', 'b'])
+    manage_playlist(name="Curated", operation="append", track_ids=['c'])
+
+    # Edited in another client; the refreshed index reports a new count and stamp
+    fake.contents = ['c', 'x']
+    server._playlists.record("Curated", "pl1", song_count=2, changed="2026-01-01T00:00:00Z")
+
+    manage_playlist(name="Curated", operation="append", track_ids=['d'])
+
+    history = json.loads(manage_playlist(name="Curated", operation="history"))
+    assert [(v["operation"], v["tracks"]) for v in history["versions"]][:2] == [("append", 3), ("external", 2)]
+    assert server._history.latest("Curated")[1] == fake.contents == ['c', 'x', 'd']
+
+
+def test_hand_edits_within_the_index_ttl_are_kept_before_a_recreate(mock_conn, monkeypatch):
+    monkeypatch.setattr(server._write_limiter, "interval", 0.0)
+    fake = _FakeServer(mock_conn, [])
+    manage_playlist(name="Curated", operation="create", track_ids=['a', 'b', 'c'])
+
+    # Edited in another client; the cached index still carries our own stamp and count
+    fake.contents = ['a', 'b', 'c', 'h1', 'h2']
+    manage_playlist(name="Curated", operation="create", track_ids=['x'])
+
+    history = json.loads(manage_playlist(name="Curated", operation="history"))
+    assert [(v["operation"], v["tracks"]) for v in history["versions"]] == [
+        ("create", 1), ("external", 5), ("create", 3), ("baseline", 0)
+    ]
+    manage_playlist(name="Curated", operation="restore", version=3)
+    assert fake.contents == ['a', 'b', 'c', 'h1', 'h2']
@@ -0,0 +1,71 @@
+# Copyright (c) 2026 Maurizio Delmonte
+# SPDX-License-Identifier: MIT
+
+import navidrome_mcp_server as server
+from navidrome_mcp_server import manage_playlist
+
+
+def _valid_songs(mock_conn):
+    mock_conn.getSong.side_effect = lambda tid: {'song': {'id': tid}}
+
+
+def test_playlist_listing_is_fetched_once_across_calls(mock_conn):
+    _valid_songs(mock_conn)
+    mock_conn.getPlaylists.return_value = {
+        'playlists': {'playlist': [{'id': f'pl{i}', 'name': f'System:Mood:M{i}', 'songCount': i} for i in range(300)]}
+    }
+    for i in range(5):
+        manage_playlist(name=f"System:Mood:M{i}", operation="append", track_ids=["a" * 32])
+    assert mock_conn.getPlaylists.call_count == 1
+    assert mock_conn.updatePlaylist.call_args_list[4].args[0] == 'pl4'
+
+
+def test_create_uses_id_from_create_response(mock_conn):
+    _valid_songs(mock_conn)
+    mock_conn.getPlaylists.return_value = {'playlists': {'playlist': []}}
+    mock_conn.createPlaylist.return_value = {'status': 'ok', 'playlist': {'id': 'fresh-id', 'songCount': 10}}
+
+    ids = [f"{i:032x}" for i in range(15)]
+    result = manage_playlist(name="New", operation="create", track_ids=ids)
+
+    assert "Created playlist 'New'" in result
+    assert mock_conn.getPlaylists.call_count == 1  # initial load only, no re-listing after create
+    mock_conn.createPlaylist.assert_called_once_with(name="New", songIds=ids)
+    entry = server._playlists.lookup(mock_conn, "New")
+    assert (entry["id"], entry["song_count"]) == ("fresh-id", 15)
+
+
+def test_delete_removes_index_entry(mock_conn):
+    mock_conn.getPlaylists.return_value = {'playlists': {'playlist': [{'id': 'pl1', 'name': 'Gone'}]}}
+    manage_playlist(name="Gone", operation="delete")
+    assert server._playlists.lookup(mock_conn, "Gone") is None
+    assert manage_playlist(name="Gone", operation="delete") == "Playlist 'Gone' not found."
+
+
+def test_stale_index_answers_from_cache_and_refreshes_in_background(mock_conn, monkeypatch):
+    mock_conn.getPlaylists.return_value = {'playlists': {'playlist': [{'id': 'pl1', 'name': 'A'}]}}
+    index = server._PlaylistIndex()
+    assert index.lookup(mock_conn, "A")["id"] == 'pl1'
+
+    mock_conn.getPlaylists.return_value = {'playlists': {'playlist': [{'id': 'pl2', 'name': 'A'}]}}
+    index._loaded_at -= server.PLAYLIST_INDEX_TTL + 1
+    started = []
+    monkeypatch.setattr(server.threading, "Thread", lambda target, args, daemon: _DeferredThread(started, target, args))
+
+    assert index.lookup(mock_conn, "A")["id"] == 'pl1'  # served from cache, refresh scheduled
+    assert index.lookup(mock_conn, "A")["id"] == 'pl1'  # no second refresh while one is pending
+    assert len(started) == 1
+
+    started[0].run()
+    assert index.lookup(mock_conn, "A")["id"] == 'pl2'
+
+
+class _DeferredThread:
+    def __init__(self, started, target, args):
+        self.started, self.target, self.args = started, target, args
+
+    def start(self):
+        self.started.append(self)
+
+    def run(self):
+        self.target(*self.args)
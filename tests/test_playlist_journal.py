@@ -0,0 +1,103 @@
+# Copyright (c) 2026 Maurizio Delmonte
+# SPDX-License-Identifier: MIT
+
+import json
+
+import navidrome_mcp_server as server
+from navidrome_mcp_server import manage_playlist, get_playlist_job_status
+
+
+def _setup(mock_conn, monkeypatch):
+    mock_conn.getSong.side_effect = lambda tid: {'song': {'id': tid}}
+    mock_conn.getPlaylists.return_value = {'playlists': {'playlist': [{'id': 'pl1', 'name': 'Mix', 'songCount': 0}]}}
+    monkeypatch.setattr(server, "_ensure_journal_worker", lambda: None)
+    monkeypatch.setattr(server._write_limiter, "interval", 0.0)
+
+
+def test_background_write_is_queued_then_applied(mock_conn, monkeypatch):
+    _setup(mock_conn, monkeypatch)
+    queued = json.loads(manage_playlist(name="Mix", operation="append", track_ids=["a", "b"], background=True))
+
+    assert queued["status"] == "pending"
+    mock_conn.updatePlaylist.assert_not_called()
+
+    assert server._process_pending_jobs() == 1
+    status = json.loads(get_playlist_job_status(job_id=queued["job_id"]))
+    assert status["status"] == "done"
+    assert status["result"]["landed"] == ["a", "b"]
+    mock_conn.updatePlaylist.assert_called_once_with('pl1', songIdsToAdd=["a", "b"])
+
+
+def test_idempotency_key_prevents_double_write(mock_conn, monkeypatch):
+    _setup(mock_conn, monkeypatch)
+    manage_playlist(name="Mix", operation="append", track_ids=["a"], idempotency_key="k1")
+    retry = json.loads(manage_playlist(name="Mix", operation="append", track_ids=["a"], idempotency_key="k1"))
+
+    assert retry["deduplicated"] is True
+    assert retry["status"] == "done"
+    assert mock_conn.updatePlaylist.call_count == 1
+
+
+def test_interrupted_job_resumes_from_checkpoint(mock_conn, monkeypatch):
+    _setup(mock_conn, monkeypatch)
+    job, _ = server._journal.submit("Mix", "append", ["a", "b", "c"])
+    server._journal.claim(job["id"])
+    server._journal.checkpoint(job["id"], {"playlist_id": "pl1", "landed": ["a"], "failed": [], "requests": 1})
+
+    # Simulated restart: the job was left 'running'
+    assert server._journal.recover() == 1
+    server._process_pending_jobs()
+
+    mock_conn.updatePlaylist.assert_called_once_with('pl1', songIdsToAdd=["b", "c"])
+    assert server._journal.get(job["id"])["status"] == "done"
+
+
+def test_recover_counts_every_pending_job(mock_conn, monkeypatch):
+    _setup(mock_conn, monkeypatch)
+    running, _ = server._journal.submit("Mix", "append", ["a"], claim=True)
+    server._journal.submit("Other", "append", ["b"])
+
+    # One re-queued, one already waiting: both need the worker
+    assert server._journal.recover() == 2
+    assert server._journal.get(running["id"])["status"] == "pending"
+
+
+def test_journal_persists_in_state_db(tmp_path):
+    path = str(tmp_path / "state.db")
+    journal = server._WriteJournal(server._open_state_db(path))
+    job, _ = journal.submit("Mix", "sync", ["a"])
+
+    reopened = server._WriteJournal(server._open_state_db(path))
+    assert reopened.get(job["id"])["track_ids"] == ["a"]
+    assert reopened.claim()["id"] == job["id"]
+
+
+def test_cache_reset_keeps_journal_and_history():
+    job, _ = server._journal.submit("Mix", "append", ["a"])
+    server._history.record("Mix", ["a"], "append")
+
+    server._reset_state()
+
+    assert server._journal.get(job["id"])["status"] == "pending"
+    assert server._history.latest("Mix")[1] == ["a"]
+
+
+def test_synchronous_submit_is_claimed_atomically():
+    job, created = server._journal.submit("Mix", "append", ["a"], claim=True)
+
+    assert created and job["status"] == "running" and job["attempts"] == 1
+    # A worker polling in between finds nothing to take
+    assert server._journal.claim() is None
+    assert server._journal.claim(job["id"]) is None
+    assert server._run_playlist_job(None, None).startswith("Error: Playlist job is no longer pending")
+
+
+def test_only_the_worker_is_throttled(monkeypatch):
+    waits = []
+    monkeypatch.setattr(server._write_limiter, "wait", lambda: waits.append(1))
+    server._throttle_write()
+    assert waits == []
+
+    monkeypatch.setattr(server, "_journal_worker", server.threading.current_thread())
+    server._throttle_write()
+    assert waits == [1]
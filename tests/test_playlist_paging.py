@@ -0,0 +1,79 @@
+# Copyright (c) 2026 Maurizio Delmonte
+# SPDX-License-Identifier: MIT
+
+import json
+
+import navidrome_mcp_server as server
+from navidrome_mcp_server import manage_playlist
+
+
+def _setup(mock_conn, n=120):
+    mock_conn.getPlaylists.return_value = {'playlists': {'playlist': [{'id': 'pl1', 'name': 'Big', 'changed': 't1'}]}}
+    mock_conn.getPlaylist.return_value = {'playlist': {'entry': [
+        {'id': f't{i}', 'title': f'Song {i}', 'artist': 'A'} for i in range(n)
+    ]}}
+
+
+def test_get_pages_in_order_from_one_download(mock_conn):
+    _setup(mock_conn)
+
+    first = json.loads(manage_playlist(name="Big", operation="get", limit=50))
+    second = json.loads(manage_playlist(name="Big", operation="get", cursor=first["cursor"], limit=50))
+    third = json.loads(manage_playlist(name="Big", operation="get", cursor=second["cursor"], limit=50))
+
+    assert first["total"] == 120 and first["playlist_id"] == 'pl1'
+    ids = [t["id"] for page in (first, second, third) for t in page["tracks"]]
+    assert ids == [f't{i}' for i in range(120)]
+    assert third["cursor"] is None
+    assert mock_conn.getPlaylist.call_count == 1
+
+
+def test_offset_projects_fields(mock_conn):
+    _setup(mock_conn)
+
+    page = json.loads(manage_playlist(name="Big", operation="get", offset=100, limit=5, fields=["title"]))
+
+    assert page["tracks"][0] == {"id": "t100", "title": "Song 100"}
+    assert mock_conn.getPlaylist.call_count == 1
+
+
+def test_get_without_cursor_sees_external_edits(mock_conn):
+    _setup(mock_conn, n=20)
+    first = json.loads(manage_playlist(name="Big", operation="get", limit=10))
+
+    # Edited in another client; the cached index entry is unchanged
+    _setup(mock_conn, n=25)
+    fresh = json.loads(manage_playlist(name="Big", operation="get"))
+    paged = json.loads(manage_playlist(name="Big", operation="get", cursor=first["cursor"], limit=50))
+
+    assert fresh["total"] == 25
+    # The cursor keeps paging the snapshot it was issued for
+    assert paged["total"] == 20 and len(paged["tracks"]) == 10
+
+
+def test_shuffle_only_on_request(mock_conn):
+    _setup(mock_conn, n=30)
+    page = json.loads(manage_playlist(name="Big", operation="get", shuffle=True, limit=30))
+    assert sorted(t["id"] for t in page["tracks"]) == sorted(f't{i}' for i in range(30))
+    assert [t["id"] for t in page["tracks"]] != [f't{i}' for i in range(30)]
+
+
+def test_writes_within_one_changed_second_invalidate_the_snapshot(mock_conn, monkeypatch):
+    monkeypatch.setattr(server._write_limiter, "interval", 0.0)
+    contents = ['a', 'b']
+    mock_conn.getSong.side_effect = lambda tid: {'song': {'id': tid}}
+    mock_conn.getPlaylists.return_value = {'playlists': {'playlist': [{'id': 'pl1', 'name': 'Big', 'changed': 't1'}]}}
+    mock_conn.getPlaylist.side_effect = lambda pl_id: {'playlist': {'entry': [{'id': t} for t in contents]}}
+    mock_conn.updatePlaylist.side_effect = lambda pl_id, songIndexesToRemove=(), songIdsToAdd=(): contents.extend(songIdsToAdd)
+    # Every write lands in the same second, so the 'changed' stamp never moves
+    record = server._playlists.record
+    monkeypatch.setattr(server._playlists, "record",
+                        lambda name, pl_id, song_count=None, changed=None: record(name, pl_id, song_count, 't1'))
+
+    manage_playlist(name="Big", operation="append", track_ids=['c'])
+    first = json.loads(manage_playlist(name="Big", operation="get"))
+    manage_playlist(name="Big", operation="append", track_ids=['d'])
+    second = json.loads(manage_playlist(name="Big", operation="get"))
+
+    assert [t["id"] for t in first["tracks"]] == ['a', 'b', 'c']
+    assert [t["id"] for t in second["tracks"]] == ['a', 'b', 'c', 'd']
@@ -1,86 +1,106 @@
 
+import json
 import pytest
 from unittest.mock import MagicMock, patch, call
-from src.navidrome_mcp_server import manage_playlist
+import src.navidrome_mcp_server as server
+from src.navidrome_mcp_server import manage_playlist, _chunk_by_length, _send_bisect
+
+
+def _id_cost(tid, param='songIdToAdd'):
+    return len(f"&{param}={tid}")
+
 
 @patch('src.navidrome_mcp_server.get_conn')
-def test_playlist_batching_create(mock_get_conn):
+def test_playlist_batching_create(mock_get_conn, monkeypatch):
     """
-    Verifies that manage_playlist batches large requests.
-    Scenario: Creating a playlist with 35 tracks.
+    Verifies that manage_playlist batches large requests by encoded length.
+    Scenario: Creating a playlist with 35 tracks when a request fits ~10 IDs.
     Expected:
-    - 1 call to createPlaylist with 10 tracks.
-    - 1 call to updatePlaylist with 10 tracks.
-    - 1 call to updatePlaylist with 10 tracks.
-    - 1 call to updatePlaylist with 5 tracks.
+    - 1 call to createPlaylist with the first batch.
+    - updatePlaylist calls for the rest, all against the new playlist ID.
     """
     mock_conn = MagicMock()
     mock_get_conn.return_value = mock_conn
-    
+    monkeypatch.setattr(server, "_request_budget", lambda: 10 * _id_cost("id-10"))
+
     # Mock getPlaylists to return empty first, then return the created playlist
+    # (older servers return an empty createPlaylist body, forcing one re-list)
     mock_conn.getPlaylists.side_effect = [
         {'playlists': {'playlist': []}}, # Initial check (not found)
         {'playlists': {'playlist': [{'id': 'new-pl-id', 'name': 'BatchTest'}]}} # After creation
     ]
-    
-    # Setup 35 fake IDs
-    track_ids = [f"id-{i}" for i in range(35)]
-    
-    result = manage_playlist(name="BatchTest", operation="create", track_ids=track_ids)
-    
-    # Verification
-    assert "Created playlist 'BatchTest'" in result
-    
-    # Check calls
-    # 1. createPlaylist should be called once with the first 10
+
+    track_ids = [f"id-{i}" for i in range(10, 45)]
+
+    result = json.loads(manage_playlist(name="BatchTest", operation="create", track_ids=track_ids))
+
+    assert "Created playlist 'BatchTest'" in result["result"]
+    assert result["landed"] == track_ids
+    assert result["failed"] == []
+
     mock_conn.createPlaylist.assert_called_once()
     create_call = mock_conn.createPlaylist.call_args
     assert create_call.kwargs['name'] == "BatchTest"
-    assert len(create_call.kwargs['songIds']) == 10
-    assert create_call.kwargs['songIds'] == track_ids[:10]
-    
-    # 2. updatePlaylist should be called 3 times (for the remaining 25 tracks: 10, 10, 5)
-    assert mock_conn.updatePlaylist.call_count == 3
-    
-    # Check that updatePlaylist was called with the correct ID
-    update_calls = mock_conn.updatePlaylist.call_args_list
-    for call_args in update_calls:
+    assert create_call.kwargs['songIds'] == track_ids[:len(create_call.kwargs['songIds'])]
+
+    sent = list(create_call.kwargs['songIds'])
+    for call_args in mock_conn.updatePlaylist.call_args_list:
         assert call_args[0][0] == 'new-pl-id'
+        sent.extend(call_args.kwargs['songIdsToAdd'])
+    assert sent == track_ids
+    assert mock_conn.updatePlaylist.call_count == 3
+
 
 @patch('src.navidrome_mcp_server.get_conn')
 def test_playlist_batching_append_large(mock_get_conn):
     """
-    Verifies batching logic in APPEND mode.
-    Scenario: Appending 25 tracks to existing playlist.
-    Expected:
-    - 3 calls to updatePlaylist (10, 10, 5)
+    Verifies batching logic in APPEND mode with the default POST body budget.
+    Scenario: Appending 500 tracks to an existing playlist.
+    Expected: a couple of requests instead of 50 fixed-size batches.
     """
     mock_conn = MagicMock()
     mock_get_conn.return_value = mock_conn
-    
-    # Mock that playlist exists
+
     mock_conn.getPlaylists.return_value = {
         'playlists': {'playlist': [{'id': 'pl-123', 'name': 'ExistingList'}]}
     }
-    
-    track_ids = [f"id-{i}" for i in range(25)]
-    
-    result = manage_playlist(name="ExistingList", operation="append", track_ids=track_ids)
-    
-    assert "Appended 25 tracks" in result
-    
-    # createPlaylist should NOT be called
+
+    track_ids = [f"{i:032x}" for i in range(500)]
+
+    result = json.loads(manage_playlist(name="ExistingList", operation="append", track_ids=track_ids))
+
+    assert "Appended 500 tracks" in result["result"]
     mock_conn.createPlaylist.assert_not_called()
-    
-    # updatePlaylist called 3 times
-    assert mock_conn.updatePlaylist.call_count == 3
-    
-    calls = mock_conn.updatePlaylist.call_args_list
-    # Call 1: 10 tracks
-    assert len(calls[0].kwargs['songIdsToAdd']) == 10
-    # Call 2: 10 tracks
-    assert len(calls[1].kwargs['songIdsToAdd']) == 10
-    # Call 3: 5 tracks
-    assert len(calls[2].kwargs['songIdsToAdd']) == 5
-    
-    assert calls[2].kwargs['songIdsToAdd'] == track_ids[20:25]
+    assert mock_conn.updatePlaylist.call_count <= 2
+
+    sent = [tid for c in mock_conn.updatePlaylist.call_args_list for tid in c.kwargs['songIdsToAdd']]
+    assert sent == track_ids
+
+
+def test_get_requests_use_url_length_budget(monkeypatch):
+    monkeypatch.setattr(server, "USE_GET", True)
+    monkeypatch.setattr(server, "MAX_URL_LENGTH", 2000)
+    params = [('songIdToAdd', f"{i:032x}") for i in range(500)]
+    chunks = _chunk_by_length(params)
+    budget = server._request_budget()
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert sum(_id_cost(v) for _, v in chunk) <= budget
+    assert [p for c in chunks for p in c] == params
+
+
+def test_failed_batch_is_bisected_to_the_bad_id():
+    sent = []
+
+    def send(ids):
+        if "bad" in ids:
+            raise Exception("Song not found")
+        sent.extend(ids)
+
+    ids = [f"ok{i}" for i in range(15)] + ["bad"] + [f"ok{i}" for i in range(15, 30)]
+    report = _send_bisect(send, ids)
+
+    assert report["failed"] == ["bad"]
+    assert report["landed"] == [tid for tid in ids if tid != "bad"]
+    assert sent == report["landed"]
+    assert report["requests"] <= 2 * 5 + 1
@@ -0,0 +1,47 @@
+# Copyright (c) 2026 Maurizio Delmonte
+# SPDX-License-Identifier: MIT
+
+from navidrome_mcp_server import _playlist_edit_script, manage_playlist
+
+
+def _apply(current, removes, adds):
+    kept = [tid for i, tid in enumerate(current) if i not in set(removes)]
+    return kept + adds
+
+
+def test_edit_script_identity_is_empty():
+    ids = [f"id{i}" for i in range(50)]
+    assert _playlist_edit_script(ids, ids) == ([], [])
+
+
+def test_edit_script_small_change_touches_only_changed_entries():
+    current = [f"id{i}" for i in range(100)]
+    target = [tid for tid in current if tid != "id40"] + ["new1", "new2"]
+    removes, adds = _playlist_edit_script(current, target)
+    assert removes == [40]
+    assert adds == ["new1", "new2"]
+    assert _apply(current, removes, adds) == target
+
+
+def test_edit_script_reorder_is_correct():
+    current = ["a", "b", "c", "d"]
+    target = ["a", "c", "b", "e"]
+    removes, adds = _playlist_edit_script(current, target)
+    assert removes == sorted(removes, reverse=True)
+    assert _apply(current, removes, adds) == target
+
+
+def test_manage_playlist_sync_keeps_id_and_sends_minimal_update(mock_conn):
+    pl_id = "pl-keep"
+    current = [f"{i:032x}" for i in range(30)]
+    target = current[:10] + current[11:] + ["f" * 32]
+    mock_conn.getPlaylists.return_value = {'playlists': {'playlist': [{'id': pl_id, 'name': 'Mine'}]}}
+    mock_conn.getPlaylist.return_value = {'playlist': {'entry': [{'id': tid} for tid in current]}}
+    mock_conn.getSong.side_effect = lambda tid: {'song': {'id': tid}}
+
+    result = manage_playlist(name="Mine", operation="sync", track_ids=target)
+
+    assert "Synced playlist 'Mine'" in result
+    mock_conn.deletePlaylist.assert_not_called()
+    mock_conn.createPlaylist.assert_not_called()
+    mock_conn.updatePlaylist.assert_called_once_with(pl_id, songIndexesToRemove=[10], songIdsToAdd=["f" * 32])
@@ -0,0 +1,93 @@
+# Copyright (c) 2026 Maurizio Delmonte
+# SPDX-License-Identifier: MIT
+
+import json
+
+import pytest
+
+import navidrome_mcp_server as server
+from navidrome_mcp_server import export_playlist, import_playlist
+
+ENTRIES = [
+    {'id': 'a', 'path': 'Camel/Moonmadness/01 - Aristillus.flac', 'artist': 'Camel', 'title': 'Aristillus', 'duration': 120},
+    {'id': 'b', 'path': 'Björk/Post/02 - Hyperballad.flac', 'artist': 'Björk', 'title': 'Hyperballad', 'duration': 321},
+]
+
+
+@pytest.fixture(autouse=True)
+def playlist_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(server, "PLAYLIST_DIR", str(tmp_path))
+    return tmp_path
+
+
+def _setup(mock_conn, monkeypatch):
+    monkeypatch.setattr(server._write_limiter, "interval", 0.0)
+    mock_conn.getPlaylists.return_value = {'playlists': {'playlist': [{'id': 'pl1', 'name': 'Src'}]}}
+    mock_conn.getPlaylist.return_value = {'playlist': {'entry': ENTRIES}}
+    mock_conn.createPlaylist.return_value = {'playlist': {'id': 'pl2'}}
+
+
+def test_m3u8_round_trip_matches_by_path(tmp_path, mock_conn, monkeypatch):
+    _setup(mock_conn, monkeypatch)
+    target = tmp_path / "src.m3u8"
+
+    exported = json.loads(export_playlist(name="Src", file_path=str(target)))
+    assert exported["tracks"] == 2
+    assert target.read_text(encoding="utf-8").splitlines()[2] == "#EXTINF:120,Camel - Aristillus"
+
+    # The other instance has the same files under different IDs
+    mock_conn.search3.side_effect = lambda q, **kw: {'searchResult3': {'song': [
+        dict(e, id=e['id'].upper()) for e in ENTRIES if e['title'] in q
+    ]}}
+    result = json.loads(import_playlist(file_path=str(target), name="Copy"))
+
+    assert result["matched_by"] == {"path": 2}
+    mock_conn.createPlaylist.assert_called_once_with(name="Copy", songIds=["A", "B"])
+    mock_conn.getSong.assert_not_called()
+
+
+def test_jsonl_import_falls_back_to_normalized_artist_title(tmp_path, mock_conn, monkeypatch):
+    _setup(mock_conn, monkeypatch)
+    source = tmp_path / "list.jsonl"
+    source.write_text(
+        json.dumps({"path": "old/root/x.mp3", "artist": "BJORK", "title": "hyperballad"}) + "\n"
+        + json.dumps({"path": "old/root/y.mp3", "artist": "Nobody", "title": "Missing"}) + "\n",
+        encoding="utf-8"
+    )
+    mock_conn.search3.side_effect = lambda q, **kw: {'searchResult3': {'song': [ENTRIES[1]] if 'BJORK' in q else []}}
+
+    result = json.loads(import_playlist(file_path=str(source), name="Copy", operation="append"))
+
+    assert result["matched_by"] == {"artist_title": 1}
+    assert result["unmatched"] == 1
+    assert result["write"]["landed"] == ["b"]
+
+
+def test_paths_outside_the_playlist_dir_are_rejected(tmp_path, mock_conn, monkeypatch):
+    _setup(mock_conn, monkeypatch)
+    secret = tmp_path.parent / "secret.txt"
+    secret.write_text("Camel - Aristillus\n")
+    (tmp_path / "folder.m3u8").mkdir()
+    (tmp_path / "link.m3u8").symlink_to(secret)
+
+    for path in ("../secret.txt", str(secret), "link.m3u8"):
+        assert "outside the playlist directory" in import_playlist(file_path=path, name="Copy")
+        assert "outside the playlist directory" in export_playlist(name="Src", file_path=path)
+    assert "not a regular file" in import_playlist(file_path="folder.m3u8", name="Copy")
+    assert "not a regular file" in export_playlist(name="Src", file_path="folder.m3u8")
+    mock_conn.search3.assert_not_called()
+    assert secret.read_text() == "Camel - Aristillus\n"
+
+
+def test_relative_paths_resolve_inside_the_playlist_dir(tmp_path, mock_conn, monkeypatch):
+    _setup(mock_conn, monkeypatch)
+    exported = json.loads(export_playlist(name="Src", file_path="sub/src.m3u8"))
+    assert exported["file"] == str((tmp_path / "sub" / "src.m3u8").resolve())
+
+
+def test_path_normalization_strips_prefixes_not_characters():
+    assert server._normalize_path("./Music/x.flac") == "music/x.flac"
+    assert server._normalize_path("/Music/x.flac") == "music/x.flac"
+    assert server._normalize_path("../Music/x.flac") == "../music/x.flac"
+    assert server._normalize_path(".hidden/x") == ".hidden/x"
+    assert server._normalize_path("Camel\\Moonmadness\\01.flac") == "camel/moonmadness/01.flac"
@@ -0,0 +1,95 @@
+# Copyright (c) 2026 Maurizio Delmonte
+# SPDX-License-Identifier: MIT
+
+import inspect
+import json
+
+import navidrome_mcp_server as server
+from navidrome_mcp_server import (continue_response, explore_genre, get_genre_tracks, get_genres,
+                                  get_smart_candidates, manage_playlist)
+
+
+def _albums(mock_conn, n=300):
+    mock_conn.getAlbumList2.return_value = {'albumList2': {'album': [
+        {'id': f'al{i}', 'artist': f'Artist {i}', 'title': f'Album {i} with a long enough name'} for i in range(n)
+    ]}}
+
+
+def test_oversized_result_is_cut_and_continued(mock_conn):
+    _albums(mock_conn)
+    full = json.loads(explore_genre("Jazz", limit=300))
+
+    first_raw = explore_genre("Jazz", limit=300, max_response_tokens=500)
+    first = json.loads(first_raw)
+    assert len(first_raw) <= 500 * server.BYTES_PER_TOKEN
+    assert first["genre"] == "Jazz" and first["truncated"]["key"] == "top_artists"
+    assert first["truncated"]["total"] == 300
+
+    artists, token = list(first["top_artists"]), first["continuation"]
+    calls = mock_conn.getAlbumList2.call_count
+    while token:
+        chunk = json.loads(continue_response(token, max_response_tokens=2000))
+        artists.extend(chunk["top_artists"])
+        token = chunk["continuation"]
+
+    assert artists == full["top_artists"]
+    assert mock_conn.getAlbumList2.call_count == calls
+
+
+def test_top_level_lists_are_wrapped(mock_conn):
+    mock_conn.getGenres.return_value = {'genres': {'genre': [
+        {'value': f'Genre {i}', 'songCount': i, 'albumCount': 1} for i in range(200)
+    ]}}
+    data = json.loads(get_genres(max_response_tokens=200))
+    assert data["truncated"]["returned"] == len(data["items"]) < 200
+    rest = json.loads(continue_response(data["continuation"], max_response_tokens=0))
+    assert len(data["items"]) + len(rest["items"]) == 200 and rest["continuation"] is None
+
+
+def test_default_budget_and_schema(mock_conn, monkeypatch):
+    _albums(mock_conn)
+    monkeypatch.setattr(server, "RESPONSE_TOKEN_BUDGET", 300)
+    assert "continuation" in json.loads(explore_genre("Jazz", limit=300))
+    assert "continuation" not in json.loads(explore_genre("Jazz", limit=300, max_response_tokens=0))
+    assert "max_response_tokens" in inspect.signature(get_smart_candidates).parameters
+
+
+def test_unknown_continuation():
+    assert continue_response("nope:3").startswith("Error: Continuation 'nope:3' has expired")
+
+
+def test_columnar_pages_are_cut_and_continue_with_the_cursor(mock_conn):
+    mock_conn.getPlaylists.return_value = {'playlists': {'playlist': [{'id': 'pl1', 'name': 'Big'}]}}
+    mock_conn.getPlaylist.return_value = {'playlist': {'entry': [
+        {'id': f't{i}', 'title': f'A rather long song title number {i}', 'artist': 'A'} for i in range(200)
+    ]}}
+
+    raw = manage_playlist(name="Big", operation="get", limit=200, format="columnar", max_response_tokens=500)
+    page = json.loads(raw)
+    assert len(raw) <= 500 * server.BYTES_PER_TOKEN
+    returned = page["truncated"]["returned"]
+    assert len(page["tracks"]["rows"]) == returned < 200 and "continuation" not in page
+
+    rows = list(page["tracks"]["rows"])
+    cursor = page["cursor"]
+    while cursor:
+        page = json.loads(manage_playlist(name="Big", operation="get", cursor=cursor, limit=200,
+                                          format="columnar", max_response_tokens=500))
+        rows.extend(page["tracks"]["rows"])
+        cursor = page["cursor"]
+    id_col = page["tracks"]["columns"].index("id")
+    assert [r[id_col] for r in rows] == [f't{i}' for i in range(200)]
+    assert mock_conn.getPlaylist.call_count == 1
+
+
+def test_columnar_continuations_keep_the_columns(mock_conn):
+    mock_conn.getRandomSongs.return_value = {'randomSongs': {'song': [
+        {'id': f't{i}', 'title': f'A rather long song title number {i}', 'artist': 'A', 'genre': 'Jazz'} for i in range(100)
+    ]}}
+
+    data = json.loads(get_genre_tracks("Jazz", limit=100, format="columnar", max_response_tokens=300))
+    assert data["truncated"]["key"] == "rows" and data["columns"]
+
+    rest = json.loads(continue_response(data["continuation"], max_response_tokens=0))
+    assert rest["columns"] == data["columns"]
+    assert len(data["rows"]) + len(rest["rows"]) == data["truncated"]["total"]
@@ -0,0 +1,52 @@
+# Copyright (c) 2026 Maurizio Delmonte
+# SPDX-License-Identifier: MIT
+
+import json
+
+import navidrome_mcp_server as server
+from navidrome_mcp_server import get_smart_candidates, manage_playlist, search_music_enriched
+
+SONGS = [{'id': f's{i}', 'title': f'T{i}', 'artist': f'A{i}', 'path': f'/music/{i}.flac',
+          'comment': 'x' * 200, 'playCount': 0} for i in range(30)]
+
+
+def test_shapes_share_one_projection():
+    tracks = [server._format_song(s) for s in SONGS[:3]]
+    assert server._shape_tracks(tracks, format="ids") == ['s0', 's1', 's2']
+    table = server._shape_tracks(tracks, ["title"], "columnar")
+    assert table == {"columns": ["id", "title"], "rows": [["s0", "T0"], ["s1", "T1"], ["s2", "T2"]]}
+    assert "\n" not in server._format_tracks(tracks, format="compact")
+
+
+def test_projection_shrinks_harvest_output(mock_conn):
+    mock_conn.getStarred.return_value = {}
+    mock_conn.getRandomSongs.return_value = {'randomSongs': {'song': SONGS}}
+
+    full = get_smart_candidates(mode="hidden_gems", limit=20, seed=1)
+    slim = get_smart_candidates(mode="hidden_gems", limit=20, seed=1, fields=["title", "artist"], format="columnar")
+
+    data = json.loads(slim)
+    assert data["columns"] == ["id", "title", "artist"]
+    assert [row[0] for row in data["rows"]] == [t["id"] for t in json.loads(full)]
+    assert len(slim) * 5 < len(full)
+
+
+def test_paged_harvest_keeps_the_envelope(mock_conn):
+    mock_conn.getStarred.return_value = {}
+    mock_conn.getRandomSongs.return_value = {'randomSongs': {'song': SONGS}}
+    first = json.loads(get_smart_candidates(mode="hidden_gems", limit=20, page_size=5, format="ids"))
+    assert len(first["tracks"]) == 5 and all(isinstance(t, str) for t in first["tracks"])
+
+    nxt = json.loads(get_smart_candidates(mode="hidden_gems", cursor=first["cursor"], page_size=5, fields=["title"]))
+    assert set(nxt["tracks"][0]) == {"id", "title"}
+
+
+def test_playlist_get_accepts_formats(mock_conn):
+    mock_conn.getPlaylists.return_value = {'playlists': {'playlist': [{'id': 'pl1', 'name': 'P', 'changed': 'c1'}]}}
+    mock_conn.getPlaylist.return_value = {'playlist': {'entry': SONGS[:4]}}
+    page = json.loads(manage_playlist(name="P", format="columnar", fields=["artist"]))
+    assert page["playlist_id"] == 'pl1' and page["tracks"]["columns"] == ["id", "artist"]
+
+
+def test_unknown_format_is_rejected(mock_conn):
+    assert search_music_enriched("x", format="yaml").startswith("Error: Unknown format 'yaml'")
@@ -0,0 +1,84 @@
+# Copyright (c) 2026 Maurizio Delmonte
+# SPDX-License-Identifier: MIT
+
+import json
+
+import navidrome_mcp_server as server
+from navidrome_mcp_server import validate_playlist_rules
+
+SONGS = [
+    {'id': 's0', 'title': 'One', 'artist': 'A', 'album': 'X', 'genre': 'Rock', 'year': 1975, 'bpm': 100, 'duration': 300},
+    {'id': 's1', 'title': 'Two', 'artist': 'A', 'album': 'X', 'genre': 'Heavy Metal', 'year': 1980, 'bpm': 160, 'duration': 300},
+    {'id': 's2', 'title': 'Three', 'artist': 'B', 'album': 'Y', 'genre': 'Jazz', 'year': 2001, 'bpm': 0, 'duration': 100},
+]
+
+
+def _setup(mock_conn):
+    by_id = {s['id']: s for s in SONGS}
+    mock_conn.getSong.side_effect = lambda tid: {'song': by_id[tid]} if tid in by_id else {}
+
+
+def test_legacy_rules_return_structured_violations(mock_conn):
+    _setup(mock_conn)
+    data = json.loads(validate_playlist_rules(["s0", "s1", "s2", "gone"], {
+        "max_tracks_per_artist": 1, "exclude_genres": ["metal"], "max_bpm": 150
+    }))
+
+    assert data["is_valid"] is False
+    by_rule = {v["rule"]: v for v in data["violations"]}
+    assert by_rule["max_tracks_per_artist"]["track_id"] == "s1"
+    assert by_rule["exclude_genres"]["message"] == "Track 'Two': Prohibited genre 'Heavy Metal'."
+    assert by_rule["bpm_range"] == {
+        "rule": "bpm_range", "message": "Track 'Two': BPM 160 is too high (target < 150).",
+        "position": 1, "track_id": "s1", "title": "Two", "value": 160, "limit": 150
+    }
+    assert by_rule["not_found"]["track_id"] == "gone"
+
+
+def test_sequence_aggregate_and_tag_rules(mock_conn, monkeypatch):
+    _setup(mock_conn)
+    monkeypatch.setattr(server._tags, "sync", lambda conn: None)
+    server._tags.set_playlist("NG:Mood:Focus", ["s0", "s2"], "t1")
+
+    data = json.loads(validate_playlist_rules(["s0", "s1", "s2"], {
+        "min_artist_gap": 1, "max_bpm_jump": 30, "max_total_duration": 600,
+        "required_tags": ["focus"], "max_year": 1990, "bogus": 1
+    }))
+
+    rules = [(v["rule"], v.get("position")) for v in data["violations"]]
+    assert sorted(rules, key=str) == sorted([
+        ("min_artist_gap", 1), ("max_bpm_jump", 1), ("required_tags", 1),
+        ("year_range", 2), ("total_duration", None)
+    ], key=str)
+    assert data["unknown_rules"] == ["bogus"]
+
+
+def test_album_rules_tell_same_named_albums_apart(mock_conn):
+    songs = [
+        {'id': 'h0', 'title': 'Hit A', 'artist': 'A', 'album': 'Greatest Hits'},
+        {'id': 'h1', 'title': 'Hit B', 'artist': 'B', 'album': 'Greatest Hits'},
+        {'id': 'h2', 'title': 'Hit A2', 'artist': 'A', 'album': 'Greatest Hits'},
+    ]
+    by_id = {s['id']: s for s in songs}
+    mock_conn.getSong.side_effect = lambda tid: {'song': by_id[tid]}
+
+    data = json.loads(validate_playlist_rules(["h0", "h1"], {"max_tracks_per_album": 1, "min_album_gap": 1}))
+    assert data["is_valid"] is True
+
+    data = json.loads(validate_playlist_rules(["h0", "h1", "h2"], {"max_tracks_per_album": 1}))
+    assert [(v["track_id"], v["value"]) for v in data["violations"]] == [("h2", "Greatest Hits")]
+
+
+def test_malformed_rules_return_an_error(mock_conn):
+    _setup(mock_conn)
+
+    assert validate_playlist_rules(["s0"], {"max_tracks_per_artist": "x"}).startswith("Error: Validation failed")
+    # Compiles, but fails while evaluating against numeric BPMs
+    assert validate_playlist_rules(["s0"], {"min_bpm": "fast"}).startswith("Error: Validation failed")
+
+
+def test_rules_are_compiled_once():
+    server._compile_rules_cached.cache_clear()
+    server._compile_rules({"max_tracks_per_artist": 2, "min_bpm": 90})
+    server._compile_rules({"min_bpm": 90, "max_tracks_per_artist": 2})
+    assert server._compile_rules_cached.cache_info().hits == 1
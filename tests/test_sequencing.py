@@ -0,0 +1,53 @@
+# Copyright (c) 2026 Maurizio Delmonte
+# SPDX-License-Identifier: MIT
+
+import json
+import random
+
+import navidrome_mcp_server as server
+from navidrome_mcp_server import sequence_playlist
+
+
+def _songs(n, seed=1):
+    rng = random.Random(seed)
+    return [{'id': f's{i}', 'title': f'T{i}', 'artist': f'a{rng.randrange(n // 4)}',
+             'genre': rng.choice(['Rock', 'Jazz', 'Pop']), 'year': rng.randrange(1960, 2024),
+             'bpm': rng.randrange(60, 180)} for i in range(n)]
+
+
+def test_sequence_reduces_transition_cost_and_artist_repeats(mock_conn):
+    songs = _songs(300)
+    by_id = {s['id']: s for s in songs}
+    mock_conn.getSong.side_effect = lambda tid: {'song': by_id[tid]}
+
+    data = json.loads(sequence_playlist([s['id'] for s in songs], time_budget_ms=2000))
+
+    assert sorted(data["order"]) == sorted(by_id)
+    assert data["order"][0] == 's0'
+    assert data["cost_after"] < data["cost_before"] / 2
+    assert data["adjacent_same_artist_after"] <= data["adjacent_same_artist_before"]
+    assert data["elapsed_ms"] < 1000
+
+
+def test_two_opt_finds_the_monotonic_bpm_ramp():
+    table = server._TrackTable.from_songs([
+        {'id': str(i), 'title': str(i), 'artist': str(i), 'genre': 'Rock', 'bpm': bpm}
+        for i, bpm in enumerate([80, 140, 100, 120, 90, 130, 110])
+    ])
+    matrix = server._transition_matrix(table, {"bpm": 1.0})
+    order, _ = server._sequence_order(matrix, 0, time_budget=1.0)
+    assert [table.bpms[i] for i in order] == [80, 90, 100, 110, 120, 130, 140]
+
+
+def test_sequence_is_written_with_minimal_diff(mock_conn, monkeypatch):
+    monkeypatch.setattr(server._write_limiter, "interval", 0.0)
+    songs = [{'id': 'a', 'artist': 'X', 'bpm': 100}, {'id': 'b', 'artist': 'X', 'bpm': 150}, {'id': 'c', 'artist': 'Y', 'bpm': 105}]
+    by_id = {s['id']: s for s in songs}
+    mock_conn.getSong.side_effect = lambda tid: {'song': by_id[tid]}
+    mock_conn.getPlaylists.return_value = {'playlists': {'playlist': [{'id': 'pl1', 'name': 'Set'}]}}
+    mock_conn.getPlaylist.return_value = {'playlist': {'entry': [{'id': t} for t in ('a', 'b', 'c')]}}
+
+    data = json.loads(sequence_playlist(['a', 'b', 'c'], playlist_name="Set"))
+
+    assert data["order"] == ['a', 'c', 'b']
+    mock_conn.updatePlaylist.assert_called_once_with('pl1', songIndexesToRemove=[1], songIdsToAdd=['b'])
@@ -0,0 +1,49 @@
+# Copyright (c) 2026 Maurizio Delmonte
+# SPDX-License-Identifier: MIT
+
+import json
+import random
+from navidrome_mcp_server import _rank_candidates, _select_top_candidates, get_smart_candidates
+
+
+def _pool(scores):
+    return [{"id": f"t{i}", "smart_score": s} for i, s in enumerate(scores)]
+
+
+def test_rank_candidates_returns_top_k_in_score_order():
+    pool = _pool([3, 10, 1, 5, 9, 3])
+    ranked = _rank_candidates(pool, 3, random.Random(0))
+    assert [c["smart_score"] for c in ranked] == [10, 9, 5]
+
+
+def test_rank_candidates_samples_boundary_ties():
+    # 1 clear winner + 10 tracks tied at the cutoff: every tied track must be reachable
+    pool = _pool([9] + [3] * 10)
+    seen = set()
+    for seed in range(50):
+        ranked = _rank_candidates(pool, 3, random.Random(seed))
+        assert ranked[0]["id"] == "t0"
+        seen.update(c["id"] for c in ranked[1:])
+    assert len(seen) == 10
+
+
+def test_select_top_candidates_is_reproducible_with_seed():
+    pool = _pool([random.Random(i).randint(1, 10) for i in range(200)])
+    a = _select_top_candidates(pool, 20, random.Random(42))
+    b = _select_top_candidates(pool, 20, random.Random(42))
+    assert [c["id"] for c in a] == [c["id"] for c in b]
+    assert len(a) == 20
+
+
+def test_get_smart_candidates_seed_is_reproducible(mock_conn):
+    mock_conn.getStarred.return_value = {}
+    mock_conn.getRandomSongs.return_value = {
+        'randomSongs': {'song': [
+            {'id': f's{i}', 'title': f'Song {i}', 'artist': f'A{i % 7}', 'userRating': 3 + i % 3}
+            for i in range(60)
+        ]}
+    }
+    first = json.loads(get_smart_candidates(mode="top_rated", limit=10, seed=7))
+    second = json.loads(get_smart_candidates(mode="top_rated", limit=10, seed=7))
+    assert [t['id'] for t in first] == [t['id'] for t in second]
+    assert len(first) == 10
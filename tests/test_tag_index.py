@@ -0,0 +1,61 @@
+# Copyright (c) 2026 Maurizio Delmonte
+# SPDX-License-Identifier: MIT
+
+import json
+
+import navidrome_mcp_server as server
+from navidrome_mcp_server import get_smart_candidates, manage_playlist
+
+
+def _setup(mock_conn, monkeypatch, contents):
+    monkeypatch.setattr(server._write_limiter, "interval", 0.0)
+    mock_conn.getSong.side_effect = lambda tid: {'song': {'id': tid}}
+    mock_conn.getPlaylists.return_value = {'playlists': {'playlist': [
+        {'id': 'pf', 'name': 'System:Mood:Focus', 'changed': 't1'},
+        {'id': 'pc', 'name': 'NG:Mood:Chill', 'changed': 't1'},
+        {'id': 'px', 'name': 'Road Trip', 'changed': 't1'},
+    ]}}
+    mock_conn.getPlaylist.side_effect = lambda pl_id: {'playlist': {'entry': [{'id': t} for t in contents[pl_id]]}}
+    mock_conn.getStarred.return_value = {}
+    mock_conn.getRandomSongs.return_value = {'randomSongs': {'song': [
+        {'id': t, 'title': t.upper(), 'artist': t, 'genre': 'Rock', 'userRating': 3} for t in ('a', 'b', 'c')
+    ]}}
+
+
+def test_index_is_built_once_from_tag_playlists_only(mock_conn, monkeypatch):
+    _setup(mock_conn, monkeypatch, {'pf': ['a', 'b'], 'pc': ['b']})
+
+    get_smart_candidates(mode="top_rated", limit=10)
+    data = json.loads(get_smart_candidates(mode="top_rated", limit=10))
+
+    assert {t['id']: t['tags'] for t in data} == {
+        'a': ['System:Mood:Focus'], 'b': ['NG:Mood:Chill', 'System:Mood:Focus'], 'c': []
+    }
+    fetched = sorted(c.args[0] for c in mock_conn.getPlaylist.call_args_list)
+    assert fetched == ['pc', 'pf']
+
+
+def test_include_and_exclude_tags_filter_candidates(mock_conn, monkeypatch):
+    _setup(mock_conn, monkeypatch, {'pf': ['a', 'b'], 'pc': ['b']})
+
+    data = json.loads(get_smart_candidates(mode="top_rated", limit=10, include_tags=["focus"], exclude_tags=["NG:Mood:Chill"]))
+
+    assert [t['id'] for t in data] == ['a']
+
+
+def test_writes_update_the_index_without_refetching(mock_conn, monkeypatch):
+    _setup(mock_conn, monkeypatch, {'pf': ['a'], 'pc': []})
+    server._tags.sync(mock_conn)
+
+    manage_playlist(name="System:Mood:Focus", operation="append", track_ids=["c"])
+    mock_conn.getPlaylist.reset_mock()
+    server._tags.sync(mock_conn)
+
+    assert server._tags.tags_for("c") == ['System:Mood:Focus']
+    mock_conn.getPlaylist.assert_not_called()
+
+
+def test_tags_key_is_present_before_the_index_is_built():
+    song = server._format_song({'id': 'a', 'title': 'A'})
+    assert not server._tags.ready
+    assert song["tags"] == []